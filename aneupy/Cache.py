@@ -0,0 +1,242 @@
+# =============================================================================
+#
+# Cache.py
+#
+# Python module with a content-addressed on-disk cache of geometries
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) the cache is only safe for the threads of one process
+    fcntl = None
+
+
+# Increase when the content of the cache entries changes
+VERSION = 2
+
+
+def _default(obj):
+    # NumPy scalars and arrays
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} cannot be used in a cache key")
+
+
+def key(*parts):
+    """ SHA-256 hash of the JSON representation of parts"""
+
+    text = json.dumps([VERSION] + list(parts), sort_keys=True, default=_default)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class GeometryCache(object):
+    """ Content-addressed cache of geometries and exported files.
+
+        Each key has an entry directory holding one or more files (e.g. the
+        BREP of a shell or an exported STL). Entries are evicted in least
+        recently used order when the total size exceeds max_size bytes.
+        Hits, misses, stores and evictions are counted per kind of entry.
+
+        Several processes can share the cache: files are written to a
+        temporary directory and moved into their entry, and the moves, the
+        evictions and the total size (kept in the file .size) are done
+        holding a lock on the file .lock. An entry evicted while it is read
+        is a miss.
+
+    """
+
+    # Lock of the threads of the process, used when fcntl is not available
+    _thread_lock = threading.Lock()
+
+    def __init__(self, directory, max_size=2**30):
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        self.counters = {}
+        self.evictions = 0
+
+        os.makedirs(os.path.join(self.directory, '.tmp'), exist_ok=True)
+        with self._lock():
+            self.size = self._write_size(sum(size for _, _, size in self._entries()))
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """ Exclusive lock of the cache among processes and threads"""
+
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_size(self, size):
+        with open(os.path.join(self.directory, '.size'), 'w') as output_file:
+            output_file.write(str(size))
+        return size
+
+    def _add_size(self, change):
+        """ Adds change to the size shared by the processes and returns the
+            total. Call holding the lock."""
+
+        try:
+            with open(os.path.join(self.directory, '.size'), 'r') as input_file:
+                size = int(input_file.read()) + change
+        except (OSError, ValueError):
+            # Recount the entries, which already include the change
+            size = sum(size for _, _, size in self._entries())
+
+        return self._write_size(max(0, size))
+
+    def _entries(self):
+        """ (last access time, entry directory, size) of every entry"""
+
+        entries = []
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir() or prefix.name.startswith('.'):
+                continue
+            for entry in os.scandir(prefix.path):
+                try:
+                    if not entry.is_dir():
+                        continue
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    entries.append((entry.stat().st_mtime, entry.path, size))
+                except FileNotFoundError:
+                    # Evicted by another process
+                    continue
+
+        return entries
+
+    def _count(self, kind, counter):
+        counters = self.counters.setdefault(kind, {'hits': 0, 'misses': 0, 'stores': 0})
+        counters[counter] += 1
+
+    def fetch(self, key, file, kind='geometry', read=None):
+        """ Path of file in the entry of key, or None if it is not cached.
+
+            With read, returns read(path) instead. Another process may evict
+            the entry before the path is used, so read it this way: a file
+            that disappears during read is a miss and returns None.
+        """
+
+        path = os.path.join(self._entry(key), file)
+        if not os.path.isfile(path):
+            self._count(kind, 'misses')
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(self._entry(key))
+        except OSError:
+            pass
+
+        result = path
+        if read is not None:
+            try:
+                result = read(path)
+            except Exception:
+                if os.path.isfile(path):
+                    raise
+                self._count(kind, 'misses')
+                return None
+
+        self._count(kind, 'hits')
+        return result
+
+    def store(self, key, file, write, kind='geometry'):
+        """ Stores file in the entry of key.
+
+            write is called with a temporary path where the file must be
+            written. Returns the path of the cached file.
+        """
+
+        entry = self._entry(key)
+        path = os.path.join(entry, file)
+
+        # Write outside the entries first, so that concurrent workers never see partial files
+        # and an eviction of the entry cannot remove the file being written
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.join(self.directory, '.tmp'), suffix=os.path.splitext(file)[1])
+        os.close(handle)
+        try:
+            write(tmp_path)
+            size = os.path.getsize(tmp_path)
+            with self._lock():
+                os.makedirs(entry, exist_ok=True)
+                previous = os.path.getsize(path) if os.path.isfile(path) else 0
+                os.replace(tmp_path, path)
+                os.utime(entry)
+                self.size = self._add_size(size - previous)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._count(kind, 'stores')
+
+        if self.size > self.max_size:
+            self.evict()
+
+        return path
+
+    def evict(self, max_size=None):
+        """ Removes least recently used entries until the size is below max_size"""
+
+        max_size = self.max_size if max_size is None else max_size
+
+        evicted = 0
+        with self._lock():
+            entries = sorted(self._entries())
+            self.size = sum(size for _, _, size in entries)
+
+            for _, path, size in entries:
+                if self.size <= max_size:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                self.size -= size
+                evicted += 1
+
+            self._write_size(self.size)
+
+        self.evictions += evicted
+
+        return evicted
+
+    def clear(self):
+        return self.evict(max_size=0)
+
+    def stats(self):
+        """ Hit/miss statistics and current size of the cache"""
+
+        stats = {'size': self.size, 'max_size': self.max_size, 'evictions': self.evictions}
+
+        hits = misses = 0
+        for kind, counters in self.counters.items():
+            stats[kind] = dict(counters)
+            hits += counters['hits']
+            misses += counters['misses']
+
+        stats['hits'], stats['misses'] = hits, misses
+        stats['hit_rate'] = hits/float(hits + misses) if hits + misses else 0.
+
+        return stats
@@ -0,0 +1,220 @@
+# =============================================================================
+#
+# Centerline.py
+#
+# Python module with in-memory models of the centerline of an aneurysm and of
+# the cross-section area profiles along it
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+
+import numpy as np
+import scipy.interpolate
+
+
+# Gauss-Legendre rule used for the arc length of each spline interval
+_GAUSS = np.polynomial.legendre.leggauss(5)
+
+# Centerlines loaded from files: (path, modification time, num_points) -> Centerline
+_LOADED = {}
+
+# Area profiles loaded from files: (path, modification time) -> Profile
+_PROFILES = {}
+
+
+def load(file, num_points=1):
+    """ Centerline of a comma separated X,Y,Z file, parsed and fitted once
+        per file and number of points and then shared"""
+
+    file = os.path.abspath(file)
+    if not os.path.exists(file):
+        raise FileNotFoundError(f"The file {file} does not exist. Please check the path.")
+
+    key = (file, os.path.getmtime(file), num_points)
+    if key not in _LOADED:
+        _LOADED[key] = Centerline(np.loadtxt(file, delimiter=','), num_points)
+
+    return _LOADED[key]
+
+
+def load_profile(file):
+    """ Area profile of a comma separated position,area file, parsed once per
+        file and then shared"""
+
+    file = os.path.abspath(file)
+    if not os.path.exists(file):
+        raise FileNotFoundError(f"The file {file} does not exist. Please check the path.")
+
+    key = (file, os.path.getmtime(file))
+    if key not in _PROFILES:
+        _PROFILES[key] = Profile(np.loadtxt(file, delimiter=','))
+
+    return _PROFILES[key]
+
+
+class Centerline(object):
+    """ Cubic spline through the points of a centerline.
+
+        The spline is parameterized uniformly in [0, 1] over the data points
+        (as in Patient_specific.py) and sampled at num_points points per
+        interval. points, tangents and arc_length are NumPy arrays of the
+        samples.
+
+    """
+
+    def __init__(self, data, num_points=1):
+        self.data = np.asarray(data, dtype=float)[:, :3]
+
+        t = np.linspace(0., 1., len(self.data))
+        self.spline = scipy.interpolate.CubicSpline(t, self.data)
+        self.derivative = self.spline.derivative()
+
+        self.parameter = np.linspace(0., 1., num_points*(len(self.data) - 1) + 1)
+        self.points = self.spline(self.parameter)
+
+        # Tangents of Patient_specific.py: central differences of the samples
+        tangents = np.gradient(self.points, axis=0)
+        self.tangents = tangents/np.linalg.norm(tangents, axis=1)[:, None]
+
+        self.arc_length = self._arc_length(self.parameter)
+        self.length = float(self.arc_length[-1])
+
+    def _arc_length(self, parameter):
+        """ Arc length from the start to each parameter (sorted), integrating
+            the speed of the spline with Gauss quadrature"""
+
+        x, w = _GAUSS
+        a, b = parameter[:-1], parameter[1:]
+        nodes = 0.5*(b - a)[:, None]*(x + 1.) + a[:, None]
+        speed = np.linalg.norm(self.derivative(nodes.ravel()), axis=1).reshape(nodes.shape)
+
+        return np.concatenate([[0.], np.cumsum(0.5*(b - a)*speed.dot(w))])
+
+    def parameter_at(self, s):
+        """ Spline parameter at arc lengths s"""
+
+        # Dense table of the arc length, refined once
+        if not hasattr(self, '_table'):
+            table = np.linspace(0., 1., 64*len(self.data) + 1)
+            self._table = (table, self._arc_length(table))
+
+        table, length = self._table
+        return np.interp(s, length, table)
+
+    def at(self, s):
+        """ Points at arc lengths s from the start"""
+
+        return self.spline(self.parameter_at(s))
+
+    def tangent_at(self, s):
+        """ Unit tangents of the spline at arc lengths s"""
+
+        tangents = self.derivative(self.parameter_at(s))
+        return tangents/np.linalg.norm(tangents, axis=-1)[..., None]
+
+    def frames(self, points=None, tangents=None, OX=None):
+        """ Rotation-minimizing frames (N, 3, 3), rows OX, OY and tangent.
+
+            Frames are propagated with the double reflection method from the
+            first one, whose OX is given or perpendicular to the tangent.
+            Defaults to the samples and tangents of the centerline.
+        """
+
+        points = self.points if points is None else np.asarray(points, dtype=float)
+        tangents = self.tangents if tangents is None else np.asarray(tangents, dtype=float)
+
+        t0 = tangents[0]
+        if OX is None:
+            OX = np.eye(3)[np.argmin(np.abs(t0))]
+        r = np.asarray(OX, dtype=float) - np.dot(OX, t0)*t0
+        r /= np.linalg.norm(r)
+
+        OXs = np.empty_like(points)
+        OXs[0] = r
+        v1 = np.diff(points, axis=0)
+        c1 = np.einsum('ij,ij->i', v1, v1)
+        for i in range(len(points) - 1):
+            if c1[i] == 0.:
+                OXs[i + 1] = OXs[i]
+                continue
+            rL = OXs[i] - (2./c1[i])*np.dot(v1[i], OXs[i])*v1[i]
+            tL = tangents[i] - (2./c1[i])*np.dot(v1[i], tangents[i])*v1[i]
+            v2 = tangents[i + 1] - tL
+            c2 = np.dot(v2, v2)
+            r = rL if c2 == 0. else rL - (2./c2)*np.dot(v2, rL)*v2
+            r -= np.dot(r, tangents[i + 1])*tangents[i + 1]
+            OXs[i + 1] = r/np.linalg.norm(r)
+
+        OYs = np.cross(tangents, OXs)
+
+        return np.stack([OXs, OYs, tangents], axis=1)
+
+
+class Profile(object):
+    """ Radius of the cross sections along the centerline, from their areas.
+
+        Positions are normalized by the largest one (as in Patient_specific.py)
+        so the profile spans [0, 1] of the length of the centerline, and radii
+        are those of circles of the same area. Interpolants are built once per
+        method and smoothing and evaluated in batch; results only depend on
+        the data and the options.
+
+    """
+
+    def __init__(self, data):
+        data = np.asarray(data, dtype=float)
+        order = np.argsort(data[:, 0], kind='stable')
+
+        self.position = data[order, 0]/data[:, 0].max()
+        self.area = data[order, 1]
+        self.radius = np.sqrt(np.maximum(self.area, 0.)/np.pi)
+        self._interpolants = {}
+
+    def smoothed(self, smoothing=0.):
+        """ Radii smoothed with a Gaussian kernel of standard deviation
+            smoothing (in samples), with reflected ends"""
+
+        if smoothing <= 0.:
+            return self.radius
+
+        half = int(np.ceil(3.*smoothing))
+        kernel = np.exp(-0.5*(np.arange(-half, half + 1)/smoothing)**2)
+        padded = np.pad(self.radius, half, mode='reflect' if len(self.radius) > half else 'edge')
+
+        return np.convolve(padded, kernel/kernel.sum(), mode='valid')
+
+    def interpolant(self, method='linear', smoothing=0.):
+        """ Interpolant of the radius: 'linear' (extrapolated linearly, as
+            interp1d in Patient_specific.py) or 'pchip' (monotone cubic)"""
+
+        key = (method, float(smoothing))
+        if key not in self._interpolants:
+            radius = self.smoothed(smoothing)
+            if method == 'linear':
+                interpolant = scipy.interpolate.interp1d(self.position, radius, kind='linear',
+                                                         fill_value='extrapolate', assume_sorted=True)
+            elif method == 'pchip':
+                interpolant = scipy.interpolate.PchipInterpolator(self.position, radius, extrapolate=True)
+            else:
+                raise ValueError(f"Unknown interpolation method {method}")
+            self._interpolants[key] = interpolant
+
+        return self._interpolants[key]
+
+    def radii(self, positions, method='linear', smoothing=0., min_radius=0.):
+        """ Radii at normalized positions along the centerline, clamped to
+            min_radius"""
+
+        radii = self.interpolant(method, smoothing)(np.asarray(positions, dtype=float))
+        return np.maximum(radii, min_radius)
+
+    def radii_along(self, centerline, method='linear', smoothing=0., min_radius=0.):
+        """ Radii at the samples of a centerline, by their normalized arc length"""
+
+        return self.radii(centerline.arc_length/centerline.length, method, smoothing, min_radius)
@@ -0,0 +1,358 @@
+# =============================================================================
+#
+# Cohort.py
+#
+# Python module to generate cohorts of idealized AAA geometries in parallel
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import csv
+import json
+import time
+import hashlib
+import itertools
+import traceback
+import multiprocessing
+
+import Geometry
+import Idealized
+import Table
+import Pipeline
+
+
+def parameter_grid(grid):
+    """ List of cases with every combination of the values in grid.
+
+        grid is a dictionary with a sequence of values (or a single value) for
+        each parameter.
+    """
+
+    keys = sorted(grid)
+    values = [grid[key] if isinstance(grid[key], (list, tuple)) else [grid[key]] for key in keys]
+
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def load_cases(file):
+    """ Loads the cases of a cohort.
+
+        CSV files have one case per row and one parameter per column. JSON
+        files contain either a list of cases or a parameter grid.
+    """
+
+    if file.lower().endswith('.csv'):
+        with open(file, 'r', newline='') as input_file:
+            return [{key: float(value) for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(input_file)]
+
+    with open(file, 'r') as input_file:
+        data = json.load(input_file)
+
+    if isinstance(data, dict):
+        return parameter_grid(data)
+
+    return data
+
+
+# Names of the CORBA system exceptions raised when the SALOME servers are
+# temporarily unreachable
+_TRANSIENT_CORBA = ('TRANSIENT', 'COMM_FAILURE', 'TIMEOUT', 'NO_RESOURCES')
+
+
+def transient(error):
+    """ Whether an error may not happen again when a case is retried: I/O
+        errors other than missing or forbidden paths, lack of memory and
+        failures to reach the SALOME servers"""
+
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError)):
+        return False
+    if isinstance(error, (OSError, MemoryError, TimeoutError)):
+        return True
+
+    return type(error).__name__ in _TRANSIENT_CORBA
+
+
+def export_formats(backend, formats=None):
+    """ Export formats of the cases of a cohort: formats, which must be
+        supported by the backend, or by default those of Idealized.FORMATS
+        the backend supports"""
+
+    supported = Geometry.BACKENDS[backend].formats
+    if formats is None:
+        return tuple(f_type for f_type in Idealized.FORMATS if f_type in supported)
+
+    unsupported = [f_type for f_type in formats if f_type not in supported]
+    if unsupported:
+        raise ValueError(f"The {backend} backend cannot export {', '.join(unsupported)}; "
+                         f"use {', '.join(supported)}")
+
+    return tuple(formats)
+
+
+def run_case(case, params, output_dir, backend='occ', backend_options=None, formats=None,
+             retries=1, save=True, cache=None, cad_format='json', release_intermediates=False, study=True):
+    """ Builds, exports and saves one idealized model in output_dir/case.
+
+        Attempts failing with transient errors (see transient) are retried up
+        to retries times; other errors would fail again and are not retried.
+        The study shared by the domains of the process is cleared before and
+        after the case, so that it only saves the objects of the case and
+        does not grow over many cases. cache is the directory
+        of a geometry cache shared by the workers. cad_format is the format of
+        the properties saved (see Domain.save); study=False skips the SALOME
+        study. The geometry of the domain is released after each attempt, and with release_intermediates as soon
+        as it is not needed (see Domain.drop_intermediates), so workers do not
+        grow over many cases. The result is returned and written to case.json
+        in the case directory. formats defaults to the formats of
+        Idealized.FORMATS the backend supports (see export_formats).
+    """
+
+    formats = export_formats(backend, formats)
+
+    case_dir = os.path.join(output_dir, case)
+    os.makedirs(case_dir, exist_ok=True)
+
+    result = {'case': case, 'parameters': params, 'status': 'failed', 'attempts': 0, 'error': None}
+
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        start = time.time()
+
+        try:
+            with Geometry.Domain(backend=backend, cache=cache, release_intermediates=release_intermediates,
+                                 **(backend_options or {})) as d:
+                d.clear_study()
+                try:
+                    Idealized.build(d, **params)
+                    result['files'] = Idealized.export(d, case_dir, formats)
+                    if save:
+                        d.save(os.path.join(case_dir, f'{case}_study.hdf'), cad_format=cad_format, study=study)
+                    if d.cache is not None:
+                        result['cache'] = d.cache.stats()
+                    result['geometry'] = d.geometry_stats()
+                finally:
+                    d.clear_study()
+        except Exception as error:
+            result['error'] = traceback.format_exc()
+            result['transient'] = transient(error)
+            if result['transient']:
+                continue
+            break
+
+        result['status'] = 'done'
+        result['error'] = None
+        result.pop('transient', None)
+        result['time'] = time.time() - start
+        break
+
+    with open(os.path.join(case_dir, 'case.json'), 'w') as output_file:
+        json.dump(result, output_file, indent=2, sort_keys=True)
+
+    return result
+
+
+def _run_case(args):
+    case, params, output_dir, kwargs = args
+    return run_case(case, params, output_dir, **kwargs)
+
+
+def _done(output_dir, case):
+    try:
+        with open(os.path.join(output_dir, case, 'case.json'), 'r') as input_file:
+            return json.load(input_file)['status'] == 'done'
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def run_cohort(cases, output_dir, processes=None, skip_done=True, maxtasksperchild=None, **kwargs):
+    """ Generates a cohort of idealized models with a pool of worker processes.
+
+        cases is a list of parameter dictionaries (see Idealized.DEFAULTS). A
+        case may give its directory name with the key 'case'; otherwise cases
+        are named case_0000, case_0001, ... Each worker builds its own Domain.
+        Cases already done in output_dir are skipped when skip_done is True.
+        Remaining keyword arguments are passed to run_case; the export
+        formats are checked before starting the workers.
+
+        Each case clears the study of its worker (see run_case), so workers
+        can run any number of cases; maxtasksperchild=1 starts a fresh
+        process per case instead.
+
+        Returns the list of results, also written to output_dir/cohort.json.
+    """
+
+    kwargs['formats'] = export_formats(kwargs.get('backend', 'occ'), kwargs.get('formats'))
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = []
+    for i, params in enumerate(cases):
+        params = dict(params)
+        case = params.pop('case', f'case_{i:04d}')
+        Idealized.parameters(**params)
+        if skip_done and _done(output_dir, case):
+            continue
+        jobs.append((case, params, output_dir, kwargs))
+
+    start = time.time()
+    results = []
+    with multiprocessing.Pool(processes, maxtasksperchild=maxtasksperchild) as pool:
+        for result in pool.imap_unordered(_run_case, jobs):
+            print(f"Case {result['case']}: {result['status']} after {result['attempts']} attempt(s)")
+            results.append(result)
+
+    summary = {
+        'cases': len(cases),
+        'skipped': len(cases) - len(jobs),
+        'done': sum(result['status'] == 'done' for result in results),
+        'failed': [result['case'] for result in results if result['status'] != 'done'],
+        'time': time.time() - start,
+        'results': sorted(results, key=lambda result: result['case']),
+    }
+
+    with open(os.path.join(output_dir, 'cohort.json'), 'w') as output_file:
+        json.dump(summary, output_file, indent=2, sort_keys=True)
+
+    return summary['results']
+
+
+def load_properties(output_dir, out=None):
+    """ Properties of every case of a cohort saved with cad_format 'npz' or
+        'both', concatenated into one set of arrays (see Table.concatenate).
+
+        Cases are the subdirectories of output_dir with a table. Given out,
+        the values are written to that .npy file and memory-mapped.
+    """
+
+    cases, files = [], []
+    for case in sorted(os.listdir(output_dir)):
+        file = os.path.join(output_dir, case, f'{case}_study.hdf{Table.EXTENSION}')
+        if os.path.isfile(file):
+            cases.append(case)
+            files.append(file)
+
+    return Table.concatenate(files, out, cases)
+
+
+def checksum(file, chunk_size=2**20):
+    """ SHA-256 hash of the content of a file"""
+
+    digest = hashlib.sha256()
+    with open(file, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def run_pipeline(cases, output_dir, skip_done=True, backend='occ', backend_options=None, formats=None,
+                 save=True, cache=None, cad_format='json', release_intermediates=False, study=True, queue_size=2,
+                 export_workers=1, save_workers=1):
+    """ Generates a cohort of idealized models in one process with a pipeline
+        of build, export and save stages (see Pipeline).
+
+        The geometry of a case is built while the previous cases are being
+        exported, checksummed and saved; at most queue_size built cases wait
+        for each of the other stages. The stages share the GEOM engine of the
+        process, which is called holding Geometry.GEOM_LOCK, and the study,
+        which is cleared around the save of every case so that it only holds
+        the objects of that case (see Domain.save). The OCC backend therefore
+        requires publish='deferred' (the default here) or 'none', so that
+        building does not publish objects in the study being saved. Options
+        are those of run_case; failed cases are not retried. The export
+        formats are checked before any case is built.
+
+        Returns the list of results, also written to output_dir/cohort.json
+        with the metrics of the stages (items, busy, idle and blocked times,
+        throughput and queue depths).
+    """
+
+    formats = export_formats(backend, formats)
+    os.makedirs(output_dir, exist_ok=True)
+    backend_options = dict({'publish': 'deferred'} if backend == 'occ' else {}, **(backend_options or {}))
+    if backend_options.get('publish') == 'immediate':
+        raise ValueError("The pipeline requires publish='deferred' or 'none'")
+
+    jobs = []
+    for i, params in enumerate(cases):
+        params = dict(params)
+        case = params.pop('case', f'case_{i:04d}')
+        Idealized.parameters(**params)
+        if skip_done and _done(output_dir, case):
+            continue
+        jobs.append({'case': case, 'parameters': params, 'status': 'failed', 'attempts': 1, 'error': None})
+
+    def build(result):
+        result['start'] = time.time()
+        result['domain'] = Geometry.Domain(backend=backend, cache=cache, release_intermediates=release_intermediates,
+                                           **backend_options)
+        Idealized.build(result['domain'], **result['parameters'])
+        return result
+
+    def export(result):
+        case_dir = os.path.join(output_dir, result['case'])
+        os.makedirs(case_dir, exist_ok=True)
+        result['files'] = Idealized.export(result['domain'], case_dir, formats)
+        result['checksums'] = {os.path.basename(file): checksum(file) for file in result['files']}
+        return result
+
+    def finish(result):
+        d = result.pop('domain')
+        with d:
+            if save:
+                d.save(os.path.join(output_dir, result['case'], f"{result['case']}_study.hdf"), cad_format=cad_format,
+                       study=study, clear_study=True)
+            if d.cache is not None:
+                result['cache'] = d.cache.stats()
+            result['geometry'] = d.geometry_stats()
+
+        result['status'] = 'done'
+        result['time'] = time.time() - result.pop('start')
+        write(result)
+        return result
+
+    def write(result):
+        os.makedirs(os.path.join(output_dir, result['case']), exist_ok=True)
+        with open(os.path.join(output_dir, result['case'], 'case.json'), 'w') as output_file:
+            json.dump(result, output_file, indent=2, sort_keys=True)
+
+    pipeline = Pipeline.Pipeline([Pipeline.Stage('build', build, 1, queue_size),
+                                  Pipeline.Stage('export', export, export_workers, queue_size),
+                                  Pipeline.Stage('save', finish, save_workers, queue_size)])
+
+    start = time.time()
+    outcome = pipeline.run(jobs)
+
+    results = outcome['done']
+    for failure in outcome['failed']:
+        result = failure['item']
+        d = result.pop('domain', None)
+        if d is not None:
+            d.release()
+        result.pop('start', None)
+        result['error'] = f"{failure['stage']}: {failure['error']}"
+        write(result)
+        results.append(result)
+
+    for result in results:
+        print(f"Case {result['case']}: {result['status']}")
+
+    summary = {
+        'cases': len(cases),
+        'skipped': len(cases) - len(jobs),
+        'done': sum(result['status'] == 'done' for result in results),
+        'failed': [result['case'] for result in results if result['status'] != 'done'],
+        'time': time.time() - start,
+        'pipeline': pipeline.stats(),
+        'results': sorted(results, key=lambda result: result['case']),
+    }
+
+    with open(os.path.join(output_dir, 'cohort.json'), 'w') as output_file:
+        json.dump(summary, output_file, indent=2, sort_keys=True)
+
+    return summary['results']
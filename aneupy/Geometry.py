@@ -11,76 +11,1307 @@
 # =============================================================================
 #!/usr/bin/env python3
 
+import gc
 import os
 import sys
 import math
 import json
+import time
+import shutil
+import tempfile
+import threading
+import concurrent.futures
+
+import numpy as np
+
+try:
+    import salome
+    import GEOM
+    from salome.geom import geomBuilder
+    import SALOMEDS
+except ImportError:
+    # Only the NumPy backend is available outside a SALOME session
+    salome = GEOM = geomBuilder = SALOMEDS = None
+
+import Mesh
+import Cache
+import Profiling
+import Graph
+import Preview
+import Recipe
+import Table
+
+
+class Backend(object):
+    """ Interface between Domain and the geometry kernel.
+
+        A backend creates the sections, shells and solids of a Domain, exports
+        solids and computes the properties written by Domain.save. Entities
+        created by a backend must provide the Section methods used by the
+        scripts (rotateX, rotateY, rotateZ, add_circle, add_circle2).
 
-import salome
-import GEOM
-from salome.geom import geomBuilder
-import SALOMEDS
+    """
+
+    name = None
+
+    # Name of the file storing an entity in the geometry cache
+    geometry_file = None
+
+    # Whether the kernel runs calls from several threads concurrently
+    parallel = True
+
+    # Export formats implemented by the backend
+    formats = ()
+
+    def settings(self):
+        """ Backend settings that change the geometry of shells and solids"""
+
+        return {}
+
+    def export_settings(self, format):
+        """ Backend settings that change the exported files of a format"""
+
+        return {}
+
+    def make_section(self, name, **kwargs):
+        raise NotImplementedError
+
+    def make_sections(self, names, origins, frames, radii, **kwargs):
+        """ Sections with a circle of radius radii[i] in the XY plane of the
+            LCS given by origins[i] and the rows OX, OY of frames[i]"""
+
+        sections = []
+        for name, origin, frame, radius in zip(names, origins.tolist(), frames.tolist(), radii.tolist()):
+            section = self.make_section(name, origin=origin, OX_LCS=frame[0], OY_LCS=frame[1], **kwargs)
+            section.add_circle(radius=radius)
+            sections.append(section)
+
+        return sections
+
+    def make_shell(self, name, sections, **kwargs):
+        raise NotImplementedError
+
+    def make_solid_from_shell(self, name, shell, **kwargs):
+        raise NotImplementedError
+
+    def make_solid_from_cut(self, name, solids, check=True, **kwargs):
+        """ Solid of solids[0] minus solids[1]; check enables the
+            self-intersection check of the operands"""
+
+        raise NotImplementedError
+
+    def nests(self, solids):
+        """ True if the wall between two solids made from nested shells with
+            shared end planes can be built by make_solid_from_nested"""
+
+        return False
+
+    def make_solid_from_nested(self, name, solids, **kwargs):
+        """ Wall between two solids made from nested shells, built from the
+            shells without a Boolean operation"""
+
+        raise NotImplementedError
+
+    def make_solid_from_offset(self, name, shell, thickness, inner=None, **kwargs):
+        """ Solid enclosed by a lofted shell offset outwards by thickness, one
+            value per section of the shell. inner is an optional solid offset
+            from the same shell by a smaller thickness, which the backend may
+            offset instead of the shell."""
+
+        raise NotImplementedError
+
+    def export_iges(self, solid, file):
+        raise NotImplementedError(f"IGES export is not available in the {self.name} backend")
+
+    def export_stl(self, solid, file, triangles=None, tolerance=None):
+        """ Writes an STL file and returns a tessellation report (see
+            Mesh.tessellate). tolerance is the chord deviation relative to the
+            bounding box diagonal and triangles a target triangle count."""
+
+        raise NotImplementedError(f"STL export is not available in the {self.name} backend")
+
+    def export_vtk(self, solid, file, triangles=None, tolerance=None):
+        raise NotImplementedError(f"VTK export is not available in the {self.name} backend")
+
+    def export_step(self, solid, file):
+        raise NotImplementedError(f"STEP export is not available in the {self.name} backend")
+
+    def tessellate(self, solid, chunk_size=Mesh.CHUNK_SIZE, triangles=None, tolerance=None):
+        """ Yields the triangles of a solid in arrays (chunk_size, 3, 3)"""
+
+        raise NotImplementedError(f"Tessellation is not available in the {self.name} backend")
+
+    def properties(self, entity):
+        raise NotImplementedError
+
+    def save_study(self, file):
+        """ Saves the study of the kernel, if any, and returns its path"""
+
+        return None
+
+    def publish_all(self):
+        """ Publishes the entities whose publication in the study was deferred"""
+
+        pass
+
+    def publication_stats(self):
+        return {}
+
+    def clear_study(self):
+        """ Removes every object from the study of the kernel, if any"""
+
+        pass
+
+    def release(self):
+        """ Drops the references to entities kept by the kernel, if any"""
+
+        pass
+
+    def store(self, entity, file):
+        """ Writes the geometry of a shell or solid to file"""
+
+        raise NotImplementedError
+
+    def load_shell(self, name, sections, file, **kwargs):
+        raise NotImplementedError
+
+    def load_solid(self, name, file, **kwargs):
+        raise NotImplementedError
+
+
+class OCCBackend(Backend):
+    """ Builds entities with the SALOME GEOM module (OpenCASCADE)"""
+
+    name = 'occ'
+
+    geometry_file = 'geometry.brep'
+
+    # Calls to GEOM are serialized by GEOM_LOCK
+    parallel = False
+
+    formats = ('iges', 'stl', 'vtk', 'step')
+
+    iges_version = '5.3'
+    stl_deflection = 0.0001
+    vtk_deflection = 0.001
+
+    def __init__(self, publish='immediate', profile=False):
+
+        self.session = Session(publish, profile)
+        self.study = self.session.study
+        self.geompy = self.session.geompy
+        self.publisher = self.session.publisher
+        self.profiler = self.session.profiler
+
+    def make_section(self, name, **kwargs):
+        return Section(name, session=self.session, **kwargs)
+
+    def make_sections(self, names, origins, frames, radii, **kwargs):
+        # The rotation matrices of all the LCS are computed at once and the
+        # sections are made without the LCS marker
+        R = Mesh.frames_from_axes(frames)
+        sections = []
+        for name, origin, frame, R_LCS, radius in zip(names, origins.tolist(), frames[:, :2].tolist(), R,
+                                                      radii.tolist()):
+            section = Section(name, origin, OX_LCS=frame[0], OY_LCS=frame[1], R=R_LCS, lcs=False,
+                              session=self.session, **kwargs)
+            section.add_circle(radius=radius)
+            sections.append(section)
+
+        return sections
+
+    def make_shell(self, name, sections, **kwargs):
+        return Shell(name, sections, session=self.session, **kwargs)
+
+    def make_solid_from_shell(self, name, shell, **kwargs):
+        solid = self.geompy.MakeSolid([shell.geom])
+        return Solid(name, solid, session=self.session, **kwargs)
+
+    def make_solid_from_cut(self, name, solids, check=True, **kwargs):
+        solid = self.geompy.MakeCut(solids[0].geom, solids[1].geom, checkSelfInte=check)
+        return Solid(name, solid, session=self.session, **kwargs)
+
+    def nests(self, solids):
+        # Shells loaded from the cache have no lateral face
+        return all(getattr(getattr(solid, 'shell', None), 'face', None) is not None for solid in solids)
+
+    def make_solid_from_nested(self, name, solids, **kwargs):
+        """ The lateral faces of the shells are sewn to the annuli between
+            their end circles"""
+
+        geompy = self.geompy
+        outer, inner = solids[0].shell, solids[1].shell
+
+        def edge(section):
+            # Sections whose intermediates were released keep their circle only
+            if 'edge' in section.bases:
+                return section.bases['edge']
+            center, normal, radius = section.circle()
+            return geompy.MakeCircle(geompy.MakeVertex(*np.asarray(center, dtype=float).tolist()),
+                                     geompy.MakeVectorDXDYDZ(*np.asarray(normal, dtype=float).tolist()), radius)
+
+        annuli = [geompy.MakeFaceWires([geompy.MakeWire([edge(a)]), geompy.MakeWire([edge(b)])], isPlanarWanted=True)
+                  for a, b in ((outer.sections[0], inner.sections[0]), (outer.sections[-1], inner.sections[-1]))]
+        sewing = geompy.MakeSewing([outer.face, inner.face] + annuli, 1.E-4)
+        solid = geompy.MakeSolid([geompy.MakeShell([sewing])])
+
+        return Solid(name, solid, session=self.session, **kwargs)
+
+    def make_solid_from_offset(self, name, shell, thickness, inner=None, **kwargs):
+        """ A constant thickness offsets the solid of the shell (MakeOffset)
+            and trims it at the planes of the end sections, so no new
+            sections are lofted. The same applies to a thickness exceeding
+            that of inner by a constant, e.g. a wall layer of constant
+            thickness around a layer whose thickness varies: inner is offset
+            by the difference. The kernel cannot offset by a variable
+            thickness: the circles of the sections are offset in their planes
+            (see Mesh.offset_radii) and lofted instead."""
+
+        geompy = self.geompy
+
+        base = None
+        if np.ptp(thickness) == 0.:
+            base, offset = geompy.MakeSolid([shell.geom]), float(thickness[0])
+        elif getattr(inner, 'thickness', None) is not None:
+            difference = thickness - inner.thickness
+            if np.ptp(difference) <= 1.E-9*max(1., np.abs(difference).max()) and difference[0] > 0.:
+                base, offset = inner.geom, float(np.mean(difference))
+
+        if base is not None:
+            solid = geompy.MakeOffset(base, offset)
+
+            # Remove the offset of the end caps beyond the planes of the end sections
+            xmin, xmax, ymin, ymax, zmin, zmax = geompy.BoundingBox(solid)
+            size = 2.*math.sqrt((xmax - xmin)**2 + (ymax - ymin)**2 + (zmax - zmin)**2)
+            first, last = shell.sections[0].circle(), shell.sections[-1].circle()
+            for (center, normal, _), other in ((first, last[0]), (last, first[0])):
+                normal = np.asarray(normal, dtype=float)
+                if np.dot(normal, np.subtract(center, other)) < 0.:
+                    normal = -normal
+                tool = geompy.MakeCylinder(geompy.MakeVertex(*np.asarray(center, dtype=float).tolist()),
+                                           geompy.MakeVectorDXDYDZ(*normal.tolist()), size, size)
+                solid = geompy.MakeCut(solid, tool)
+        else:
+            centers, normals, radii = Mesh.offset_radii(shell.sections, thickness)
+            edges = [geompy.MakeCircle(geompy.MakeVertex(*center), geompy.MakeVectorDXDYDZ(*normal), radius)
+                     for center, normal, radius in zip(centers.tolist(), np.asarray(normals, dtype=float).tolist(),
+                                                       radii.tolist())]
+            face = geompy.MakeFilling(geompy.MakeCompound(edges), 10, 20, 1.E-5, 1.E-5, 100, GEOM.FOM_Default, True)
+            caps = [geompy.MakeFaceWires([edge], isPlanarWanted=True) for edge in (edges[0], edges[-1])]
+            solid = geompy.MakeSolid([geompy.MakeShell([geompy.MakeSewing([face] + caps, 1.E-4)])])
+
+        return Solid(name, solid, session=self.session, **kwargs)
+
+    def export_settings(self, format):
+        return {'iges': {'version': self.iges_version},
+                'stl': {'deflection': self.stl_deflection},
+                'vtk': {'deflection': self.vtk_deflection}}.get(format, {})
+
+    def export_iges(self, solid, file):
+        self.geompy.ExportIGES(solid.geom, file, theVersion=self.iges_version)
+
+    def export_stl(self, solid, file, triangles=None, tolerance=None):
+        # Export the STL
+        #self.geompy.ExportSTL(solid.geom, file, False)
+        if triangles is None and tolerance is None:
+            self.geompy.ExportSTL(solid.geom, file, False, self.stl_deflection) #Custom linear deflection
+            return self._stl_report(solid, file, self.stl_deflection)
+
+        return self._adaptive_stl(solid, file, triangles, tolerance)
+
+    def export_vtk(self, solid, file, triangles=None, tolerance=None):
+        if triangles is None and tolerance is None:
+            self.geompy.ExportVTK(solid.geom, file, self.vtk_deflection)
+            return {'triangles': None, 'deviation': self.vtk_deflection, 'relative_deviation': None, 'tolerance': None}
+
+        handle, stl_file = tempfile.mkstemp(suffix='.stl')
+        os.close(handle)
+        try:
+            report = self._adaptive_stl(solid, stl_file, triangles, tolerance)
+            with Mesh.VTKWriter(file, solid.name) as output:
+                for chunk in Mesh.read_stl_chunks(stl_file):
+                    output.write(chunk)
+        finally:
+            os.remove(stl_file)
+
+        return report
+
+    def export_step(self, solid, file):
+        self.geompy.ExportSTEP(solid.geom, file)
+
+    def _diagonal(self, solid):
+        xmin, xmax, ymin, ymax, zmin, zmax = self.geompy.BoundingBox(solid.geom)
+        return math.sqrt((xmax - xmin)**2 + (ymax - ymin)**2 + (zmax - zmin)**2)
+
+    def _stl_report(self, solid, file, deflection, diagonal=None, tolerance=None):
+        """ Report of an STL written with a linear deflection, which bounds
+            the deviation of the triangles from the surface"""
+
+        with open(file, 'rb') as input_file:
+            input_file.seek(80)
+            count = int(np.frombuffer(input_file.read(4), dtype='<u4')[0])
+
+        diagonal = diagonal or self._diagonal(solid)
+        return {'triangles': count, 'deviation': deflection, 'relative_deviation': deflection/diagonal,
+                'tolerance': tolerance}
+
+    def _adaptive_stl(self, solid, file, triangles=None, tolerance=None):
+        """ Writes a binary STL with a deflection relative to the bounding box.
+
+            The mesher of the kernel already refines curved regions more than
+            flat ones for a given deflection. For a target number of triangles
+            the deflection is corrected with the secant of log(triangles)
+            against log(deflection), starting from a slope of -1.
+        """
+
+        diagonal = self._diagonal(solid)
+
+        if triangles is None:
+            deflection = tolerance*diagonal
+            self.geompy.ExportSTL(solid.geom, file, False, deflection)
+            return self._stl_report(solid, file, deflection, diagonal, tolerance)
+
+        deflection = (tolerance or 1.E-3)*diagonal
+        slope, previous, best = -1., None, None
+        for _ in range(8):
+            self.geompy.ExportSTL(solid.geom, file + '.tmp', False, deflection)
+            report = self._stl_report(solid, file + '.tmp', deflection, diagonal, deflection/diagonal)
+            count = max(report['triangles'], 1)
+
+            if best is None or abs(math.log(count/triangles)) < abs(math.log(max(best['triangles'], 1)/triangles)):
+                os.replace(file + '.tmp', file)
+                best = report
+            if abs(count - triangles) <= 0.05*triangles:
+                break
+
+            if previous is not None and count != previous[1] and deflection != previous[0]:
+                slope = min(-0.1, math.log(count/previous[1])/math.log(deflection/previous[0]))
+            previous = (deflection, count)
+            deflection *= math.exp(math.log(triangles/count)/slope)
+
+        if os.path.exists(file + '.tmp'):
+            os.remove(file + '.tmp')
+
+        return best
+
+    def tessellate(self, solid, chunk_size=Mesh.CHUNK_SIZE, triangles=None, tolerance=None):
+        # GEOM gives no access to the triangulation: read it back from a binary STL
+        handle, file = tempfile.mkstemp(suffix='.stl')
+        os.close(handle)
+        try:
+            self.export_stl(solid, file, triangles, tolerance)
+            for chunk in Mesh.read_stl_chunks(file, chunk_size):
+                yield chunk
+        finally:
+            os.remove(file)
+
+    def properties(self, entity):
+
+        # Closed-form values for circular sections
+        if isinstance(entity, Section) and entity.circle() is not None:
+            return Mesh.circle_properties(*entity.circle())
+
+        BasicProperties = self.geompy.BasicProperties(entity.geom)
+        Inertia = self.geompy.Inertia(entity.geom)
+        CDG = self.geompy.PointCoordinates(self.geompy.MakeCDG(entity.geom))
+
+        info = {}
+        info['Length'] = BasicProperties[0]
+        info['Area'] = BasicProperties[1]
+        info['Volume'] = BasicProperties[2]
+        info['I11'] = Inertia[0]
+        info['I12'] = Inertia[1]
+        info['I13'] = Inertia[2]
+        info['I21'] = Inertia[3]
+        info['I22'] = Inertia[4]
+        info['I23'] = Inertia[5]
+        info['I31'] = Inertia[6]
+        info['I32'] = Inertia[7]
+        info['I33'] = Inertia[8]
+        info['Ix'] = Inertia[9]
+        info['Iy'] = Inertia[10]
+        info['Iz'] = Inertia[11]
+        info['CDG'] = CDG
+
+        return info
+
+    def save_study(self, file):
+        with GEOM_LOCK:
+            self.study.SaveAs(file, self.study, False)
+        return file
+
+    def store(self, entity, file):
+        self.geompy.ExportBREP(entity.geom, file)
+
+    def load_shell(self, name, sections, file, **kwargs):
+        return Shell(name, sections, geom=self.geompy.ImportBREP(file), session=self.session, **kwargs)
+
+    def load_solid(self, name, file, **kwargs):
+        return Solid(name, self.geompy.ImportBREP(file), session=self.session, **kwargs)
+
+    def publish_all(self):
+        self.publisher.flush()
+
+    def clear_study(self):
+        self.session.clear_study()
+
+    def release(self):
+        # Objects queued for deferred publication are not saved any more
+        self.publisher.queue = []
+
+    def publication_stats(self):
+        return self.publisher.stats()
+
+
+class MeshBackend(Backend):
+    """ Builds triangulated surfaces with NumPy, without a SALOME session.
+
+        Sections are discretized with resolution points and shells are lofted
+        with subdivisions rings between consecutive sections. Solids can only
+        be exported to STL and VTK; keep the OCC backend for CAD output.
+
+    """
+
+    name = 'numpy'
+
+    geometry_file = 'geometry.npz'
+
+    formats = ('stl', 'vtk')
+
+    def __init__(self, resolution=64, subdivisions=8):
+        self.resolution = resolution
+        self.subdivisions = subdivisions
+
+    def settings(self):
+        return {'resolution': self.resolution, 'subdivisions': self.subdivisions}
+
+    def make_section(self, name, **kwargs):
+        kwargs.setdefault('resolution', self.resolution)
+        return Mesh.Section(name, **kwargs)
+
+    def make_sections(self, names, origins, frames, radii, **kwargs):
+        kwargs.setdefault('resolution', self.resolution)
+        return Mesh.circular_sections(names, origins, frames, radii, **kwargs)
+
+    def make_shell(self, name, sections, **kwargs):
+        kwargs.setdefault('resolution', self.resolution)
+        kwargs.setdefault('subdivisions', self.subdivisions)
+        return Mesh.Shell(name, sections, **kwargs)
+
+    def make_solid_from_shell(self, name, shell, **kwargs):
+        return Mesh.solid_from_shell(name, shell, **kwargs)
+
+    def make_solid_from_cut(self, name, solids, check=True, **kwargs):
+        return Mesh.solid_from_cut(name, solids[0], solids[1], **kwargs)
+
+    def nests(self, solids):
+        return all(getattr(solid, 'rings', None) is not None for solid in solids)
+
+    def make_solid_from_nested(self, name, solids, **kwargs):
+        # solid_from_cut joins the end rings of lofted solids with annuli
+        return Mesh.solid_from_cut(name, solids[0], solids[1], **kwargs)
+
+    def make_solid_from_offset(self, name, shell, thickness, inner=None, **kwargs):
+        return Mesh.solid_from_shell(name, Mesh.offset_shell(name, shell, thickness), **kwargs)
+
+    def export_stl(self, solid, file, triangles=None, tolerance=None):
+        solid, report = Mesh.tessellate(solid, tolerance, triangles)
+        Mesh.write_stl(file, solid.vertices, solid.faces)
+        return report
+
+    def export_vtk(self, solid, file, triangles=None, tolerance=None):
+        solid, report = Mesh.tessellate(solid, tolerance, triangles)
+        Mesh.write_vtk(file, solid.vertices, solid.faces, title=solid.name)
+        return report
+
+    def tessellate(self, solid, chunk_size=Mesh.CHUNK_SIZE, triangles=None, tolerance=None):
+        solid, _ = Mesh.tessellate(solid, tolerance, triangles)
+        return Mesh.triangles(solid.vertices, solid.faces, chunk_size)
+
+    def properties(self, entity):
+        return Mesh.properties(entity, volume=isinstance(entity, Mesh.Solid))
+
+    def store(self, entity, file):
+        Mesh.save(file, entity)
+
+    def load_shell(self, name, sections, file, **kwargs):
+        kwargs.setdefault('resolution', self.resolution)
+        kwargs.setdefault('subdivisions', self.subdivisions)
+        return Mesh.Shell(name, sections, rings=Mesh.load(file)['rings'], **kwargs)
+
+    def load_solid(self, name, file, **kwargs):
+        return Mesh.Solid(name, **dict(Mesh.load(file), **kwargs))
+
+
+BACKENDS = {
+    'occ': OCCBackend,
+    'numpy': MeshBackend,
+}
+
+ENTITY_TYPES = ('sections', 'shells', 'solids')
+
+# Validation levels of add_solid_from_cut
+CUT_VALIDATION = ('full', 'containment', 'none')
+
+# Files with the properties of the entities written by Domain.save
+CAD_FORMATS = ('json', 'npz', 'both')
+
+
+# Single thread writing studies in the background, in the order they are saved
+_STUDY_WRITER = None
+_PENDING_STUDIES = []
+_PENDING_LOCK = threading.Lock()
+
+# The GEOM engine and the study are shared by all the sessions of a process
+# and are not thread-safe: every call to them is made holding this lock
+GEOM_LOCK = threading.RLock()
+
+
+def wait_for_studies():
+    """ Waits until the studies being saved in the background are written
+        and returns their paths. Errors of the writes are raised here."""
+
+    with _PENDING_LOCK:
+        pending = list(_PENDING_STUDIES)
+
+    # Handles are only removed once written, so that concurrent callers wait for them too
+    try:
+        return [handle.result() for handle in pending]
+    finally:
+        with _PENDING_LOCK:
+            for handle in pending:
+                if handle.done() and handle in _PENDING_STUDIES:
+                    _PENDING_STUDIES.remove(handle)
+
+
+def objects(entity):
+    """ Distinct geometry objects held by an entity: GEOM objects or NumPy
+        arrays in the attributes listed in the OBJECTS of its class"""
+
+    found = {}
+    for attribute in getattr(entity, 'OBJECTS', ()):
+        value = getattr(entity, attribute, None)
+        for item in value.values() if isinstance(value, dict) else value if isinstance(value, list) else [value]:
+            if item is not None and item is not entity:
+                found[id(item)] = item
+
+    return list(found.values())
+
+
+def _release(entity):
+    """ Drops the intermediates of an entity (INTERMEDIATES of its class)
+        and returns the number of objects released"""
+
+    count = len(objects(entity))
+    for attribute in getattr(entity, 'INTERMEDIATES', ()):
+        value = getattr(entity, attribute, None)
+        setattr(entity, attribute, {} if isinstance(value, dict) else [] if isinstance(value, list) else None)
+
+    return count - len(objects(entity))
+
+# Export format of each file extension
+EXPORT_FORMATS = {'.iges': 'iges', '.igs': 'iges', '.step': 'step', '.stp': 'step', '.stl': 'stl', '.vtk': 'vtk'}
 
 
 class Domain(object):
+    """ Collection of sections, shells and solids of a model.
+
+        backend is either the name of a backend in BACKENDS ('occ' by default,
+        'numpy' to run without SALOME) or a Backend instance. Remaining keyword
+        arguments are passed to the backend constructor.
+
+        cache is a Cache.GeometryCache, or the directory of one, used to reuse
+        shells, solids and exported files built with identical inputs.
 
-    def __init__(self, **kwargs):
+        For batch runs, Domain(publish='deferred') publishes the entities of
+        the OCC backend in the study in one batch at save, and
+        Domain(publish='none') does not publish them at all (see Publisher).
+
+        Domain(profile=True) records every call of the OCC backend to the
+        geometry builder in self.profiler; write the timeline and summaries
+        with self.profiler.write('trace.json') (see Profiling.Profiler).
+
+        Domain(release_intermediates=True) drops the GEOM objects only needed
+        to loft shells (the bases, origin and LCS of the sections, the
+        compound of the shells) as soon as a solid is built from them (see
+        drop_intermediates); release() drops everything and is called at the
+        end of a with block. geometry_stats() counts the objects held.
+
+        Every shell, solid and exported file is recorded in self.graph with
+        the entities it was built from (see Graph.Graph). After editing
+        sections (e.g. d.sections['a4'].add_circle(radius=6.)), outdated()
+        lists what would be rebuilt and rebuild() rebuilds only that.
+
+        The calls that build the model are recorded as well: recipe() returns
+        them as a versioned recipe that replay() rebuilds on any backend (see
+        Recipe).
+
+    """
+
+    def __init__(self, backend='occ', cache=None, release_intermediates=False, **kwargs):
         self.sections = {}
         self.shells = {}
         self.solids = {}
 
-	# Initialize SALOME study
-        salome.salome_init()
-        self.study = salome.myStudy
+        if isinstance(backend, Backend):
+            self.backend = backend
+        else:
+            self.backend = BACKENDS[backend](**kwargs)
 
-        # Initialize GEOM module without the 'study' argument
-        self.geompy = geomBuilder.New()
+        if isinstance(cache, str):
+            cache = Cache.GeometryCache(cache)
+        self.cache = cache
 
-        self.geompy.addToStudyAuto(0)
+        # Memoized properties: (entity type, name) -> (entity, version, properties)
+        self._properties = {}
+
+        # Validation, method and times of the cuts (see cut_stats)
+        self.cuts = {}
+
+        self.study = getattr(self.backend, 'study', None)
+        self.geompy = getattr(self.backend, 'geompy', None)
+        self.profiler = getattr(self.backend, 'profiler', None)
+
+        self.graph = Graph.Graph(self._stamp)
+
+        # Recorded calls: section operations in call order and the operation
+        # building every node of the graph (see recipe)
+        self._section_operations = {}
+        self._operations = {}
+
+        # Geometry objects held per entity, their current and peak total and the objects released
+        self.release_intermediates = release_intermediates
+        self._objects = {}
+        self._counts = {'current': 0, 'peak': 0, 'released': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def _track(self, entity_type, name):
+        """ Updates the count of geometry objects after adding an entity"""
+
+        count = len(objects(getattr(self, entity_type)[name]))
+        self._counts['current'] += count - self._objects.get((entity_type, name), 0)
+        self._counts['peak'] = max(self._counts['peak'], self._counts['current'])
+        self._objects[(entity_type, name)] = count
+
+    def _built(self, name):
+        """ Tracks a new solid and releases the intermediates it was built from"""
+
+        self._track('solids', name)
+        if self.release_intermediates:
+            self.drop_intermediates([('solids', name)])
+
+    def _stamp(self, node):
+        """ Stamp of a section, changed by any edit or replacement"""
+
+        entity = getattr(self, node[0]).get(node[1])
+        return None if entity is None else (id(entity), getattr(entity, 'version', 0))
+
+    def _cached(self, kind, key, make, load):
+        """ Loads an entity from the cache or makes it and stores it"""
+
+        if self.cache is None or self.backend.geometry_file is None:
+            return make()
+
+        entity = self.cache.fetch(key, self.backend.geometry_file, kind=kind, read=load)
+        if entity is None:
+            entity = make()
+            self.cache.store(key, self.backend.geometry_file, lambda path: self.backend.store(entity, path), kind=kind)
 
-        O = self.geompy.MakeVertex(0, 0, 0)
-        OX = self.geompy.MakeVectorDXDYDZ(1, 0, 0)
-        OY = self.geompy.MakeVectorDXDYDZ(0, 1, 0)
-        OZ = self.geompy.MakeVectorDXDYDZ(0, 0, 1)
+        entity.key = key
+        return entity
 
     def add_section(self, name, **kwargs):
 
-        self.sections[name] = Section(name, **kwargs)
+        self.sections[name] = self.backend.make_section(name, **kwargs)
+        self._section_operations[name] = {'op': 'add_section', 'name': name, 'kwargs': kwargs}
+        self._track('sections', name)
+
+    def add_sections(self, prefix, origins, radii, normals=None, frames=None, shell=True, folder=False, **kwargs):
+        """ Adds a family of circular sections and, if shell is True, the
+            shell lofted through them, in one call.
+
+            origins is an array (N, 3) and radii an array (N,) or a single
+            radius. The plane of each circle is given by normals (N, 3) or by
+            frames (N, 3, 3) with rows OX, OY and OZ; the default is the XY
+            plane. Sections are named prefix0, prefix1, ... and the shell
+            prefix_shell. Remaining keyword arguments are passed to the shell.
+
+            Returns the names of the sections.
+        """
+
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        n = len(origins)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (n,))
+
+        if frames is not None:
+            frames = np.asarray(frames, dtype=float).reshape(n, 3, 3)
+        elif normals is not None:
+            frames = Mesh.frames_from_normals(np.asarray(normals, dtype=float).reshape(n, 3))
+        else:
+            frames = np.broadcast_to(np.eye(3), (n, 3, 3))
+
+        names = [f'{prefix}{i}' for i in range(n)]
+        sections = self.backend.make_sections(names, origins, frames, radii, folder=folder)
+        self.sections.update(zip(names, sections))
+        for name in names:
+            self._track('sections', name)
+        self._section_operations[('sections', prefix)] = {'op': 'add_sections', 'prefix': prefix, 'origins': origins,
+                                                          'radii': radii, 'frames': frames, 'folder': folder}
+
+        if shell:
+            self._add_shell(f'{prefix}_shell', sections, **kwargs)
+
+        return names
 
     def add_shell(self, name, sections, **kwargs):
 
-        sections_list = []
-        for section in sections:
-            sections_list.append(self.sections[section])
+        self._add_shell(name, [self.sections[section] for section in sections], **kwargs)
+
+    def _add_shell(self, name, sections_list, **kwargs):
+
+        key = Cache.key('shell', self.backend.name, self.backend.settings(),
+                        [section.signature() for section in sections_list],
+                        {option: value for option, value in kwargs.items() if option != 'folder'})
 
-        self.shells[name] = Shell(name, sections_list, **kwargs)
+        self.shells[name] = self._cached('shells', key,
+                                         lambda: self.backend.make_shell(name, sections_list, **kwargs),
+                                         lambda file: self.backend.load_shell(name, sections_list, file, **kwargs))
+
+        sections = [section.name for section in sections_list]
+        self.graph.record(('shells', name), [('sections', section) for section in sections],
+                          lambda: self.add_shell(name, sections, **kwargs))
+        self._operations[('shells', name)] = {'op': 'add_shell', 'name': name, 'sections': sections, 'kwargs': kwargs}
+        self._track('shells', name)
 
     def add_solid_from_shell(self, name, shell, **kwargs):
 
-        solid = self.geompy.MakeSolid([self.shells[shell].geom])
-        self.solids[name] = Solid(name, solid, **kwargs)
+        shell_name, shell = shell, self.shells[shell]
+        key = Cache.key('solid_from_shell', getattr(shell, 'key', None))
+
+        self.solids[name] = self._cached('solids', key,
+                                         lambda: self.backend.make_solid_from_shell(name, shell, **kwargs),
+                                         lambda file: self.backend.load_solid(name, file, **kwargs))
+        self.solids[name].shell = shell
+        self.solids[name].circles = Mesh.circles(shell.sections)
+
+        self.graph.record(('solids', name), [('shells', shell_name)],
+                          lambda: self.add_solid_from_shell(name, shell_name, **kwargs))
+        self._operations[('solids', name)] = {'op': 'add_solid_from_shell', 'name': name, 'shell': shell_name,
+                                              'kwargs': kwargs}
+        self._built(name)
+
+    def add_solid_from_cut(self, name, solids, validation='full', nested=False, **kwargs):
+        """ Adds the solid of solids[0] minus solids[1].
+
+            validation is one of CUT_VALIDATION: 'full' checks the operands
+            for self-intersections in the Boolean operation, 'containment'
+            only checks with NumPy that the sections of the inner solid lie
+            inside the outer one (see Mesh.clearance), falling back to 'full'
+            when the sections are unknown, and 'none' checks nothing.
+
+            nested builds the wall directly from the shells of two solids
+            lofted with shared end planes, without a Boolean operation; other
+            solids are cut as usual. The times of the check and of the
+            construction are reported by cut_stats.
+        """
+
+        if validation not in CUT_VALIDATION:
+            raise ValueError(f"Unknown validation level {validation}")
+
+        solid_names, solids = list(solids), [self.solids[solid] for solid in solids]
+        circles = [getattr(solid, 'circles', None) for solid in solids]
+
+        start = time.perf_counter()
+        level = validation
+        if level == 'containment':
+            if any(item is None for item in circles):
+                level = 'full'
+            else:
+                gap = Mesh.clearance(*circles)
+                if gap <= 0.:
+                    raise ValueError(f"Solid {solid_names[1]} is not contained in {solid_names[0]} (clearance {gap})")
+        check = time.perf_counter() - start
+
+        nests = nested and all(getattr(solid, 'shell', None) is not None and item is not None
+                               for solid, item in zip(solids, circles)) and \
+            Mesh.shared_ends(*circles) and self.backend.nests(solids)
+
+        key = Cache.key('solid_from_cut', [getattr(solid, 'key', None) for solid in solids], *(['nested'] if nests else []))
+
+        if nests:
+            make = lambda: self.backend.make_solid_from_nested(name, solids, **kwargs)
+        else:
+            make = lambda: self.backend.make_solid_from_cut(name, solids, check=level == 'full', **kwargs)
+
+        start = time.perf_counter()
+        self.solids[name] = self._cached('solids', key, make, lambda file: self.backend.load_solid(name, file, **kwargs))
+        self.cuts[name] = {'validation': level, 'method': 'nested' if nests else 'boolean',
+                           'check': check, 'build': time.perf_counter() - start}
+
+        self.graph.record(('solids', name), [('solids', solid) for solid in solid_names],
+                          lambda: self.add_solid_from_cut(name, solid_names, validation, nested, **kwargs))
+        self._operations[('solids', name)] = {'op': 'add_solid_from_cut', 'name': name, 'solids': solid_names,
+                                              'kwargs': dict(kwargs, validation=validation, nested=nested)}
+        self._built(name)
+
+    def cut_stats(self):
+        """ Validation level, method and times (check and build, in seconds)
+            of every cut, with the totals per validation level and per method"""
+
+        stats = {'solids': dict(self.cuts), 'validation': {}, 'method': {}}
+        for info in self.cuts.values():
+            for group in ('validation', 'method'):
+                item = stats[group].setdefault(info[group], {'cuts': 0, 'check': 0., 'build': 0.})
+                item['cuts'] += 1
+                item['check'] += info['check']
+                item['build'] += info['build']
+
+        return stats
+
+    def add_solid_from_offset(self, name, shell, thickness, inner=None, **kwargs):
+        """ Adds the solid enclosed by a lofted shell offset outwards by
+            thickness, normal to the shell. thickness is a value or one value
+            per section of the shell, interpolated along it; no new sections
+            are created. inner optionally names a solid offset from the same
+            shell by a smaller thickness: where the difference is constant,
+            the OCC backend offsets inner instead of lofting new circles."""
+
+        shell_name, shell = shell, self.shells[shell]
+        inner_name, inner = inner, None if inner is None else self.solids[inner]
+        thickness = Mesh.wall_thickness(shell.sections, thickness)
+        key = Cache.key('solid_from_offset', getattr(shell, 'key', None), thickness,
+                        *([getattr(inner, 'key', None)] if inner is not None else []))
+
+        self.solids[name] = self._cached('solids', key,
+                                         lambda: self.backend.make_solid_from_offset(name, shell, thickness, inner=inner,
+                                                                                     **kwargs),
+                                         lambda file: self.backend.load_solid(name, file, **kwargs))
+        self.solids[name].shell = None
+        self.solids[name].thickness = thickness
+        self.solids[name].circles = Mesh.offset_radii(shell.sections, thickness)
+
+        self.graph.record(('solids', name), [('shells', shell_name)] + ([('solids', inner_name)] if inner else []),
+                          lambda: self.add_solid_from_offset(name, shell_name, thickness, inner=inner_name, **kwargs))
+        self._operations[('solids', name)] = {'op': 'add_solid_from_offset', 'name': name, 'shell': shell_name,
+                                              'thickness': thickness, 'inner': inner_name, 'kwargs': kwargs}
+        self._built(name)
+
+    def add_layers(self, shell, lumen, layers, validation='full', **kwargs):
+        """ Adds a layered wall around a lofted lumen shell.
+
+            The lumen is lofted once: lumen names the solid it encloses and
+            the outer surface of every layer is an offset of the lumen (see
+            add_solid_from_offset), made from the outer surface of the
+            previous layer when the layer has a constant thickness. layers is a list of (outer, wall,
+            thickness) from the inside out, where outer names the solid
+            enclosed by the layer and wall the layer itself, cut between outer
+            and the solid inside it. thickness is a value or one value per
+            section of the shell, to vary it along the length. validation is
+            the validation level of the cuts (see add_solid_from_cut).
+
+            Returns the names of the walls.
+        """
+
+        sections = self.shells[shell].sections
+        self.add_solid_from_shell(name=lumen, shell=shell, **kwargs)
+
+        total, inner, walls = 0., lumen, []
+        for outer, wall, thickness in layers:
+            total = total + Mesh.wall_thickness(sections, thickness)
+            self.add_solid_from_offset(outer, shell, total, inner=None if inner == lumen else inner, **kwargs)
+            self.add_solid_from_cut(name=wall, solids=[outer, inner], validation=validation, **kwargs)
+            inner = outer
+            walls.append(wall)
+
+        return walls
+
+    def drop_intermediates(self, solids=None):
+        """ Releases the intermediates of the sections and shells that solids
+            (a list of ('solids', name), all solids by default) were built
+            from, directly or not. Shells keep their surface and sections
+            their circle, so properties, offsets and nested cuts still work;
+            the bases of a section are rebuilt from its circle if it is lofted
+            again (e.g. by rebuild).
+
+            With publish='immediate' the study still holds the published
+            objects; batch workers should use publish='none'. Returns the
+            number of objects released.
+        """
+
+        pending = list(self.graph.recipes if solids is None else solids)
+        pending = [node for node in pending if node[0] == 'solids']
+        visited = set()
+        while pending:
+            node = pending.pop()
+            for item in self.graph.inputs.get(node, []):
+                if item not in visited:
+                    visited.add(item)
+                    pending.append(item)
+
+        released = 0
+        for entity_type, name in visited:
+            entity = getattr(self, entity_type).get(name)
+            if entity_type in ('sections', 'shells') and entity is not None:
+                released += _release(entity)
+                self._track(entity_type, name)
+        self._counts['released'] += released
+
+        return released
+
+    def release(self):
+        """ Drops every entity of the domain with its geometry, recorded
+            dependencies and properties, leaving an empty domain. Returns the
+            number of objects released."""
+
+        released = sum(len(objects(entity)) for entity_type in ENTITY_TYPES
+                       for entity in getattr(self, entity_type).values())
+
+        self.sections, self.shells, self.solids = {}, {}, {}
+        self._properties, self.cuts = {}, {}
+        self._section_operations, self._operations = {}, {}
+        self.graph = Graph.Graph(self._stamp)
+        self.backend.release()
+
+        self._objects = {}
+        self._counts['current'] = 0
+        self._counts['released'] += released
+
+        # NumPy entities reference themselves (geom)
+        gc.collect()
+
+        return released
+
+    def geometry_stats(self):
+        """ Geometry objects held now by the sections, shells and solids, and
+            the peak and released totals since the domain was created"""
+
+        for entity_type in ENTITY_TYPES:
+            for name in getattr(self, entity_type):
+                self._track(entity_type, name)
+
+        stats = {entity_type: sum(count for (kind, _), count in self._objects.items() if kind == entity_type)
+                 for entity_type in ENTITY_TYPES}
+        stats.update(self._counts)
+
+        return stats
+
+    def preview(self, lumen, outer=None):
+        """ Semi-analytic volumes, areas and sac diameter of a vessel,
+            computed from the circles of its sections without building shells
+            or solids (see Preview).
+
+            lumen and outer are shell names or lists of section names. Returns
+            the properties of the lumen and, given the outer surface, of the
+            wall between them and the sac diameter. The surface is the loft of
+            the NumPy backend; the OCC loft (a B-spline approximation of the
+            circles) gives slightly different values, e.g. 0.6% in volume and
+            0.2% in area for the outer surface of Idealized_manual.py, the
+            only OCC model compared. test/Validate_preview.py measures the
+            error against the NumPy loft over a sweep of idealized models.
+        """
+
+        def tube(entity):
+            sections = self.shells[entity].sections if isinstance(entity, str) else \
+                [self.sections[name] for name in entity]
+            centers, normals, radii = Mesh.circles(sections)
+            return Preview.tube(centers, Mesh.frames_from_normals(normals), radii)
+
+        return Preview.model(tube(lumen), None if outer is None else tube(outer))
+
+    def outdated(self):
+        """ Shells, solids and exported files that rebuild() would rebuild,
+            as (kind, name) pairs in build order"""
+
+        return self.graph.outdated()
+
+    def affected(self, entity_type, name):
+        """ Shells, solids and exported files built, directly or not, from an
+            entity: what an edit of the entity would rebuild"""
+
+        return self.graph.dependents((entity_type, name))
+
+    def rebuild(self):
+        """ Rebuilds the shells, solids and exported files made from entities
+            changed since they were built, and nothing else.
+
+            Returns the rebuilt (kind, name) pairs.
+        """
+
+        outdated = self.graph.outdated()
+        for node in outdated:
+            self.graph.recipes[node]()
+
+        return outdated
+
+    def recipe(self):
+        """ Recipe of the model: the recorded calls that build its sections,
+            shells, solids and exported files, as a dictionary (see Recipe).
+
+            Sections come first with every add_circle, add_circle2 and
+            rotate applied to them since they were added, followed by the
+            other entities in build order. Entities replaced by a later call
+            appear once, as they are now. Sections edited after building
+            are recorded as edited: call rebuild() first so that the recipe
+            and the model agree.
+        """
+
+        operations = []
+        for operation in self._section_operations.values():
+            if operation['op'] == 'add_section':
+                operations.append(dict(operation, history=list(self.sections[operation['name']].history)))
+                continue
+
+            # Sections of add_sections start with their circle
+            operations.append(operation)
+            for i in range(len(operation['origins'])):
+                name = f"{operation['prefix']}{i}"
+                if name not in self._section_operations and len(self.sections[name].history) > 1:
+                    operations.append({'op': 'edit_section', 'name': name, 'history': self.sections[name].history[1:]})
+
+        operations += [self._operations[node] for node in self.graph.order() if node in self._operations]
+
+        return {'format': Recipe.FORMAT, 'version': Recipe.VERSION,
+                'backend': {'name': self.backend.name, 'settings': self.backend.settings()},
+                'operations': operations}
+
+    def save_recipe(self, file):
+        """ Writes the recipe of the model to a .json or .npz file and returns
+            its key (see Recipe.save)"""
+
+        recipe = self.recipe()
+        Recipe.save(recipe, file)
+
+        return Recipe.key(recipe)
 
-    def add_solid_from_cut(self, name, solids, **kwargs):
+    def replay(self, recipe, output_dir=None, exports=True):
+        """ Builds the model of a recipe, or of a recipe file, with the
+            backend of the domain (see Recipe.replay)"""
 
-        solid = self.geompy.MakeCut(self.solids[solids[0]].geom, self.solids[solids[1]].geom, checkSelfInte=True)
-        self.solids[name] = Solid(name, solid, **kwargs)
+        return Recipe.replay(recipe, self, output_dir, exports)
+
+    def _export(self, format, solid, file, **options):
+        """ Exports a solid, copying the file from the cache when possible.
+            Returns the report of the backend, if any."""
+
+        options = {option: value for option, value in options.items() if value is not None}
+        report = self._export_file(format, self.solids[solid], file, **options)
+        self.graph.record(('exports', file), [('solids', solid)], lambda: self._export(format, solid, file, **options))
+        self._operations[('exports', file)] = {'op': 'export', 'format': format, 'solid': solid, 'file': file,
+                                               'kwargs': options}
+
+        return report
+
+    def _export_file(self, format, solid, file, **options):
+
+        export = getattr(self.backend, f'export_{format}')
+
+        if self.cache is None or getattr(solid, 'key', None) is None:
+            return export(solid, file, **options)
+
+        key = Cache.key('export', solid.key, format, self.backend.export_settings(format), *([options] if options else []))
+        def copy(cached):
+            shutil.copyfile(cached, file)
+            report = os.path.join(os.path.dirname(cached), 'report.json')
+            if os.path.isfile(report):
+                with open(report, 'r') as input_file:
+                    return {'report': json.load(input_file)}
+            return {'report': None}
+
+        cached = self.cache.fetch(key, f'export.{format}', kind='exports', read=copy)
+        if cached is not None:
+            return cached['report']
+
+        report = export(solid, file, **options)
+        if report is not None:
+            def write_report(path):
+                with open(path, 'w') as output_file:
+                    json.dump(report, output_file)
+            self.cache.store(key, 'report.json', write_report, kind='reports')
+        self.cache.store(key, f'export.{format}', lambda path: shutil.copyfile(file, path), kind='exports')
+
+        return report
 
     def export_iges(self, solid, file):
-        self.geompy.ExportIGES(self.solids[solid].geom, file, theVersion='5.3')
+        self._export('iges', solid, file)
 
-    def export_stl(self, solid, file):
-        # Export the STL
-        #self.geompy.ExportSTL(self.solids[solid].geom, file, False)
-        self.geompy.ExportSTL(self.solids[solid].geom, file, False, 0.0001) #Custom linear deflection
+    def export_stl(self, solid, file, triangles=None, tolerance=None):
+        """ Exports a solid to STL. By default the backend settings are used;
+            tolerance (chord deviation relative to the bounding box diagonal)
+            or triangles (target count) make the tessellation adaptive.
+            Returns the number of triangles and the deviation achieved."""
+
+        return self._export('stl', solid, file, triangles=triangles, tolerance=tolerance)
 
-    def export_vtk(self, solid, file):
-        self.geompy.ExportVTK(self.solids[solid].geom, file, 0.001)
+    def export_vtk(self, solid, file, triangles=None, tolerance=None):
+        """ Exports a solid to VTK (see export_stl)"""
+
+        return self._export('vtk', solid, file, triangles=triangles, tolerance=tolerance)
 
     def export_step(self, solid, file):
-        self.geompy.ExportSTEP(self.solids[solid].geom, file)
+        self._export('step', solid, file)
+
+
+    def export_all(self, spec, workers=None, **options):
+        """ Exports several solids and formats concurrently.
+
+            spec maps the name of each solid to a file or a list of files; the
+            format is given by the extension (see EXPORT_FORMATS). Exports run
+            on a pool of workers threads: one per export by default, or a
+            single one if the backend serializes its calls (the OCC backend,
+            see GEOM_LOCK). When a solid is written to several mesh files (STL
+            and VTK) and no cache is used, it is tessellated once for all of
+            them (see write_meshes) if they get the same accuracy: the options
+            set it, or the backend has no settings for the formats. The OCC
+            backend otherwise exports each format with its own deflection
+            (stl_deflection, vtk_deflection).
+
+            options (triangles, tolerance) are passed to the mesh exports.
+
+            Returns the time spent writing each file. Files sharing a
+            tessellation report the time of the shared job.
+        """
+
+        streaming = type(self.backend).tessellate is not Backend.tessellate
+
+        jobs = []
+        for name, files in spec.items():
+            files = [files] if isinstance(files, str) else list(files)
+            formats = {}
+            for file in files:
+                extension = os.path.splitext(file)[1].lower()
+                if extension not in EXPORT_FORMATS:
+                    raise ValueError(f"Unknown export format of {file}")
+                formats[file] = EXPORT_FORMATS[extension]
+
+            shared = [file for file in files if formats[file] in Mesh.WRITERS]
+            if not options and any(self.backend.export_settings(formats[file]) for file in shared):
+                shared = []
+            if not streaming or self.cache is not None or len(shared) < 2:
+                shared = []
+            else:
+                jobs.append((shared, self.write_meshes, ({file: name for file in shared}, Mesh.CHUNK_SIZE), options))
+
+            for file in files:
+                if file not in shared:
+                    jobs.append(([file], self._export, (formats[file], name, file),
+                                 options if formats[file] in Mesh.WRITERS else {}))
+
+        def run(job):
+            files, function, args, kwargs = job
+            start = time.time()
+            function(*args, **kwargs)
+            return files, time.time() - start
+
+        timings = {}
+        if workers is None:
+            workers = max(1, len(jobs)) if self.backend.parallel else 1
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for files, elapsed in executor.map(run, jobs):
+                timings.update((file, elapsed) for file in files)
+
+        return timings
+
+    def write_meshes(self, files, chunk_size=Mesh.CHUNK_SIZE, **options):
+        """ Writes STL and VTK files streaming the triangles of the solids.
+
+            files maps each output file (.stl or .vtk) to the name of a solid
+            or a list of names, e.g. {'wall.stl': ['media_solid',
+            'adventitia_solid'], 'wall.vtk': [...]}. Every solid is
+            tessellated once and each chunk of chunk_size triangles is written
+            to all the files containing the solid, so memory does not depend
+            on the number of triangles. options (triangles, tolerance) set the
+            tessellation (see export_stl). Returns the triangle count per file.
+        """
 
+        files = {file: [names] if isinstance(names, str) else list(names) for file, names in files.items()}
+        solids = []
+        for names in files.values():
+            solids += [name for name in names if name not in solids]
+
+        writers = {file: Mesh.writer(file, chunk_size) for file in files}
+        try:
+            for name in solids:
+                targets = [writers[file] for file, names in files.items() if name in names]
+                for chunk in self.backend.tessellate(self.solids[name], chunk_size, **options):
+                    for target in targets:
+                        target.write(chunk)
+        finally:
+            for target in writers.values():
+                target.close()
+
+        for file, names in files.items():
+            self.graph.record(('exports', file), [('solids', name) for name in names],
+                              lambda file=file, names=names: self.write_meshes({file: names}, chunk_size, **options))
+            self._operations[('exports', file)] = {'op': 'write_meshes', 'files': {file: names},
+                                                   'chunk_size': chunk_size, 'kwargs': options}
+
+        return {file: target.count for file, target in writers.items()}
+
+    def clear_study(self):
+        """ Removes every object from the study, including those published
+            by other domains of the process (see Session.clear_study)"""
+
+        self.backend.clear_study()
+
+    def publication_stats(self):
+        """ Counts and times of the study publication calls (see Publisher.stats)"""
+
+        return self.backend.publication_stats()
+
+    def properties(self, entity_type, name):
+        """ Properties of an entity (see save), computed on first use and
+            recomputed only when the entity changes"""
+
+        entity = getattr(self, entity_type)[name]
+        version = getattr(entity, 'version', 0)
+
+        cached = self._properties.get((entity_type, name))
+        if cached is None or cached[0] is not entity or cached[1] != version:
+            cached = (entity, version, self.backend.properties(entity))
+            self._properties[(entity_type, name)] = cached
+
+        return cached[2]
+
+    def save(self, file, entities=ENTITY_TYPES, workers=1, cad_format='json', study=True, background=False,
+             clear_study=False):
+        """ Saves the study and a .cad file with the properties of the entities.
+
+            entities restricts the .cad file to some of the ENTITY_TYPES and
+            workers is the number of threads used to compute the properties.
+            cad_format is one of CAD_FORMATS: 'npz' writes the properties as
+            a columnar table (.cad.npz, see Table) instead of JSON, and
+            'both' writes both files.
+
+            study=False skips the SALOME study (.hdf), which batch runs often
+            do not need. With background, the study is written by a
+            background thread while the script goes on, e.g. exporting or
+            building the next case, and a concurrent.futures.Future that
+            returns its path is returned; wait_for_studies() waits for all of
+            them. Studies are written one at a time, and a save waits for the
+            previous ones before publishing, so use publish='deferred' (or
+            'none') when building while a study is written.
+
+            With clear_study, the study only holds the entities of this
+            domain: it is cleared before they are published and after it is
+            written, holding GEOM_LOCK so that no other domain of the process
+            publishes in between. Objects published as they are built would
+            be cleared, so it requires publish='deferred' or 'none' and a
+            study written in the foreground.
+        """
 
-    def save(self, file):
+        global _STUDY_WRITER
+
+        if cad_format not in CAD_FORMATS:
+            raise ValueError(f"Unknown CAD information format {cad_format}")
+        if clear_study and (background or getattr(self.backend, 'publisher', None) is not None and
+                            self.backend.publisher.mode == 'immediate'):
+            raise ValueError("clear_study requires publish='deferred' or 'none' and background=False")
 
         file_path = os.path.dirname(file)
 
@@ -91,53 +1322,287 @@ class Domain(object):
 	# Ensure the file path and name are correctly set
         study_path = os.path.join(file_path, file_name + file_extension)
 
-	# Save the study
-        self.study.SaveAs(study_path, self.study, False)
+	# Save the study (the NumPy backend has no study)
+        handle = None
+        if study:
+            wait_for_studies()
+            for section in self.sections.values():
+                section.apply()
+            if clear_study:
+                with GEOM_LOCK:
+                    self.clear_study()
+                    self.backend.publish_all()
+                    self.backend.save_study(study_path)
+                    self.clear_study()
+            elif background:
+                self.backend.publish_all()
+                with _PENDING_LOCK:
+                    if _STUDY_WRITER is None:
+                        _STUDY_WRITER = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+                    handle = _STUDY_WRITER.submit(self.backend.save_study, study_path)
+                    _PENDING_STUDIES.append(handle)
+            else:
+                self.backend.publish_all()
+                self.backend.save_study(study_path)
 
         # Save Python dictionary with CAD information
         file_extension = '.cad'
         file_name = os.path.basename(file.rsplit(file_extension, 1)[0])
 
-        self._get_cad_info()
+        self._get_cad_info(entities, workers)
+
+        if cad_format in ('json', 'both'):
+            with open(os.path.join(file_path, file_name + file_extension), 'w') as output_file:
+                json.dump(self.info, output_file, indent=2, sort_keys=True)
+        if cad_format in ('npz', 'both'):
+            Table.write(self.info, os.path.join(file_path, file_name + Table.EXTENSION))
 
-        with open(os.path.join(file_path, file_name + file_extension), 'w') as output_file:
-            json.dump(self.info, output_file, indent=2, sort_keys=True)
+        return handle
 
-    def _get_cad_info(self):
+    def _get_cad_info(self, entities=ENTITY_TYPES, workers=1):
 
         self.info = {}
-        self.info['sections'] = {}
-        self.info['shells'] = {}
-        self.info['solids'] = {}
-
-        entities = {}
-        for d in (self.sections, self.shells, self.solids):
-            entities.update(d)
-
-        for name, entity in entities.items():
-            entity_type = type(entity).__name__.lower() + 's'
-
-            BasicProperties = self.geompy.BasicProperties(entity.geom)
-            Inertia = self.geompy.Inertia(entity.geom)
-            CDG = self.geompy.PointCoordinates(self.geompy.MakeCDG(entity.geom))
-
-            self.info[entity_type][name] = {}
-            self.info[entity_type][name]['Length'] = BasicProperties[0]
-            self.info[entity_type][name]['Area'] = BasicProperties[1]
-            self.info[entity_type][name]['Volume'] = BasicProperties[2]
-            self.info[entity_type][name]['I11'] = Inertia[0]
-            self.info[entity_type][name]['I12'] = Inertia[1]
-            self.info[entity_type][name]['I13'] = Inertia[2]
-            self.info[entity_type][name]['I21'] = Inertia[3]
-            self.info[entity_type][name]['I22'] = Inertia[4]
-            self.info[entity_type][name]['I23'] = Inertia[5]
-            self.info[entity_type][name]['I31'] = Inertia[6]
-            self.info[entity_type][name]['I32'] = Inertia[7]
-            self.info[entity_type][name]['I33'] = Inertia[8]
-            self.info[entity_type][name]['Ix'] = Inertia[9]
-            self.info[entity_type][name]['Iy'] = Inertia[10]
-            self.info[entity_type][name]['Iz'] = Inertia[11]
-            self.info[entity_type][name]['CDG'] = CDG
+        for entity_type in entities:
+            self.info[entity_type] = {}
+
+        items = [(entity_type, name) for entity_type in entities for name in getattr(self, entity_type)]
+
+        if workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                properties = list(executor.map(lambda item: self.properties(*item), items))
+        else:
+            properties = [self.properties(*item) for item in items]
+
+        for (entity_type, name), info in zip(items, properties):
+            self.info[entity_type][name] = info
+
+
+class _Folder(object):
+    """ Placeholder of a study folder whose creation is deferred"""
+
+    def __init__(self, name):
+        self.name = name
+        self.folder = None
+
+
+class Publisher(object):
+    """ Publishes GEOM objects and folders in the SALOME study.
+
+        mode is 'immediate' (publish objects as they are created and update
+        the object browser after each entity), 'deferred' (queue them and
+        publish everything in one batch, with a single browser update, when
+        flush is called by Domain.save) or 'none' (never publish).
+
+        The number and time of the calls made are counted per kind of call,
+        together with the calls skipped, and the time of each flush. The mean
+        cost of each kind of call made in the process, e.g. by the deferred
+        flushes, is used to estimate the time saved; skipped kinds never
+        called in the process are reported as unmeasured.
+
+    """
+
+    MODES = ('immediate', 'deferred', 'none')
+
+    # Number and total time of the calls measured in this process
+    costs = {}
+
+    def __init__(self, geompy, mode='immediate'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown publication mode {mode}, use one of {', '.join(self.MODES)}")
+
+        self.geompy = geompy
+        self.mode = mode
+        self.queue = []
+        self.calls = {}
+        self.times = {}
+        self.skipped = {}
+        self.flushes = []
+
+    def _call(self, kind, function, *args):
+        start = time.time()
+        result = function(*args)
+        elapsed = time.time() - start
+
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+        self.times[kind] = self.times.get(kind, 0.) + elapsed
+        count, total = Publisher.costs.get(kind, (0, 0.))
+        Publisher.costs[kind] = (count + 1, total + elapsed)
+
+        return result
+
+    def _skip(self, kind):
+        self.skipped[kind] = self.skipped.get(kind, 0) + 1
+
+    def new_folder(self, name):
+        if self.mode == 'immediate':
+            return self._call('NewFolder', self.geompy.NewFolder, name)
+        if self.mode == 'none':
+            self._skip('NewFolder')
+        return _Folder(name)
+
+    def publish(self, obj, name, folder=None):
+        if self.mode == 'deferred':
+            self.queue.append((obj, name, folder))
+        elif self.mode == 'none':
+            self._skip('addToStudy')
+            if folder:
+                self._skip('PutToFolder')
+        else:
+            self._call('addToStudy', self.geompy.addToStudy, obj, name)
+            if folder:
+                self._call('PutToFolder', self.geompy.PutToFolder, obj, folder)
+
+    def update_browser(self):
+        if self.mode != 'immediate':
+            self._skip('updateObjBrowser')
+            return
+
+        try:
+            self._call('updateObjBrowser', salome.sg.updateObjBrowser)
+        except AttributeError:
+            pass
+
+    def flush(self):
+        """ Publishes the queued objects in one batch"""
+
+        if not self.queue:
+            return
+
+        start = time.time()
+        objects = len(self.queue)
+        for obj, name, folder in self.queue:
+            if isinstance(folder, _Folder):
+                if folder.folder is None:
+                    folder.folder = self._call('NewFolder', self.geompy.NewFolder, folder.name)
+                folder = folder.folder
+            self._call('addToStudy', self.geompy.addToStudy, obj, name)
+            if folder:
+                self._call('PutToFolder', self.geompy.PutToFolder, obj, folder)
+        self.queue = []
+
+        try:
+            self._call('updateObjBrowser', salome.sg.updateObjBrowser)
+        except AttributeError:
+            pass
+
+        self.flushes.append({'objects': objects, 'time': time.time() - start})
+
+    def stats(self):
+        """ Calls made and skipped, time spent per kind of call and per
+            flush, and estimated time saved by the skipped calls whose cost
+            was measured in the process"""
+
+        time_saved = 0.
+        unmeasured = []
+        for kind, count in self.skipped.items():
+            measured, total = Publisher.costs.get(kind, (0, 0.))
+            if measured:
+                time_saved += count*total/measured
+            else:
+                unmeasured.append(kind)
+
+        return {
+            'mode': self.mode,
+            'calls': dict(self.calls),
+            'times': dict(self.times),
+            'skipped': dict(self.skipped),
+            'queued': len(self.queue),
+            'flushes': list(self.flushes),
+            'time': sum(self.times.values()),
+            'time_saved': time_saved,
+            'unmeasured': unmeasured,
+        }
+
+
+class LockedBuilder(object):
+    """ Proxy of a geometry builder making every call while holding GEOM_LOCK"""
+
+    def __init__(self, builder):
+        self._builder = builder
+        self._methods = {}
+
+    def __getattr__(self, attribute_name):
+        if attribute_name in self._methods:
+            return self._methods[attribute_name]
+
+        attribute = getattr(self._builder, attribute_name)
+        if not callable(attribute):
+            return attribute
+
+        def method(*args, **kwargs):
+            with GEOM_LOCK:
+                return attribute(*args, **kwargs)
+
+        self._methods[attribute_name] = method
+        return method
+
+
+class Session(object):
+    """ SALOME session shared by a Domain and its entities.
+
+        Holds the study, a single geometry builder, the publisher of the
+        study objects and the primitives of the global coordinate system
+        (O, OX, OY and OZ), which vertex and vector return instead of new
+        objects, so that creating an entity only costs its own geometry.
+
+        Every call to the geometry builder holds GEOM_LOCK (see
+        LockedBuilder), so domains can be built, exported and saved from
+        several threads, e.g. by the stages of Cohort.run_pipeline. profile
+        is True or a Profiling.Profiler to record every call, including the
+        time waiting for the lock.
+
+    """
+
+    def __init__(self, publish='immediate', profile=False):
+
+        if salome is None:
+            raise ImportError("The OCC backend requires the SALOME Python modules")
+
+	# Initialize SALOME study
+        salome.salome_init()
+        self.study = salome.myStudy
+
+        # Initialize GEOM module without the 'study' argument
+        self.geompy = LockedBuilder(geomBuilder.New())
+
+        self.profiler = None
+        if profile:
+            self.profiler = profile if isinstance(profile, Profiling.Profiler) else Profiling.Profiler()
+            self.geompy = self.profiler.wrap(self.geompy)
+
+        self.geompy.addToStudyAuto(0)
+        self.publisher = Publisher(self.geompy, publish)
+
+        self.O = self.geompy.MakeVertex(0, 0, 0)
+        self.OX = self.geompy.MakeVectorDXDYDZ(1, 0, 0)
+        self.OY = self.geompy.MakeVectorDXDYDZ(0, 1, 0)
+        self.OZ = self.geompy.MakeVectorDXDYDZ(0, 0, 1)
+
+    def vertex(self, point):
+        """ GEOM vertex at point: the shared O at the origin"""
+
+        point = [float(x) for x in point]
+        if not any(point):
+            return self.O
+        return self.geompy.MakeVertex(*point)
+
+    def vector(self, direction):
+        """ GEOM vector of direction: the shared OX, OY or OZ along the axes"""
+
+        direction = [float(x) for x in direction]
+        for axis, vector in zip(([1., 0., 0.], [0., 1., 0.], [0., 0., 1.]), (self.OX, self.OY, self.OZ)):
+            if direction == axis:
+                return vector
+        return self.geompy.MakeVectorDXDYDZ(*direction)
+
+    def clear_study(self):
+        """ Removes every object from the study. All the sessions of a
+            process share the study, so objects of earlier domains are saved
+            with the next one unless it is cleared."""
+
+        with GEOM_LOCK:
+            self.study.Clear()
+            self.study.Init()
 
 
 class Section(object):
@@ -151,20 +1616,40 @@ class Section(object):
         OX_LCS is a sequence with the three components of LCS OX direction in GCS
         OY_LCS is a sequence with the three components of LCS OY direction in GCS
 
+        R is the rotation matrix of the LCS (rows OX, OY and OZ in GCS), when
+        it is already known; otherwise it is computed from OX_LCS and OY_LCS
+
+        lcs=False skips the GEOM vertex and marker of the LCS, which are only
+        needed to show it in the study
+
     """
 
-    def __init__(self, name, origin, OX_LCS=None, OY_LCS=None, folder=True):
+    # GEOM objects held by the section and those only needed to loft shells
+    OBJECTS = ('location', 'LCS', 'bases', 'geom')
+    INTERMEDIATES = ('location', 'LCS', 'bases', 'geom')
+
+    def __init__(self, name, origin, OX_LCS=None, OY_LCS=None, folder=True, session=None, lcs=True, R=None):
         self.name = name
         self.origin = list(origin)
         self.bases = {}
+        self.history = []
 
-        # Get the current study
-        self.study = salome.myStudy
+        # Circle of the section; center and normal follow the LCS when they are None
+        self.radius = None
+        self.center = None
+        self.normal = None
+
+        # Increased on every change of the section
+        self.version = 0
 
-        self.geompy = geomBuilder.New()
+        # Share the session of the domain (or start one for a standalone section)
+        self.session = session or Session()
+        self.study = self.session.study
+        self.geompy = self.session.geompy
+        self.publisher = self.session.publisher
 
         if folder:
-            self.folder = self.geompy.NewFolder('section_' + name)
+            self.folder = self.publisher.new_folder('section_' + name)
         else:
             self.folder = None
 
@@ -178,175 +1663,234 @@ class Section(object):
         except:
             self.OY_LCS = [0., 1., 0.]
 
-        # Create a vertex in the origin of the LCS
-        self.location = self.geompy.MakeVertex(*tuple(self.origin))
-        self.geompy.addToStudy(self.location, self.name + '_origin')
-        if self.folder:
-            self.geompy.PutToFolder(self.location, self.folder)
-
-        # Create LCS for the section
-        self.LCS = self.geompy.MakeMarker(*tuple(self.origin + self.OX_LCS + self.OY_LCS))
+        self.R = Mesh.frame(self.OX_LCS, self.OY_LCS) if R is None else R
         self._obtain_rotation_matrix_LCS()
-        self.geompy.addToStudy(self.LCS, self.name + '_LCS')
-        if self.folder:
-            self.geompy.PutToFolder(self.LCS, self.folder)
 
-        try:
-            salome.sg.updateObjBrowser()
-        except AttributeError:
-            pass
+        if lcs:
+            # Create a vertex in the origin of the LCS
+            self.location = self.geompy.MakeVertex(*tuple(self.origin))
+            self.publisher.publish(self.location, self.name + '_origin', self.folder)
+
+            # Create LCS for the section
+            self.LCS = self.geompy.MakeMarker(*tuple(self.origin + self.OX_LCS + self.OY_LCS))
+            self.publisher.publish(self.LCS, self.name + '_LCS', self.folder)
+        else:
+            self.location = self.LCS = None
+
+        # Rotation matrix of the LCS (and origin) where the GEOM objects are placed
+        self._LCS_placement = self.R.copy()
+        self._bases_placement = None
+
+        self.publisher.update_browser()
 
 
     def _obtain_rotation_matrix_LCS(self):
-        """ Obtains the rotation matrix R of the LCS and the
-            Euler's angle and axis of the transformation"""
-
-        _temp = self.geompy.GetPosition(self.LCS)
-        rx = _temp[6:9]
-        rz = _temp[3:6]
-        vx = self.geompy.MakeVectorDXDYDZ(*rx)
-        vz = self.geompy.MakeVectorDXDYDZ(*rz)
-        vy = self.geompy.CrossProduct(vz, vx)
-        ry = self.geompy.VectorCoordinates(vy)
-        R = [list(rx), list(ry), list(rz)]
-
-        eangle = math.acos(0.5*(R[0][0]+R[1][1]+R[2][2]-1.))
+        """ Obtains the Euler's angle and axis of the rotation matrix R of the LCS"""
+
+        R = self.R
+
+        eangle = math.acos(max(-1., min(1., 0.5*(R[0][0]+R[1][1]+R[2][2]-1.))))
         if abs(eangle) > 1.E-2:
             eaxis = [(R[2][1]-R[1][2])/(2.*math.sin(eangle)),
                      (R[0][2]-R[2][0])/(2.*math.sin(eangle)),
                      (R[1][0]-R[0][1])/(2.*math.sin(eangle)),
                      ]
-            eaxisv = self.geompy.MakeVectorDXDYDZ(*eaxis)
         else:
             eaxis = [0, 0, 0]
-            eaxisv = None
 
-        self.R = R
         self.EulerAngle = eangle
         self.EulerAngleDeg = eangle*180./math.pi
         self.EulerAxis = eaxis
-        self.EulerAxisVector = eaxisv
-
-    def _transform_bases_to_LCS(self):
-        """ Transforms all bases to the LCS"""
-
-        for base in self.bases.values():
-            if self.EulerAxisVector:
-                self.geompy.Rotate(base, self.EulerAxisVector, -self.EulerAngle)
 
-            self.geompy.TranslateDXDYDZ(base, *tuple(self.origin))
-
-    def _transform_bases_to_GCS(self):
-        """ Transforms all bases to the GCS"""
-
-        for base in self.bases.values():
-            self.geompy.TranslateDXDYDZ(base, *tuple([-i for i in self.origin]))
+    def _move(self, objects, R, origin):
+        """ Moves GEOM objects placed in the LCS given by R and origin to the
+            current LCS with one rotation and one translation"""
+
+        axis, angle = Mesh.axis_angle(self.R.T.dot(R))
+        if angle > 0.:
+            axis = self.geompy.MakeVectorDXDYDZ(*tuple(axis))
+            if any(origin):
+                axis = self.geompy.TranslateDXDYDZ(axis, *tuple(origin))
+            for obj in objects:
+                self.geompy.Rotate(obj, axis, angle)
+
+        shift = [a - b for a, b in zip(self.origin, origin)]
+        if any(shift):
+            for obj in objects:
+                self.geompy.TranslateDXDYDZ(obj, *tuple(shift))
+
+    def apply(self):
+        """ Applies the rotations accumulated since the last call to the LCS
+            marker and the bases. Called when the section is used by a shell
+            and when the study is saved."""
+
+        if self.LCS is not None and not np.array_equal(self._LCS_placement, self.R):
+            self._move([self.LCS], self._LCS_placement, self.origin)
+            self._LCS_placement = self.R.copy()
+
+        if self._bases_placement is not None and self.bases:
+            R, origin = self._bases_placement
+            if not np.array_equal(R, self.R) or origin != self.origin:
+                self._move(list(self.bases.values()), R, origin)
+            self._bases_placement = (self.R.copy(), list(self.origin))
+
+    def _marker(self):
+        """ GEOM marker of the current LCS: the LCS of the section when it is
+            up to date, otherwise a new one"""
+
+        if self.LCS is not None and np.array_equal(self._LCS_placement, self.R):
+            return self.LCS
+        return self.geompy.MakeMarker(*tuple(self.origin + self.R[:2].ravel().tolist()))
+
+    def signature(self):
+        """ Description of the section used as part of cache keys"""
+
+        return {'origin': self.origin, 'OX_LCS': self.OX_LCS, 'OY_LCS': self.OY_LCS, 'history': self.history}
+
+    def circle(self):
+        """ Center, normal and radius of the circle of the section, or None"""
+
+        if self.radius is None:
+            return None
+        if self.center is None:
+            return self.origin, self.R[2], self.radius
+        return self.center, self.normal, self.radius
+
+    def _rotate(self, axis, angle):
+        """ Rotates the LCS around an axis through its origin. The rotation is
+            composed with the previous ones and applied to the GEOM objects
+            by apply"""
+
+        self.version += 1
+        rotation = Mesh.rotation_matrix(axis, angle*math.pi/180.)
+        self.R = self.R.dot(rotation.T)
+        self._obtain_rotation_matrix_LCS()
 
-            if self.EulerAxisVector:
-                self.geompy.Rotate(base, self.EulerAxisVector, self.EulerAngle)
+        # Circles given in the GCS (add_circle2) rotate with the section
+        if self.center is not None:
+            origin = np.array(self.origin, dtype=float)
+            self.center = list(origin + rotation.dot(np.array(self.center) - origin))
+            self.normal = list(rotation.dot(self.normal))
 
     def rotateX(self, angle):
         """Rotate the section around an axis parallel to global X
         through the origin of the LCS"""
 
-        axis = self.geompy.MakeVectorDXDYDZ(1., 0, 0)
-        axis = self.geompy.TranslateDXDYDZ(axis, *tuple(self.origin))
-        self.geompy.Rotate(self.LCS, axis, angle*math.pi/180.)
-        self._transform_bases_to_GCS()
-        self._obtain_rotation_matrix_LCS()
-        self._transform_bases_to_LCS()
+        self.history.append(['rotateX', angle])
+        self._rotate([1., 0., 0.], angle)
 
     def rotateY(self, angle):
         """Rotate the section around an axis parallel to global Y
         through the origin of the LCS"""
 
-        axis = self.geompy.MakeVectorDXDYDZ(0., 1., 0)
-        axis = self.geompy.TranslateDXDYDZ(axis, *tuple(self.origin))
-        self.geompy.Rotate(self.LCS, axis, angle*math.pi/180.)
-        self._transform_bases_to_GCS()
-        self._obtain_rotation_matrix_LCS()
-        self._transform_bases_to_LCS()
+        self.history.append(['rotateY', angle])
+        self._rotate([0., 1., 0.], angle)
 
     def rotateZ(self, angle):
         """Rotate the section around an axis parallel to global Z
         through the origin of the LCS"""
 
-        axis = self.geompy.MakeVectorDXDYDZ(0., 0., 1.)
-        axis = self.geompy.TranslateDXDYDZ(axis, *tuple(self.origin))
-        self.geompy.Rotate(self.LCS, axis, angle*math.pi/180.)
-        self._transform_bases_to_GCS()
-        self._obtain_rotation_matrix_LCS()
-        self._transform_bases_to_LCS()
+        self.history.append(['rotateZ', angle])
+        self._rotate([0., 0., 1.], angle)
 
     def add_circle(self, radius):
-        self.bases['edge'] = self.geompy.MakeCircleR(radius)
-        self.bases['face'] = self.geompy.MakeFaceWires([self.bases['edge']], isPlanarWanted=True)
-        self.bases['shell'] = self.geompy.MakeShell([self.bases['face']])
-        self.geom = self.bases['face']
+        self.history.append(['add_circle', radius])
+        self.version += 1
+        self.radius, self.center, self.normal = radius, None, None
 
-        self._transform_bases_to_LCS()
+        # The circle is created in place in the XY plane of the LCS
+        self._make_bases()
 
         for key, base in self.bases.items():
-            self.geompy.addToStudy(base, self.name + '_base_' + key)
-            if self.folder:
-                self.geompy.PutToFolder(base, self.folder)
+            self.publisher.publish(base, self.name + '_base_' + key, self.folder)
 
-        try:
-            salome.sg.updateObjBrowser()
-        except AttributeError:
-            pass
+        self.publisher.update_browser()
+
+    def restore(self):
+        """ Rebuilds the bases of the circle of the section after they were
+            released (see Domain.drop_intermediates)"""
+
+        self._make_bases()
+
+    def _make_bases(self):
+        """ Edge, face and shell of the circle of the section. The circle of
+            add_circle is made in the XY plane of the GCS and positioned in
+            the current LCS, so its seam follows OX_LCS; a circle given in
+            the GCS (add_circle2) is made with MakeCircle"""
+
+        center, normal, radius = self.circle()
+        if self.center is None:
+            self.bases['edge'] = self.geompy.MakePosition(self.geompy.MakeCircleR(radius), None, self._marker())
+        else:
+            self.bases['edge'] = self.geompy.MakeCircle(self.session.vertex(center), self.session.vector(normal), radius)
+        self.bases['face'] = self.geompy.MakeFaceWires([self.bases['edge']], isPlanarWanted=True)
+        self.bases['shell'] = self.geompy.MakeShell([self.bases['face']])
+        self.geom = self.bases['face']
+        self._bases_placement = (self.R.copy(), list(self.origin))
 
     def add_circle2(self, circle_center, normal, radius):
         """
         Adds a circle to the section using specified center, normal vector, and radius.
 
         Args:
-            circle_center (list or geomBuilder.GEOM_Vertex): The center point of the circle.
-            normal (list): The normal vector defining the circle's orientation.
+            circle_center (list, array or geomBuilder.GEOM_Vertex): The center point of the circle.
+            normal (list, array or geomBuilder.GEOM_Vector): The normal vector defining the circle's orientation.
             circle_radius (float): The radius of the circle.
         Returns:
             None: The circle is added to the SALOME study and potentially a folder.
         """
-        # Ensure the circle_center is a geomBuilder Vertex, not just coordinates
-        if isinstance(circle_center, list):
-            circle_center = self.geompy.MakeVertex(*circle_center)
-	# Create the normal vector from components if it's not already a geompy object
-        if isinstance(normal, list):
-            normal = self.geompy.MakeVectorDXDYDZ(*normal)
+        # Coordinates are recorded as given; only GEOM objects are queried
+        if isinstance(circle_center, (list, tuple, np.ndarray)):
+            center = [float(x) for x in circle_center]
+            circle_center = self.session.vertex(center)
+        else:
+            center = list(self.geompy.PointCoordinates(circle_center))
+        if isinstance(normal, (list, tuple, np.ndarray)):
+            direction = [float(x) for x in normal]
+            normal = self.session.vector(direction)
+        else:
+            direction = list(self.geompy.VectorCoordinates(normal))
+
+        self.history.append(['add_circle2', center, direction, radius])
+        self.version += 1
+        self.radius, self.center, self.normal = radius, center, direction
 
         # Create the circle
         self.bases['edge'] = self.geompy.MakeCircle(circle_center, normal, radius)
         self.bases['face'] = self.geompy.MakeFaceWires([self.bases['edge']], isPlanarWanted=True)
         self.bases['shell'] = self.geompy.MakeShell([self.bases['face']])
         self.geom = self.bases['face']
+        self._bases_placement = (self.R.copy(), list(self.origin))
 
         for key, base in self.bases.items():
-            self.geompy.addToStudy(base, self.name + '_base_' + key)
-            if self.folder:
-                self.geompy.PutToFolder(base, self.folder)
+            self.publisher.publish(base, self.name + '_base_' + key, self.folder)
 
         # Update GUI if needed
-        try:
-            salome.sg.updateObjBrowser()
-        except AttributeError:
-            pass
+        self.publisher.update_browser()
 
 
 class Shell(object):
 
-    def __init__(self, name, sections, folder=False, closed=True, minBSplineDegree=10, maxBSplineDegree=20, approximation=True):
+    # GEOM objects held by the shell and those only needed to build it (the
+    # lateral face is kept for the nested cuts)
+    OBJECTS = ('compound', 'face', 'geom')
+    INTERMEDIATES = ('edges', 'shells', 'locations', 'compound')
+
+    def __init__(self, name, sections, folder=False, closed=True, minBSplineDegree=10, maxBSplineDegree=20, approximation=True, geom=None, session=None):
         self.name, self.sections = name, sections
 
         self.edges = []
         self.shells = []
         self.locations = []
 
-        # Get the current study
-        self.study = salome.myStudy
-        self.geompy = geomBuilder.New()
+        # Share the session of the domain (or start one for a standalone shell)
+        self.session = session or Session()
+        self.study = self.session.study
+        self.geompy = self.session.geompy
+        self.publisher = self.session.publisher
 
         if folder:
-            self.folder = self.geompy.NewFolder('shell_' + name)
+            self.folder = self.publisher.new_folder('shell_' + name)
         else:
             self.folder = None
 
@@ -361,48 +1905,52 @@ class Shell(object):
         sewing_precision = 1.E-4
 
         for section in self.sections:
+            if 'edge' not in section.bases:
+                if section.circle() is None:
+                    raise ValueError(f"Section {section.name} has no circle")
+                section.restore()
+            section.apply()
             self.edges.append(section.bases['edge'])
             self.shells.append(section.bases['shell'])
             self.locations.append(section.location)
 
         self.compound = self.geompy.MakeCompound(self.edges)
-        self.face = self.geompy.MakeFilling(self.compound, theMinDeg, theMaxDeg, theTol2D, theTol3D, theNbIter, theMethod, isApprox)
 
-        if closed:
-            sewing = self.geompy.MakeSewing([self.face, self.sections[0].bases['shell'], self.sections[-1].bases['shell']], sewing_precision)
-            self.geom = self.geompy.MakeShell([sewing])
+        if geom is not None:
+            # Shell loaded from the geometry cache
+            self.face = None
+            self.geom = geom
         else:
-            self.geom = self.geompy.MakeShell([self.face])
+            self.face = self.geompy.MakeFilling(self.compound, theMinDeg, theMaxDeg, theTol2D, theTol3D, theNbIter, theMethod, isApprox)
 
-        self.geompy.addToStudy(self.geom, self.name)
-        self.geompy.addToStudy(self.compound, self.name + '_sections')
+            if closed:
+                sewing = self.geompy.MakeSewing([self.face, self.sections[0].bases['shell'], self.sections[-1].bases['shell']], sewing_precision)
+                self.geom = self.geompy.MakeShell([sewing])
+            else:
+                self.geom = self.geompy.MakeShell([self.face])
 
-        if self.folder:
-            self.geompy.PutToFolder(self.geom, self.folder)
-            self.geompy.PutToFolder(self.compound, self.folder)
+        self.publisher.publish(self.geom, self.name, self.folder)
+        self.publisher.publish(self.compound, self.name + '_sections', self.folder)
 
-        try:
-            salome.sg.updateObjBrowser()
-        except AttributeError:
-            pass
+        self.publisher.update_browser()
 
 class Solid(object):
 
-    def __init__(self, name, solid, folder=False):
+    OBJECTS = ('geom',)
+
+    def __init__(self, name, solid, folder=False, session=None):
         self.name = name
         self.geom = solid
 
-        self.study = salome.myStudy
-        self.geompy = geomBuilder.New()
+        self.session = session or Session()
+        self.study = self.session.study
+        self.geompy = self.session.geompy
+        self.publisher = self.session.publisher
 
         if folder:
-            self.folder = self.geompy.NewFolder('solid_' + name)
+            self.folder = self.publisher.new_folder('solid_' + name)
         else:
             self.folder = None
 
-        self.geompy.addToStudy(self.geom, self.name)
-
-        if self.folder:
-            self.geompy.PutToFolder(self.geom, self.folder)
-
-        salome.sg.updateObjBrowser()
+        self.publisher.publish(self.geom, self.name, self.folder)
+        self.publisher.update_browser()
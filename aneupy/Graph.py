@@ -0,0 +1,98 @@
+# =============================================================================
+#
+# Graph.py
+#
+# Python module with the dependency graph of the entities of a domain
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import itertools
+import threading
+
+
+class Graph(object):
+    """ Directed acyclic graph of section -> shell -> solid -> export.
+
+        Nodes are (kind, name) pairs, e.g. ('shells', 'aneurysm_outer') or
+        ('exports', 'output/ILT.stl'). Every built node keeps the function
+        that rebuilds it and the stamps of its inputs when it was built.
+        Leaves (sections) are stamped by the function given to the
+        constructor, so that editing a section in place is detected; built
+        nodes get a new stamp every time they are built.
+
+        A node is outdated when an input changed since it was built or an
+        input is outdated itself.
+
+    """
+
+    def __init__(self, stamp):
+        self._stamp = stamp
+        self.inputs = {}
+        self.recipes = {}
+        self.stamps = {}
+        self.built = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def stamp(self, node):
+        if node in self.recipes:
+            return self.stamps.get(node)
+        return self._stamp(node)
+
+    def record(self, node, inputs, recipe):
+        """ Records that node was built from inputs; recipe rebuilds it"""
+
+        inputs = list(inputs)
+        with self._lock:
+            self.inputs[node] = inputs
+            self.recipes[node] = recipe
+            self.built[node] = {item: self.stamp(item) for item in inputs}
+            self.stamps[node] = next(self._counter)
+
+    def dependents(self, node):
+        """ Nodes built, directly or not, from node, in build order"""
+
+        found = set()
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            for item, inputs in self.inputs.items():
+                if current in inputs and item not in found:
+                    found.add(item)
+                    pending.append(item)
+
+        return [item for item in self.order() if item in found]
+
+    def order(self):
+        """ Built nodes sorted so that inputs come before the nodes using them"""
+
+        ordered, visited = [], set()
+
+        def visit(node):
+            if node in visited:
+                return
+            visited.add(node)
+            for item in self.inputs.get(node, []):
+                visit(item)
+            if node in self.recipes:
+                ordered.append(node)
+
+        for node in list(self.recipes):
+            visit(node)
+
+        return ordered
+
+    def outdated(self):
+        """ Nodes to rebuild, in build order"""
+
+        outdated = {}
+        for node in self.order():
+            if any(item in outdated or self.stamp(item) != stamp for item, stamp in self.built[node].items()):
+                outdated[node] = True
+
+        return list(outdated)
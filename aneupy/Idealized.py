@@ -0,0 +1,231 @@
+# =============================================================================
+#
+# Idealized.py
+#
+# Python module with the parameterization of idealized AAA geometries
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+
+import numpy as np
+
+import Preview
+
+
+# Default parameters of the idealized models (those of test/Idealized_automatic.py)
+DEFAULTS = {
+    'length': 100.0,
+    'radius_nondilated': 5.0,
+    'radius_dilated': 12.0,
+    'wall_thickness_intima': 1.0,
+    'wall_thickness_media': 1.0,
+    'wall_thickness_adventitia': 1.0,
+    'wall_thickness_ILT': 0.0,
+    'x_shift': 4.0,
+    'y_shift': 0.0,
+}
+
+LAYERS = ('fluid', 'intima', 'media', 'adventitia')
+
+SHELLS = {
+    'fluid': 'aneurysm_inner',
+    'intima': 'intima_outer',
+    'media': 'media_outer',
+    'adventitia': 'adventitia_outer',
+}
+
+SOLIDS = ['aneurysm_fluid', 'aneurysm_intima_ILT', 'media_solid', 'adventitia_solid']
+
+FORMATS = ('iges', 'stl', 'step')
+
+
+def parameters(**kwargs):
+    """ Parameters of an idealized model, using DEFAULTS for missing values"""
+
+    unknown = set(kwargs) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+    params = dict(DEFAULTS)
+    params.update({key: float(value) for key, value in kwargs.items() if value is not None})
+
+    return params
+
+
+def stations(length, x_shift, y_shift, n_sections=11):
+    """ Name suffixes and origins of the sections of a layer, in shell order.
+
+        The n_sections evenly spaced sections are complemented with two extra
+        control sections after the first one and two before the last one. The
+        three central sections are shifted to make the sac asymmetric.
+    """
+
+    step = length/(n_sections - 1)
+    mid_section = n_sections//2
+
+    names, origins = [], []
+    for i in range(n_sections):
+        z = length*(i/(n_sections - 1))
+
+        if i == mid_section:
+            origin = [x_shift, y_shift, z]
+        elif i in (mid_section - 1, mid_section + 1):
+            origin = [x_shift/2, y_shift/2, z]
+        else:
+            origin = [0., 0., z]
+
+        if i == n_sections - 1:
+            names += [f'{i}a', f'{i}b']
+            origins += [[0., 0., z - step/2], [0., 0., z - step/4]]
+
+        names.append(f'{i}')
+        origins.append(origin)
+
+        if i == 0:
+            names += [f'{i}a', f'{i}b']
+            origins += [[0., 0., z + step/3], [0., 0., z + 2*step/3]]
+
+    return names, origins
+
+
+def radii(radius_nondilated, radius_dilated, n_sections=11, ILT_thickness=None, wall_thickness=0.):
+    """ Radii of the sections of a layer, in the order given by stations.
+
+        The radius grows linearly from radius_nondilated to radius_dilated in
+        the two sections on each side of the central one. If ILT_thickness is
+        given, the central sections are reduced to leave room for the thrombus
+        (fluid layer).
+    """
+
+    mid_section = n_sections//2
+    transition_range = 2
+
+    radius = []
+    for i in range(n_sections):
+        if i == mid_section:
+            r = radius_dilated
+        elif abs(i - mid_section) <= transition_range:
+            r = radius_dilated + (radius_nondilated - radius_dilated)*abs(i - mid_section)/transition_range
+        else:
+            r = radius_nondilated
+
+        if ILT_thickness is not None:
+            if i == mid_section:
+                r -= ILT_thickness
+            elif abs(i - mid_section) == 1:
+                r -= ILT_thickness/2
+            elif r == radius_dilated:
+                r -= wall_thickness
+        radius.append(r)
+
+    # Extra control sections take the radius of their neighbour
+    return [radius[0]]*3 + radius[1:-1] + [radius[-2]]*2 + [radius[-1]]
+
+
+def layer_radii(params, layer, n_sections=11):
+    """ Radii of the sections of one of the LAYERS"""
+
+    params = parameters(**params)
+    offset = 0.
+    for name, key in (('intima', 'wall_thickness_intima'), ('media', 'wall_thickness_media'),
+                      ('adventitia', 'wall_thickness_adventitia')):
+        if LAYERS.index(layer) >= LAYERS.index(name):
+            offset += params[key]
+
+    if layer == 'fluid':
+        return radii(params['radius_nondilated'], params['radius_dilated'], n_sections,
+                     ILT_thickness=params['wall_thickness_ILT'], wall_thickness=params['wall_thickness_intima'])
+
+    return radii(params['radius_nondilated'] + offset, params['radius_dilated'] + offset, n_sections)
+
+
+def build(d, n_sections=11, layered=False, validation='full', nested=False, **kwargs):
+    """ Adds the sections, shells and solids of an idealized model to Domain d.
+
+        With layered, only the fluid layer is lofted and the wall layers are
+        offsets of it (see Domain.add_layers); their thickness is then normal
+        to the wall instead of radial. validation and nested set how the
+        layers are cut (see Domain.add_solid_from_cut).
+    """
+
+    params = parameters(**kwargs)
+    names, origins = stations(params['length'], params['x_shift'], params['y_shift'], n_sections)
+
+    if layered:
+        section_names = []
+        for suffix, origin, radius in zip(names, origins, layer_radii(params, 'fluid', n_sections)):
+            name = f'fluid{suffix}'
+            d.add_section(name=name, origin=origin)
+            d.sections[name].add_circle(radius=radius)
+            section_names.append(name)
+
+        d.add_shell(name=SHELLS['fluid'], sections=section_names, minBSplineDegree=10, maxBSplineDegree=20, approximation=True)
+
+        # The intima includes the thrombus, which makes its thickness vary along the sac
+        intima = [outer - inner for outer, inner in zip(layer_radii(params, 'intima', n_sections),
+                                                        layer_radii(params, 'fluid', n_sections))]
+        d.add_layers(SHELLS['fluid'], 'aneurysm_fluid', [('intima_outer', 'aneurysm_intima_ILT', intima),
+                                                         ('media_outer', 'media_solid', params['wall_thickness_media']),
+                                                         ('adventitia_outer', 'adventitia_solid',
+                                                          params['wall_thickness_adventitia'])],
+                     validation=validation)
+        return d
+
+    for layer in LAYERS:
+        section_names = []
+        for suffix, origin, radius in zip(names, origins, layer_radii(params, layer, n_sections)):
+            name = f'{layer}{suffix}'
+            d.add_section(name=name, origin=origin)
+            d.sections[name].add_circle(radius=radius)
+            section_names.append(name)
+
+        d.add_shell(name=SHELLS[layer], sections=section_names, minBSplineDegree=10, maxBSplineDegree=20, approximation=True)
+
+    # The layers are nested by construction
+    d.add_solid_from_shell(name='intima_outer', shell='intima_outer')
+    d.add_solid_from_shell(name='aneurysm_fluid', shell='aneurysm_inner')
+    d.add_solid_from_cut(name='aneurysm_intima_ILT', solids=['intima_outer', 'aneurysm_fluid'],
+                         validation=validation, nested=nested)
+    d.add_solid_from_shell(name='media_outer', shell='media_outer')
+    d.add_solid_from_cut(name='media_solid', solids=['media_outer', 'intima_outer'], validation=validation, nested=nested)
+    d.add_solid_from_shell(name='adventitia_outer', shell='adventitia_outer')
+    d.add_solid_from_cut(name='adventitia_solid', solids=['adventitia_outer', 'media_outer'],
+                         validation=validation, nested=nested)
+
+    return d
+
+
+def preview(cases, n_sections=11):
+    """ Semi-analytic preview of many idealized models without building them
+        (see Preview.tube): the fluid is the lumen and the adventitia the
+        outer surface of the wall.
+
+        cases is a list of parameter dictionaries (see DEFAULTS). All the
+        cases are evaluated at once; the results are arrays with one value
+        per case (see Preview.model).
+    """
+
+    params = [parameters(**case) for case in cases]
+    centers = np.array([stations(p['length'], p['x_shift'], p['y_shift'], n_sections)[1] for p in params])
+    frames = np.broadcast_to(np.eye(3), (centers.shape[1], 3, 3))
+
+    lumen = Preview.tube(centers, frames, [layer_radii(p, 'fluid', n_sections) for p in params])
+    outer = Preview.tube(centers, frames, [layer_radii(p, 'adventitia', n_sections) for p in params])
+
+    return Preview.model(lumen, outer)
+
+
+def export(d, output_dir, formats=FORMATS, solids=SOLIDS, workers=None):
+    """ Exports the solids of an idealized model concurrently (see
+        Domain.export_all) and returns the file paths"""
+
+    spec = {solid: [os.path.join(output_dir, f'{solid}.{f_type}') for f_type in formats] for solid in solids}
+    d.export_all(spec, workers=workers)
+
+    return [os.path.join(output_dir, f'{solid}.{f_type}') for f_type in formats for solid in solids]
@@ -0,0 +1,1067 @@
+# =============================================================================
+#
+# Mesh.py
+#
+# Python module to generate triangulated surface models with NumPy
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import math
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=float)
+    return v/np.linalg.norm(v)
+
+
+def frame(OX, OY):
+    """ Orthonormal frame with rows OX, OY and OZ built from two directions"""
+
+    ox = _unit(OX)
+    oz = _unit(np.cross(ox, OY))
+    oy = np.cross(oz, ox)
+
+    return np.array([ox, oy, oz])
+
+
+def axis_angle(R):
+    """ Axis and angle (in radians, between 0 and pi) of a rotation matrix"""
+
+    R = np.asarray(R, dtype=float)
+    angle = math.acos(max(-1., min(1., 0.5*(np.trace(R) - 1.))))
+
+    if angle < 1.E-12:
+        return np.array([0., 0., 1.]), 0.
+
+    if math.pi - angle < 1.E-6:
+        # R = 2*a*a^T - I: the axis is the largest column of R + I
+        S = R + np.eye(3)
+        return _unit(S[:, np.argmax(np.linalg.norm(S, axis=0))]), angle
+
+    return _unit([R[2, 1] - R[1, 2], R[0, 2] - R[2, 0], R[1, 0] - R[0, 1]]), angle
+
+
+def _frame_from_normal(normal):
+    """ Orthonormal frame with rows OX, OY and OZ where OZ is the normal"""
+
+    oz = _unit(normal)
+    ref = np.eye(3)[np.argmin(np.abs(oz))]
+    ox = _unit(np.cross(ref, oz))
+    oy = np.cross(oz, ox)
+
+    return np.array([ox, oy, oz])
+
+
+def frames_from_normals(normals):
+    """ Orthonormal frames (N, 3, 3) with rows OX, OY and OZ where OZ is the
+        normal, computed for N normals at once as in _frame_from_normal"""
+
+    oz = np.asarray(normals, dtype=float)
+    oz = oz/np.linalg.norm(oz, axis=1)[:, None]
+    ref = np.eye(3)[np.argmin(np.abs(oz), axis=1)]
+    ox = np.cross(ref, oz)
+    ox /= np.linalg.norm(ox, axis=1)[:, None]
+    oy = np.cross(oz, ox)
+
+    return np.stack([ox, oy, oz], axis=1)
+
+
+def frames_from_axes(frames):
+    """ Orthonormal frames (N, 3, 3) with rows OX, OY and OZ built from the
+        rows OX, OY of N frames at once, as frame does for one"""
+
+    frames = np.asarray(frames, dtype=float)
+    ox = frames[:, 0]/np.linalg.norm(frames[:, 0], axis=1)[:, None]
+    oz = np.cross(ox, frames[:, 1])
+    oz /= np.linalg.norm(oz, axis=1)[:, None]
+
+    return np.stack([ox, np.cross(oz, ox), oz], axis=1)
+
+
+def rotation_matrix(axis, angle):
+    """ Rotation matrix of angle (in radians) around axis (Rodrigues' formula)"""
+
+    x, y, z = _unit(axis)
+    c, s = math.cos(angle), math.sin(angle)
+    C = 1. - c
+
+    return np.array([[c + x*x*C, x*y*C - z*s, x*z*C + y*s],
+                     [y*x*C + z*s, c + y*y*C, y*z*C - x*s],
+                     [z*x*C - y*s, z*y*C + x*s, c + z*z*C]])
+
+
+class Section(object):
+    """ Defines a cross section as a regular polygon.
+
+        Mirrors Geometry.Section: the section is defined in the XY plane of the
+        local coordinate system (LCS) given by origin, OX_LCS and OY_LCS, and
+        rotations are applied around axes through the origin of the LCS.
+
+        resolution is the number of points used to discretize the circle
+
+    """
+
+    # Arrays held by the section (see Geometry.objects); NumPy sections hold
+    # only their circle
+    OBJECTS = ()
+
+    def __init__(self, name, origin, OX_LCS=None, OY_LCS=None, folder=True, resolution=64):
+        self.name = name
+        self.origin = list(origin)
+        self.resolution = resolution
+        self.bases = {}
+        self.history = []
+        self.folder = None
+        self.geom = None
+
+        try:
+            self.OX_LCS = list(OX_LCS)
+        except:
+            self.OX_LCS = [1., 0., 0.]
+
+        try:
+            self.OY_LCS = list(OY_LCS)
+        except:
+            self.OY_LCS = [0., 1., 0.]
+
+        self.location = np.array(self.origin, dtype=float)
+        self.R = frame(self.OX_LCS, self.OY_LCS)
+
+        self.center = None
+        self.frame = None
+        self.radius = None
+
+        # Increased on every change of the section
+        self.version = 0
+
+    def signature(self):
+        """ Description of the section used as part of cache keys"""
+
+        return {'origin': self.origin, 'OX_LCS': self.OX_LCS, 'OY_LCS': self.OY_LCS, 'history': self.history}
+
+    def apply(self):
+        """ Transformations of NumPy sections are applied immediately"""
+
+        pass
+
+    def _rotate(self, axis, angle):
+        rotation = rotation_matrix(axis, angle*math.pi/180.)
+
+        self.version += 1
+        self.R = self.R.dot(rotation.T)
+        if self.radius is not None:
+            self.frame = self.frame.dot(rotation.T)
+            self.center = self.location + rotation.dot(self.center - self.location)
+
+    def rotateX(self, angle):
+        """Rotate the section around an axis parallel to global X
+        through the origin of the LCS"""
+
+        self.history.append(['rotateX', angle])
+        self._rotate([1., 0., 0.], angle)
+
+    def rotateY(self, angle):
+        """Rotate the section around an axis parallel to global Y
+        through the origin of the LCS"""
+
+        self.history.append(['rotateY', angle])
+        self._rotate([0., 1., 0.], angle)
+
+    def rotateZ(self, angle):
+        """Rotate the section around an axis parallel to global Z
+        through the origin of the LCS"""
+
+        self.history.append(['rotateZ', angle])
+        self._rotate([0., 0., 1.], angle)
+
+    def add_circle(self, radius):
+        self.history.append(['add_circle', radius])
+        self.version += 1
+        self.radius = float(radius)
+        self.center = self.location.copy()
+        self.frame = self.R.copy()
+        self.geom = self
+
+    def add_circle2(self, circle_center, normal, radius):
+        """
+        Adds a circle to the section using specified center, normal vector, and radius.
+
+        Args:
+            circle_center (list): The center point of the circle.
+            normal (list): The normal vector defining the circle's orientation.
+            radius (float): The radius of the circle.
+        """
+        self.history.append(['add_circle2', list(circle_center), list(normal), radius])
+        self.version += 1
+        self.radius = float(radius)
+        self.center = np.array(circle_center, dtype=float)
+        self.frame = _frame_from_normal(normal)
+        self.geom = self
+
+    def circle(self):
+        """ Center, normal and radius of the circle, or None"""
+
+        if self.radius is None:
+            return None
+        return self.center, self.frame[2], self.radius
+
+    def ring(self, resolution=None, OX=None):
+        """ Points of the circle, starting at direction OX if given"""
+
+        if self.radius is None:
+            raise ValueError(f"Section {self.name} has no circle")
+
+        n = resolution or self.resolution
+        ox, oy, oz = self.frame
+        if OX is not None:
+            ox = _unit(OX)
+            oy = np.cross(oz, ox)
+
+        theta = 2.*math.pi*np.arange(n)/n
+
+        return self.center + self.radius*(np.cos(theta)[:, None]*ox + np.sin(theta)[:, None]*oy)
+
+    @property
+    def vertices(self):
+        return np.vstack([self.ring(), self.center])
+
+    @property
+    def faces(self):
+        n = self.resolution
+        j = np.arange(n)
+        return np.column_stack([np.full(n, n), j, (j + 1) % n])
+
+    @property
+    def edges(self):
+        return [self.ring()]
+
+
+def circular_sections(names, origins, frames, radii, folder=True, resolution=64):
+    """ Sections with a circle of radius radii[i] in the XY plane of the LCS
+        given by origins[i] and the rows OX, OY of frames[i], the same as
+        creating each Section and calling add_circle, with the frames of all
+        the sections computed at once"""
+
+    origins = np.array(origins, dtype=float)
+    frames = np.asarray(frames, dtype=float)
+    R = frames_from_axes(frames)
+    centers = origins.copy()
+    circle_frames = R.copy()
+
+    sections = []
+    for i, (name, origin, OX, OY, radius) in enumerate(zip(names, origins.tolist(), frames[:, 0].tolist(),
+                                                             frames[:, 1].tolist(), np.asarray(radii, dtype=float).tolist())):
+        section = Section.__new__(Section)
+        section.__dict__.update(name=name, origin=origin, resolution=resolution, bases={},
+                                history=[['add_circle', radius]], folder=None, OX_LCS=OX, OY_LCS=OY,
+                                location=origins[i], R=R[i], center=centers[i], frame=circle_frames[i],
+                                radius=radius, version=1)
+        section.geom = section
+        sections.append(section)
+
+    return sections
+
+
+def loft(sections, resolution=64, subdivisions=8):
+    """ Lofts the circles of a list of sections.
+
+        Rings are sampled with the same number of points and their start points
+        are transported from one section to the next to avoid twisting. The
+        surface between sections is interpolated with a Catmull-Rom spline with
+        subdivisions rings per span. Returns an array (rings, resolution, 3).
+    """
+
+    return loft_circles([section.center for section in sections], [section.frame for section in sections],
+                        [section.radius for section in sections], resolution, subdivisions)
+
+
+# Catmull-Rom basis matrix
+_CATMULL_ROM = 0.5*np.array([[0., 2., 0., 0.],
+                             [-1., 0., 1., 0.],
+                             [2., -5., 4., -1.],
+                             [-1., 3., -3., 1.]])
+
+
+def _transport(frames):
+    """ Directions OX, OY (N, 3) of the start points of N circles, transported
+        from the first one to avoid twisting the loft"""
+
+    frames = np.asarray(frames, dtype=float)
+    normals = frames[:, 2].copy()
+    OX = np.empty_like(normals)
+    OX[0] = frames[0, 0]
+    for i in range(1, len(normals)):
+        if np.dot(normals[i], normals[i - 1]) < 0.:
+            normals[i] = -normals[i]
+        projected = OX[i - 1] - np.dot(OX[i - 1], normals[i])*normals[i]
+        norm = np.linalg.norm(projected)
+        OX[i] = projected/norm if norm > 1.E-12 else frames[i, 0]
+    OY = np.cross(normals, OX)
+
+    return OX, OY
+
+
+def _control_rings(centers, frames, radii, resolution):
+    """ Rings sampling N circles with start points transported along them"""
+
+    centers = np.asarray(centers, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+
+    if len(centers) < 2:
+        raise ValueError("At least two sections are needed to loft a shell")
+
+    OX, OY = _transport(frames)
+
+    theta = 2.*math.pi*np.arange(resolution)/resolution
+    return centers[:, None, :] + radii[:, None, None]*(np.cos(theta)[None, :, None]*OX[:, None, :] +
+                                                       np.sin(theta)[None, :, None]*OY[:, None, :])
+
+
+def _span_controls(P):
+    """ Control points (spans, 4, resolution, 3) of the Catmull-Rom spans"""
+
+    Pe = np.concatenate([2.*P[:1] - P[1:2], P, 2.*P[-1:] - P[-2:-1]])
+    N = len(P)
+    return np.stack([Pe[k:k + N - 1] for k in range(4)], axis=1)
+
+
+def loft_circles(centers, frames, radii, resolution=64, subdivisions=8):
+    """ Lofts N circles given as arrays of centers (N, 3), frames (N, 3, 3)
+        with the normal in the last row and radii (N,). subdivisions is a
+        number of rings per span or a sequence with one number per span.
+        See loft."""
+
+    P = _control_rings(centers, frames, radii, resolution)
+    G = _span_controls(P)
+
+    counts = np.broadcast_to(np.asarray(subdivisions, dtype=int), (len(G),))
+    if np.all(counts == counts[0]):
+        t = np.arange(counts[0])/float(counts[0])
+        W = np.column_stack([np.ones_like(t), t, t**2, t**3]).dot(_CATMULL_ROM)
+        spans = np.einsum('sk,mkjd->msjd', W, G).reshape(-1, resolution, 3)
+    else:
+        spans = []
+        for count, controls in zip(counts, G):
+            t = np.arange(count)/float(count)
+            W = np.column_stack([np.ones_like(t), t, t**2, t**3]).dot(_CATMULL_ROM)
+            spans.append(np.einsum('sk,kjd->sjd', W, controls))
+        spans = np.concatenate(spans)
+
+    return np.concatenate([spans, P[-1:]])
+
+
+def _positions(points):
+    """ Cumulative length along a polyline, normalized to [0, 1]"""
+
+    s = np.concatenate([[0.], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    return s/s[-1] if s[-1] > 0. else s
+
+
+def wall_thickness(sections, thickness):
+    """ Thickness at each section, from a value or one value per section"""
+
+    return np.broadcast_to(np.asarray(thickness, dtype=float), (len(sections),)).copy()
+
+
+def circles(sections):
+    """ Centers (N, 3), normals (N, 3) and radii (N,) of the circles of a list
+        of sections, or None if a section has no circle"""
+
+    circles = [section.circle() for section in sections]
+    if any(circle is None for circle in circles):
+        return None
+
+    return (np.array([circle[0] for circle in circles], dtype=float),
+            np.array([circle[1] for circle in circles], dtype=float),
+            np.array([circle[2] for circle in circles], dtype=float))
+
+
+def offset_radii(sections, thickness):
+    """ Centers, normals and radii of circles in the planes of the sections
+        at a distance thickness, normal to the loft, from their circles.
+
+        The radial offset in the plane of each section is the thickness
+        divided by the cosine of the slope of the radius along the sections.
+    """
+
+    centers, normals, radii = circles(sections)
+
+    s = np.concatenate([[0.], np.cumsum(np.linalg.norm(np.diff(centers, axis=0), axis=1))])
+    if np.all(np.diff(s) > 0.):
+        slope = np.gradient(radii, s)
+    else:
+        slope = np.zeros_like(radii)
+
+    return centers, normals, radii + wall_thickness(sections, thickness)*np.sqrt(1. + slope**2)
+
+
+def shared_ends(outer, inner, tolerance=1.E-6):
+    """ True if the end circles of two lists of circles (centers, normals,
+        radii) lie in the same planes with the same centers"""
+
+    scale = np.ptp(np.asarray(outer[0], dtype=float), axis=0).max() + np.max(outer[2])
+    for end in (0, -1):
+        if np.linalg.norm(np.subtract(outer[0][end], inner[0][end])) > tolerance*scale:
+            return False
+        if abs(abs(np.dot(_unit(outer[1][end]), _unit(inner[1][end]))) - 1.) > tolerance:
+            return False
+
+    return True
+
+
+def clearance(outer, inner):
+    """ Smallest gap between the circles inner and the loft through the
+        circles outer, both given as (centers, normals, radii).
+
+        Each inner center is projected on the polyline of the outer centers,
+        where the outer center and radius are interpolated; the gap is that
+        radius minus the distance to the outer center and the inner radius.
+        It is negative when an inner circle leaves the outer loft. This is a
+        cheap pre-check of containment, not an exact intersection test.
+    """
+
+    centers, radii = np.asarray(outer[0], dtype=float), np.asarray(outer[2], dtype=float)
+    points, inner_radii = np.asarray(inner[0], dtype=float), np.asarray(inner[2], dtype=float)
+
+    segments = np.diff(centers, axis=0)
+    relative = points[:, None, :] - centers[None, :-1, :]
+    t = np.clip(np.einsum('ijk,jk->ij', relative, segments)/
+                np.maximum(np.einsum('jk,jk->j', segments, segments), 1.E-300), 0., 1.)
+    distance = np.linalg.norm(relative - t[..., None]*segments, axis=2)
+
+    closest = np.argmin(distance, axis=1)
+    rows = np.arange(len(points))
+    t = t[rows, closest]
+    radius = radii[closest] + t*(radii[closest + 1] - radii[closest])
+
+    return float(np.min(radius - distance[rows, closest] - inner_radii))
+
+
+def offset_rings(rings, sections, thickness):
+    """ Rings of a loft moved outwards in their planes so that the surface
+        through them lies at a distance thickness along its normal.
+
+        thickness is given at the sections and interpolated linearly along
+        the loft. Points move radially within their ring, so end rings stay
+        in the end planes and cuts with the loft can join them.
+    """
+
+    centers = rings.mean(axis=1)
+    section_centers = np.array([section.circle()[0] for section in sections], dtype=float)
+    thickness = np.interp(_positions(centers), _positions(section_centers), wall_thickness(sections, thickness))
+
+    radial = rings - centers[:, None]
+    radial /= np.linalg.norm(radial, axis=2)[..., None]
+
+    # Normal of the surface from the tangents along and around the rings
+    normal = np.cross(np.roll(rings, -1, axis=1) - np.roll(rings, 1, axis=1), np.gradient(rings, axis=0))
+    normal /= np.linalg.norm(normal, axis=2)[..., None]
+    cosine = np.maximum(np.abs(np.einsum('ijk,ijk->ij', normal, radial)), 0.2)
+
+    return rings + (thickness[:, None]/cosine)[..., None]*radial
+
+
+def offset_shell(name, shell, thickness, **kwargs):
+    """ Shell at a distance thickness (a value or one per section) outside a
+        lofted shell, sharing its sections and resolution"""
+
+    thickness = wall_thickness(shell.sections, thickness)
+    return Shell(name, shell.sections, closed=shell.closed, rings=offset_rings(shell.rings, shell.sections, thickness),
+                 thickness=thickness)
+
+
+def chord_resolution(radius, tolerance, minimum=8):
+    """ Number of points of a ring of the given radius whose chords deviate
+        less than tolerance from the circle"""
+
+    if tolerance >= radius:
+        return minimum
+    return max(minimum, int(math.ceil(math.pi/math.acos(1. - tolerance/radius))))
+
+
+def adaptive_subdivisions(centers, frames, radii, resolution, tolerance):
+    """ Rings per span of a loft so that the chords between rings deviate less
+        than tolerance from the spline.
+
+        The deviation of a chord of parameter length h is bounded by
+        h**2/8 times the second derivative of the span, which is linear in
+        the parameter and thus maximum at one of its ends. Spans with high
+        curvature (the sac) get more rings than straight ones.
+    """
+
+    G = _span_controls(_control_rings(centers, frames, radii, resolution))
+    curvature = np.maximum(np.linalg.norm(np.einsum('k,mkjd->mjd', 2.*_CATMULL_ROM[2], G), axis=2).max(axis=1),
+                           np.linalg.norm(np.einsum('k,mkjd->mjd', 2.*_CATMULL_ROM[2] + 6.*_CATMULL_ROM[3], G),
+                                          axis=2).max(axis=1))
+
+    subdivisions = np.maximum(1, np.ceil(np.sqrt(curvature/(8.*tolerance)))).astype(int)
+    deviation = (curvature/(8.*subdivisions**2)).max()
+
+    return subdivisions, deviation
+
+
+def _ring_faces(n_rings, n):
+    """ Triangles joining consecutive rings of n points"""
+
+    i, j = np.meshgrid(np.arange(n_rings - 1), np.arange(n), indexing='ij')
+    a = (i*n + j).ravel()
+    b = (i*n + (j + 1) % n).ravel()
+    c = ((i + 1)*n + (j + 1) % n).ravel()
+    d = ((i + 1)*n + j).ravel()
+
+    return np.concatenate([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+
+
+def _cap_faces(first, n, center):
+    """ Triangle fan closing the ring starting at index first"""
+
+    j = np.arange(n)
+    return np.column_stack([np.full(n, center), first + (j + 1) % n, first + j])
+
+
+def _signed_volume(vertices, faces):
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    return np.einsum('ij,ij->i', a, np.cross(b, c)).sum()/6.
+
+
+def _orient(faces, direction):
+    """ Flips faces so that their normals point along direction"""
+
+    if direction < 0.:
+        return faces[:, ::-1].copy()
+    return faces
+
+
+class Shell(object):
+    """ Defines a triangulated surface lofted through a list of sections.
+
+        The B-spline options of Geometry.Shell are accepted for compatibility
+        and ignored. resolution is the number of points per ring and
+        subdivisions the number of rings interpolated between two sections.
+        Previously lofted rings can be given to skip the loft.
+
+        Shells offset from the loft through their sections (see offset_shell)
+        keep the thickness at each section.
+
+    """
+
+    OBJECTS = ('rings', 'vertices', 'wall', 'caps')
+
+    def __init__(self, name, sections, folder=False, closed=True, minBSplineDegree=10, maxBSplineDegree=20,
+                 approximation=True, resolution=64, subdivisions=8, rings=None, thickness=None):
+        self.name, self.sections = name, sections
+        self.closed = closed
+        self.thickness = thickness
+        self.folder = None
+        self.geom = self
+
+        self.rings = loft(sections, resolution, subdivisions) if rings is None else rings
+        n_rings, n = self.rings.shape[:2]
+
+        self.vertices = np.vstack([self.rings.reshape(-1, 3), self.rings[0].mean(axis=0), self.rings[-1].mean(axis=0)])
+        wall = _ring_faces(n_rings, n)
+        caps = np.concatenate([_cap_faces(0, n, n_rings*n), _cap_faces((n_rings - 1)*n, n, n_rings*n + 1)[:, ::-1]])
+
+        # Normals point outwards when the enclosed volume is positive
+        direction = _signed_volume(self.vertices, np.concatenate([wall, caps]))
+        self.wall = _orient(wall, direction)
+        self.caps = _orient(caps, direction)
+
+    @property
+    def faces(self):
+        if self.closed:
+            return np.concatenate([self.wall, self.caps])
+        return self.wall
+
+    @property
+    def edges(self):
+        return [self.rings[0], self.rings[-1]]
+
+
+class Solid(object):
+    """ Defines a closed triangulated surface.
+
+        rings and wall are kept for solids built from a lofted shell so that
+        they can be used as operands of a cut. source records how the solid
+        was built, ('shell', shell) or ('cut', outer, inner), so that it can
+        be tessellated again (see tessellate).
+
+    """
+
+    OBJECTS = ('vertices', 'faces', 'rings', 'wall')
+
+    def __init__(self, name, vertices, faces, edges=None, rings=None, wall=None, folder=False, source=None):
+        self.name = name
+        self.vertices = vertices
+        self.faces = faces
+        self.edges = edges or []
+        self.rings = rings
+        self.wall = wall
+        self.source = source
+        self.folder = None
+        self.geom = self
+
+
+def solid_from_shell(name, shell, **kwargs):
+
+    if not shell.closed:
+        raise ValueError(f"Shell {shell.name} is not closed")
+
+    return Solid(name, shell.vertices, shell.faces, edges=shell.edges, rings=shell.rings, wall=shell.wall,
+                 source=('shell', shell), **kwargs)
+
+
+def solid_from_cut(name, outer, inner, tolerance=1.E-6, **kwargs):
+    """ Solid enclosed between two nested solids.
+
+        inner must lie inside outer. When both solids come from lofted shells
+        sharing their end planes, the end caps are replaced by annuli joining
+        the end rings; otherwise the inner surface is added as a cavity.
+    """
+
+    scale = np.ptp(outer.vertices, axis=0).max()
+    shared = outer.rings is not None and inner.rings is not None and \
+        np.linalg.norm(outer.rings[0].mean(axis=0) - inner.rings[0].mean(axis=0)) < tolerance*scale and \
+        np.linalg.norm(outer.rings[-1].mean(axis=0) - inner.rings[-1].mean(axis=0)) < tolerance*scale
+
+    if not shared:
+        offset = len(outer.vertices)
+        vertices = np.vstack([outer.vertices, inner.vertices])
+        faces = np.concatenate([outer.faces, inner.faces[:, ::-1] + offset])
+        return Solid(name, vertices, faces, edges=outer.edges + inner.edges, source=('cut', outer, inner), **kwargs)
+
+    n_outer, n = outer.rings.shape[:2]
+    n_inner = inner.rings.shape[0]
+    if inner.rings.shape[1] != n:
+        raise ValueError(f"Solids {outer.name} and {inner.name} must be lofted with the same resolution")
+
+    offset = n_outer*n
+    vertices = np.vstack([outer.rings.reshape(-1, 3), inner.rings.reshape(-1, 3)])
+
+    j = np.arange(n)
+    faces = [outer.wall, inner.wall[:, ::-1] + offset]
+    for o, i, neighbour in ((0, offset, n), ((n_outer - 1)*n, offset + (n_inner - 1)*n, (n_outer - 2)*n)):
+        annulus = np.concatenate([np.column_stack([o + j, o + (j + 1) % n, i + (j + 1) % n]),
+                                  np.column_stack([o + j, i + (j + 1) % n, i + j])])
+        a, b, c = vertices[annulus[0]]
+        axis = vertices[o:o + n].mean(axis=0) - vertices[neighbour:neighbour + n].mean(axis=0)
+        faces.append(_orient(annulus, np.dot(np.cross(b - a, c - a), axis)))
+
+    edges = [outer.rings[0], outer.rings[-1], inner.rings[0], inner.rings[-1]]
+
+    return Solid(name, vertices, np.concatenate(faces), edges=edges, source=('cut', outer, inner), **kwargs)
+
+
+def _source_shells(solid):
+    """ Shells a solid was built from, or None if it cannot be rebuilt"""
+
+    source = getattr(solid, 'source', None)
+    if source is None:
+        return None
+    if source[0] == 'shell':
+        shell = source[1]
+        if any(section.radius is None for section in shell.sections):
+            return None
+        return [shell]
+
+    shells = []
+    for operand in source[1:]:
+        operand_shells = _source_shells(operand)
+        if operand_shells is None:
+            return None
+        shells += [shell for shell in operand_shells if shell not in shells]
+
+    return shells
+
+
+def _rebuild(solid, shells):
+    """ Rebuilds a solid from new shells given by the id of the old ones"""
+
+    source = solid.source
+    if source[0] == 'shell':
+        return solid_from_shell(solid.name, shells[id(source[1])])
+
+    return solid_from_cut(solid.name, _rebuild(source[1], shells), _rebuild(source[2], shells))
+
+
+def _retessellate(solid, shells, tolerance):
+    """ Solid lofted again with chords deviating less than tolerance"""
+
+    # Split the tolerance between the rings and the spans; the resolution
+    # is shared by every shell so that cuts can join their rings
+    radius = max(section.radius + (0. if shell.thickness is None else shell.thickness.max())
+                 for shell in shells for section in shell.sections)
+    resolution = chord_resolution(radius, tolerance/2.)
+    ring_deviation = radius*(1. - math.cos(math.pi/resolution))
+
+    new_shells, deviation = {}, 0.
+    for shell in shells:
+        circles = ([section.center for section in shell.sections], [section.frame for section in shell.sections],
+                   [section.radius for section in shell.sections])
+        subdivisions, span_deviation = adaptive_subdivisions(*circles, resolution=resolution, tolerance=tolerance/2.)
+        rings = loft_circles(*circles, resolution=resolution, subdivisions=subdivisions)
+        if shell.thickness is not None:
+            rings = offset_rings(rings, shell.sections, shell.thickness)
+        new_shells[id(shell)] = Shell(shell.name, shell.sections, closed=shell.closed, rings=rings,
+                                      thickness=shell.thickness)
+        deviation = max(deviation, span_deviation)
+
+    return _rebuild(solid, new_shells), ring_deviation + deviation
+
+
+def tessellate(solid, tolerance=None, triangles=None):
+    """ Tessellation of a solid for export, with a report.
+
+        tolerance is the maximum chord deviation relative to the diagonal of
+        the bounding box. Rings get the resolution needed by the largest
+        radius and each span as many rings as its curvature requires.
+        triangles is a target triangle count, met by searching the tolerance.
+        Without options, or for solids that cannot be rebuilt (e.g. loaded
+        from the cache), the solid is returned as is.
+
+        Returns the solid and a dictionary with the number of triangles, the
+        bound of the deviation (absolute and relative; None if unknown) and
+        the tolerance used.
+    """
+
+    shells = _source_shells(solid)
+    diagonal = float(np.linalg.norm(np.ptp(solid.vertices, axis=0)))
+
+    def report(result, deviation, tolerance):
+        return {'triangles': int(len(result.faces)), 'deviation': None if deviation is None else float(deviation),
+                'relative_deviation': None if deviation is None else float(deviation/diagonal),
+                'tolerance': tolerance}
+
+    if shells is None or (tolerance is None and triangles is None):
+        return solid, report(solid, None, None)
+
+    if triangles is None:
+        result, deviation = _retessellate(solid, shells, tolerance*diagonal)
+        return result, report(result, deviation, tolerance)
+
+    # The number of triangles decreases with the tolerance: bisect its logarithm
+    low, high = math.log(1.E-7), math.log(0.5)
+    best = None
+    for _ in range(40):
+        middle = 0.5*(low + high)
+        result, deviation = _retessellate(solid, shells, math.exp(middle)*diagonal)
+        if len(result.faces) > triangles:
+            low = middle
+        else:
+            high = middle
+            best = (result, deviation, math.exp(middle))
+            if len(result.faces) > 0.98*triangles:
+                break
+        if high - low < 1.E-3:
+            break
+
+    if best is None:
+        best = (result, deviation, math.exp(middle))
+
+    return best[0], report(*best)
+
+
+def save(file, entity):
+    """ Writes the arrays of a shell or solid to a NumPy .npz file"""
+
+    arrays = {}
+    for name in ('vertices', 'faces', 'rings', 'wall'):
+        if getattr(entity, name, None) is not None:
+            arrays[name] = getattr(entity, name)
+    if entity.edges:
+        arrays['edges'] = np.array(entity.edges)
+
+    with open(file, 'wb') as output_file:
+        np.savez(output_file, **arrays)
+
+
+def load(file):
+    """ Reads the arrays written by save"""
+
+    with np.load(file) as data:
+        arrays = {name: data[name] for name in data.files}
+    if 'edges' in arrays:
+        arrays['edges'] = list(arrays['edges'])
+
+    return arrays
+
+
+def triangle_moments(a, b, c, volume=True):
+    """ Area and moments of the triangles with corners a, b and c (n, 3).
+
+        Returns the area, the mass (enclosed volume or area), its first moment
+        and its second moment about the origin, which can be added over
+        chunks of triangles (see mass_properties).
+    """
+
+    area_vectors = np.cross(b - a, c - a)
+    areas = 0.5*np.linalg.norm(area_vectors, axis=1)
+    s = a + b + c
+
+    if volume:
+        w = np.einsum('ij,ij->i', a, np.cross(b, c))/6.
+        first, second = s/4., 20.
+    else:
+        w = areas
+        first, second = s/3., 12.
+
+    C = (np.einsum('i,ij,ik->jk', w, a, a) + np.einsum('i,ij,ik->jk', w, b, b) +
+         np.einsum('i,ij,ik->jk', w, c, c) + np.einsum('i,ij,ik->jk', w, s, s))/second
+
+    return areas.sum(), w.sum(), np.einsum('i,ij->j', w, first), C
+
+
+def central_inertia(mass, first, second):
+    """ Centroid and inertia tensor about the centroid from the moments"""
+
+    centroid = first/mass
+    C = second - mass*np.outer(centroid, centroid)
+
+    return centroid, np.trace(C)*np.eye(3) - C
+
+
+def mass_properties(vertices, faces, volume=True):
+    """ Area, volume, centroid and inertia tensor about the centroid.
+
+        Volume properties are obtained by decomposition in tetrahedra and
+        require a closed, outwards oriented surface. Otherwise the properties
+        of the surface itself are computed.
+    """
+
+    area, mass, first, second = triangle_moments(vertices[faces[:, 0]], vertices[faces[:, 1]],
+                                                 vertices[faces[:, 2]], volume)
+    centroid, inertia = central_inertia(mass, first, second)
+
+    return area, (mass if volume else 0.), centroid, inertia
+
+
+def polyline_length(points):
+    """ Length of a closed polyline"""
+
+    return np.linalg.norm(np.roll(points, -1, axis=0) - points, axis=1).sum()
+
+
+def _info(length, area, volume, centroid, inertia, principal):
+    """ Dictionary of properties in the format of Domain.save"""
+
+    info = {}
+    info['Length'] = float(length)
+    info['Area'] = float(area)
+    info['Volume'] = float(volume)
+    for i in range(3):
+        for j in range(3):
+            info[f'I{i + 1}{j + 1}'] = float(inertia[i][j])
+    info['Ix'], info['Iy'], info['Iz'] = [float(i) for i in principal]
+    info['CDG'] = [float(x) for x in centroid]
+
+    return info
+
+
+def circle_properties(center, normal, radius):
+    """ Closed-form properties of a circular section (disc)"""
+
+    n = _unit(normal)
+    area = math.pi*radius**2
+    inertia = 0.25*area*radius**2*(np.eye(3) + np.outer(n, n))
+    principal = 0.25*area*radius**2*np.array([2., 1., 1.])
+
+    return _info(2.*math.pi*radius, area, 0., center, inertia, principal)
+
+
+def properties(entity, volume=False):
+    """ Dictionary of properties of an entity in the format of Domain.save.
+
+        Circular sections use closed-form values.
+    """
+
+    if isinstance(entity, Section) and entity.circle() is not None:
+        return circle_properties(*entity.circle())
+
+    area, vol, centroid, inertia = mass_properties(entity.vertices, entity.faces, volume)
+    length = sum(polyline_length(edge) for edge in entity.edges)
+
+    return _info(length, area, vol, centroid, inertia, np.linalg.eigvalsh(inertia)[::-1])
+
+
+# Number of triangles handled at once by the streaming writers
+CHUNK_SIZE = 65536
+
+STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+
+def triangles(vertices, faces, chunk_size=CHUNK_SIZE):
+    """ Yields the triangles of a surface as arrays (chunk_size, 3, 3)"""
+
+    vertices = np.asarray(vertices)
+    for start in range(0, len(faces), chunk_size):
+        yield vertices[faces[start:start + chunk_size]]
+
+
+def read_stl_chunks(file, chunk_size=CHUNK_SIZE):
+    """ Yields the triangles of a binary STL file as arrays (chunk_size, 3, 3)"""
+
+    with open(file, 'rb') as input_file:
+        input_file.seek(80)
+        count = int(np.frombuffer(input_file.read(4), dtype='<u4')[0])
+        while count > 0:
+            chunk = np.fromfile(input_file, dtype=STL_DTYPE, count=min(count, chunk_size))
+            if len(chunk) == 0:
+                break
+            count -= len(chunk)
+            yield chunk['vertices'].astype(float)
+
+
+class STLWriter(object):
+    """ Writes a binary STL file incrementally.
+
+        Triangles are converted in a buffer of chunk_size records, so memory
+        does not depend on the number of triangles. The triangle count of the
+        header is written by close.
+
+    """
+
+    def __init__(self, file, header='STL Exported by AneuPy', chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.count = 0
+        self.buffer = np.zeros(chunk_size, dtype=STL_DTYPE)
+
+        self.output_file = open(file, 'wb')
+        self.output_file.write(header.encode('ascii')[:80].ljust(80, b'\0'))
+        self.output_file.write(np.uint32(0).tobytes())
+
+    def write(self, triangles):
+        """ Writes an array of triangles (n, 3, 3)"""
+
+        size = len(self.buffer)
+        for start in range(0, len(triangles), size):
+            chunk = triangles[start:start + size]
+            a, b, c = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+            normals = np.cross(b - a, c - a)
+            norms = np.linalg.norm(normals, axis=1)
+            normals /= np.where(norms > 0., norms, 1.)[:, None]
+
+            records = self.buffer[:len(chunk)]
+            records['normal'] = normals
+            records['vertices'] = chunk
+            self.output_file.write(records.tobytes())
+            self.count += len(chunk)
+
+    def close(self):
+        if self.output_file.closed:
+            return
+        self.output_file.seek(80)
+        self.output_file.write(np.uint32(self.count).tobytes())
+        self.output_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class VTKWriter(object):
+    """ Writes a legacy binary VTK PolyData file incrementally.
+
+        The points of each chunk of triangles are merged (exactly, in single
+        precision) and written once as they arrive, and the polygons index
+        them with a running offset across chunks. Only points shared by
+        triangles of different chunks are repeated. The polygons are kept in
+        a temporary file until close writes them after the points and fills
+        in the number of points reserved in the header, so memory does not
+        depend on the number of triangles.
+
+    """
+
+    def __init__(self, file, title='AneuPy surface', chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.count = 0
+        self.points = 0
+        self.chunk_size = chunk_size
+
+        self.output_file = open(file, 'wb')
+        self.output_file.write(f'# vtk DataFile Version 3.0\n{title[:255]}\nBINARY\nDATASET POLYDATA\n'.encode('ascii'))
+        self._points = self.output_file.tell()
+        self.output_file.write(self._points_line(0))
+        self.polygons = tempfile.TemporaryFile()
+
+    @staticmethod
+    def _points_line(n):
+        return f'POINTS {n:>12d} float\n'.encode('ascii')
+
+    def write(self, triangles):
+        """ Writes an array of triangles (n, 3, 3)"""
+
+        for start in range(0, len(triangles), self.chunk_size):
+            points = np.ascontiguousarray(triangles[start:start + self.chunk_size], dtype='>f4').reshape(-1, 3)
+            keys = points.view(np.dtype((np.void, points.dtype.itemsize*3))).ravel()
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            self.output_file.write(points[first].tobytes())
+
+            cells = np.empty((len(points)//3, 4), dtype='>i4')
+            cells[:, 0] = 3
+            cells[:, 1:] = (inverse.ravel() + self.points).reshape(-1, 3)
+            self.polygons.write(cells.tobytes())
+
+            self.points += len(first)
+            self.count += len(cells)
+
+    def close(self):
+        if self.output_file.closed:
+            return
+
+        n = self.count
+        self.output_file.write(f'\nPOLYGONS {n} {4*n}\n'.encode('ascii'))
+        self.polygons.seek(0)
+        shutil.copyfileobj(self.polygons, self.output_file)
+        self.polygons.close()
+        self.output_file.write(b'\n')
+
+        self.output_file.seek(self._points)
+        self.output_file.write(self._points_line(self.points))
+        self.output_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+WRITERS = {'stl': STLWriter, 'vtk': VTKWriter}
+
+
+def writer(file, chunk_size=CHUNK_SIZE, **kwargs):
+    """ Streaming writer for the format given by the extension of file"""
+
+    format = os.path.splitext(file)[1][1:].lower()
+    if format not in WRITERS:
+        raise ValueError(f"No streaming writer for {file}")
+
+    return WRITERS[format](file, chunk_size=chunk_size, **kwargs)
+
+
+def write_stl(file, vertices, faces, header='STL Exported by AneuPy', chunk_size=CHUNK_SIZE):
+    """ Writes a binary STL file"""
+
+    with STLWriter(file, header, chunk_size) as output:
+        for chunk in triangles(vertices, faces, chunk_size):
+            output.write(chunk)
+
+
+def write_vtk(file, vertices, faces, title='AneuPy surface', chunk_size=CHUNK_SIZE):
+    """ Writes a binary VTK PolyData file"""
+
+    with VTKWriter(file, title, chunk_size) as output:
+        for chunk in triangles(vertices, faces, chunk_size):
+            output.write(chunk)
@@ -0,0 +1,159 @@
+# =============================================================================
+#
+# Pipeline.py
+#
+# Python module to run multi-case workflows as a pipeline of stages connected
+# by bounded queues, so that building a case overlaps exporting the previous
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import time
+import queue
+import threading
+import traceback
+
+
+# Marks the end of the items of a queue
+_DONE = object()
+
+
+class Stage(object):
+    """ Step of a pipeline: function is called with the item produced by the
+        previous stage and returns the item passed to the next one. workers
+        threads run it, taking items from an input queue of queue_size
+        items."""
+
+    def __init__(self, name, function, workers=1, queue_size=1):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+
+        self.metrics = {'items': 0, 'failed': 0, 'busy': 0., 'idle': 0., 'blocked': 0.,
+                        'depth_max': 0, 'depth_sum': 0, 'depth_samples': 0}
+        self.lock = threading.Lock()
+
+    def record(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                if key == 'depth':
+                    self.metrics['depth_max'] = max(self.metrics['depth_max'], value)
+                    self.metrics['depth_sum'] += value
+                    self.metrics['depth_samples'] += 1
+                else:
+                    self.metrics[key] += value
+
+    def stats(self, elapsed):
+        """ Items processed, time busy, waiting for input (idle) and waiting
+            for room in the next queue (blocked), throughput and queue depth"""
+
+        metrics = self.metrics
+        samples = metrics['depth_samples']
+
+        return {'items': metrics['items'], 'failed': metrics['failed'], 'workers': self.workers,
+                'busy': metrics['busy'], 'idle': metrics['idle'], 'blocked': metrics['blocked'],
+                'throughput': metrics['items']/elapsed if elapsed else 0.,
+                'utilization': metrics['busy']/(elapsed*self.workers) if elapsed else 0.,
+                'queue_size': self.queue_size, 'queue_max': metrics['depth_max'],
+                'queue_mean': metrics['depth_sum']/float(samples) if samples else 0.}
+
+
+class Pipeline(object):
+    """ Stages run concurrently on a stream of items.
+
+        Each stage takes items from a bounded queue, so a fast stage (e.g.
+        building the geometry of the next case) runs ahead of a slow one
+        (e.g. exporting and saving the previous case) by at most the size of
+        the queue, and memory stays bounded. Items leave the pipeline in
+        completion order.
+
+        An item whose stage raises is not passed on and is reported as failed.
+        run returns the results of the last stage and the failures; stats()
+        the metrics of each stage.
+
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.elapsed = 0.
+
+    def _work(self, stage, source, target, results):
+        while True:
+            start = time.perf_counter()
+            item = source.get()
+            stage.record(idle=time.perf_counter() - start)
+
+            if item is _DONE:
+                # Let the other workers of the stage finish too
+                source.put(_DONE)
+                return
+
+            start = time.perf_counter()
+            try:
+                output = stage.function(item)
+            except Exception:
+                stage.record(busy=time.perf_counter() - start, failed=1)
+                results['failed'].append({'stage': stage.name, 'item': item, 'error': traceback.format_exc()})
+                continue
+            stage.record(busy=time.perf_counter() - start, items=1)
+
+            if target is None:
+                results['done'].append(output)
+                continue
+
+            start = time.perf_counter()
+            target.put(output)
+            stage.record(blocked=time.perf_counter() - start)
+
+    def run(self, items):
+        """ Runs the items through the stages and returns the dictionary of
+            results: done (outputs of the last stage) and failed (stage, item
+            and traceback of every failure)"""
+
+        queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        results = {'done': [], 'failed': []}
+
+        threads = []
+        for i, stage in enumerate(self.stages):
+            target = queues[i + 1] if i + 1 < len(self.stages) else None
+            workers = [threading.Thread(target=self._work, args=(stage, queues[i], target, results),
+                                        name=f'{stage.name}-{j}', daemon=True) for j in range(stage.workers)]
+            for worker in workers:
+                worker.start()
+            threads.append(workers)
+
+        # Sample the depth of every queue when an item enters the pipeline
+        def sample():
+            for stage, item_queue in zip(self.stages, queues):
+                stage.record(depth=item_queue.qsize())
+
+        start = time.perf_counter()
+        for item in items:
+            queues[0].put(item)
+            sample()
+        queues[0].put(_DONE)
+
+        # Close each stage after all its workers are done
+        for i, workers in enumerate(threads):
+            for worker in workers:
+                worker.join()
+                sample()
+            if i + 1 < len(queues):
+                queues[i + 1].put(_DONE)
+
+        self.elapsed = time.perf_counter() - start
+
+        return results
+
+    def stats(self):
+        """ Metrics of every stage (see Stage.stats) and the total time"""
+
+        stats = {stage.name: stage.stats(self.elapsed) for stage in self.stages}
+        stats['elapsed'] = self.elapsed
+
+        return stats
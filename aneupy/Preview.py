@@ -0,0 +1,130 @@
+# =============================================================================
+#
+# Preview.py
+#
+# Python module with semi-analytic properties of lofted vessels, computed from
+# the circles of their sections without building any geometry
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import math
+
+import numpy as np
+
+import Mesh
+
+
+# Gauss-Legendre rule on [0, 1] for the spans of the loft
+_NODES, _WEIGHTS = np.polynomial.legendre.leggauss(5)
+_NODES, _WEIGHTS = 0.5*(_NODES + 1.), 0.5*_WEIGHTS
+
+_BASIS = np.column_stack([np.ones_like(_NODES), _NODES, _NODES**2, _NODES**3]).dot(Mesh._CATMULL_ROM)
+_DERIVATIVE = np.column_stack([np.zeros_like(_NODES), np.ones_like(_NODES), 2.*_NODES,
+                               3.*_NODES**2]).dot(Mesh._CATMULL_ROM)
+
+
+def tube(centers, frames, radii, points=12, samples=16):
+    """ Properties of the closed surface lofted through N circles.
+
+        The surface is the one of the NumPy backend in the limit of infinite
+        resolution (see Mesh.loft_circles): Catmull-Rom spans between circles
+        given by centers (N, 3), frames (N, 3, 3) with the normal in the last
+        row and radii (N,), closed by the end discs. Around the loft every
+        point is C(t) + A(t) cos(phi) + B(t) sin(phi), so the volume is
+        integrated exactly in phi and the area with the trapezoidal rule,
+        which converges exponentially; along the spans, Gauss-Legendre
+        quadrature is exact for the volume. Over the sweep of
+        test/Validate_preview.py the area changes by less than 1.E-11
+        relative with 8 times more points. The errors measured by that
+        sweep are against the NumPy loft only: the OCC loft approximates
+        the circles with B-splines and has only been compared on one model
+        (0.6% in volume, 0.2% in area). The radius profile is sampled at
+        samples points per span for the diameter.
+
+        Many cases sharing the frames are evaluated at once with centers
+        (K, N, 3) and radii (K, N); the results are then arrays of K values.
+
+        Returns a dictionary with Volume, Area (including the end discs),
+        LateralArea, Length (of the spline through the centers), Diameter
+        (maximum) and the Radii at the sections.
+    """
+
+    centers = np.asarray(centers, dtype=float)
+    single = centers.ndim == 2
+    centers = centers.reshape((-1,) + centers.shape[-2:])
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), centers.shape[:2])
+    if centers.shape[1] < 2:
+        raise ValueError("At least two sections are needed to loft a shell")
+
+    # Origin at the first center, whose disc then adds nothing to the volume
+    centers = centers - centers[:, :1]
+    OX, OY = Mesh._transport(frames)
+
+    # Sections first: (N, K, 3 vectors, 3) -> spans (S, 4, K, 3, 3)
+    controls = Mesh._span_controls(np.stack([centers, radii[..., None]*OX, radii[..., None]*OY], axis=2).swapaxes(0, 1))
+    C, A, B = np.einsum('qk,skmid->imsqd', _BASIS, controls)
+    Ct, At, Bt = np.einsum('qk,skmid->imsqd', _DERIVATIVE, controls)
+
+    # P_t x P_phi = cos N1 + sin N2 + cos^2 N3 + sin^2 N4 + cos sin N5
+    N1, N2, N3 = np.cross(Ct, B), -np.cross(Ct, A), np.cross(At, B)
+    N4, N5 = -np.cross(Bt, A), np.cross(Bt, B) - np.cross(At, A)
+
+    # Means over phi of the flux of P (the odd terms vanish)
+    flux = 0.5*(np.einsum('msqd,msqd->msq', C, N3 + N4) + np.einsum('msqd,msqd->msq', A, N1) +
+                np.einsum('msqd,msqd->msq', B, N2))
+    outward = np.einsum('msqd,msqd->m', A, N1) + np.einsum('msqd,msqd->m', B, N2)
+
+    phi = 2.*math.pi*np.arange(points)/points
+    cos, sin = np.cos(phi), np.sin(phi)
+    trig = np.column_stack([cos, sin, cos**2, sin**2, cos*sin])
+    normal = np.einsum('jt,tmsqd->msqjd', trig, np.stack([N1, N2, N3, N4, N5]))
+    lateral_area = 2.*math.pi*(np.sqrt(np.einsum('msqjd,msqjd->msqj', normal, normal)).mean(axis=3)*_WEIGHTS).sum(axis=(1, 2))
+
+    # Divergence theorem; normals point outwards when they go away from the spline through the centers
+    end = Mesh._unit(np.asarray(frames, dtype=float)[-1][2])
+    end = end*np.sign(np.dot(centers[:, -1] - centers[:, -2], end))[:, None]
+    volume = np.sign(outward)*2.*math.pi*(flux*_WEIGHTS).sum(axis=(1, 2))/3. + \
+        np.einsum('md,md->m', centers[:, -1], end)*math.pi*radii[:, -1]**2/3.
+
+    length = (np.linalg.norm(Ct, axis=-1)*_WEIGHTS).sum(axis=(1, 2))
+
+    t = np.linspace(0., 1., samples + 1)
+    basis = np.column_stack([np.ones_like(t), t, t**2, t**3]).dot(Mesh._CATMULL_ROM)
+    diameter = 2.*np.einsum('tk,skm->mst', basis, Mesh._span_controls(radii.T)).max(axis=(1, 2))
+
+    result = {'Volume': volume, 'Area': lateral_area + math.pi*(radii[:, 0]**2 + radii[:, -1]**2),
+              'LateralArea': lateral_area, 'Length': length, 'Diameter': diameter, 'Radii': radii}
+    if single:
+        result = {key: value.tolist() if key == 'Radii' else float(value) for key, value in
+                  ((key, value[0]) for key, value in result.items())}
+
+    return result
+
+
+def wall(outer, inner):
+    """ Properties of the wall between two tubes sharing their end planes:
+        volume, area and minimum radial thickness at the sections"""
+
+    R, r = np.asarray(outer['Radii']), np.asarray(inner['Radii'])
+    annuli = math.pi*(R[..., 0]**2 - r[..., 0]**2 + R[..., -1]**2 - r[..., -1]**2)
+    thickness = (R - r).min(axis=-1)
+
+    return {'Volume': outer['Volume'] - inner['Volume'], 'Area': outer['LateralArea'] + inner['LateralArea'] + annuli,
+            'Thickness': float(thickness) if np.ndim(thickness) == 0 else thickness}
+
+
+def model(lumen, outer=None):
+    """ Preview of a vessel: properties of the lumen and, given the outer
+        surface, of the wall, with the sac diameter (largest diameter of the
+        outer surface, or of the lumen without wall)"""
+
+    result = {'lumen': lumen, 'sac_diameter': lumen['Diameter']}
+    if outer is not None:
+        result.update({'outer': outer, 'wall': wall(outer, lumen), 'sac_diameter': outer['Diameter']})
+
+    return result
@@ -0,0 +1,154 @@
+# =============================================================================
+#
+# Profiling.py
+#
+# Python module to profile the calls to the SALOME geometry builder
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import threading
+
+
+def _owner(frame, depth=6):
+    """ Name of the entity making a call, found in the locals of the callers:
+        the entity itself (self), the entity a backend works on or the name
+        of the entity being created or published"""
+
+    caller = frame.f_code.co_name
+    while frame is not None and depth > 0:
+        local = frame.f_locals
+        owner = local.get('self')
+        if owner is not None and type(owner).__name__ in ('Section', 'Shell', 'Solid'):
+            return owner.name
+
+        for key in ('solid', 'entity', 'shell', 'section'):
+            entity = local.get(key)
+            if hasattr(entity, 'name'):
+                return entity.name
+
+        name = local.get('name')
+        if isinstance(name, str):
+            return name
+
+        frame, depth = frame.f_back, depth - 1
+
+    return caller
+
+
+def _size(arg):
+    try:
+        return len(arg) if isinstance(arg, (list, tuple, dict, str)) else None
+    except TypeError:
+        return None
+
+
+class ProfiledBuilder(object):
+    """ Proxy of a geometry builder recording every call in a Profiler"""
+
+    def __init__(self, builder, profiler):
+        self._builder = builder
+        self._profiler = profiler
+        self._methods = {}
+
+    def __getattr__(self, name):
+        if name in self._methods:
+            return self._methods[name]
+
+        attribute = getattr(self._builder, name)
+        if not callable(attribute):
+            return attribute
+
+        profiler = self._profiler
+
+        def method(*args, **kwargs):
+            owner = _owner(sys._getframe(1))
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                profiler.record(name, owner, start, time.perf_counter(),
+                                [_size(arg) for arg in args] + [_size(value) for value in kwargs.values()])
+
+        self._methods[name] = method
+        return method
+
+
+class Profiler(object):
+    """ Records the calls to the geometry builder of a session.
+
+        Profiling is enabled with Domain(profile=True) (OCC backend), which
+        wraps the builder of the session; otherwise the builder is used
+        directly and nothing is recorded. Every call stores the operation,
+        the owning entity, its wall time and the sizes of the sequence
+        arguments (e.g. the number of sections of a filling).
+
+    """
+
+    def __init__(self):
+        self.events = []
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def wrap(self, builder):
+        return ProfiledBuilder(builder, self)
+
+    def record(self, operation, owner, start, end, sizes):
+        event = {'operation': operation, 'owner': owner, 'start': start - self.origin, 'time': end - start,
+                 'sizes': sizes, 'thread': threading.get_ident()}
+        with self.lock:
+            self.events.append(event)
+
+    def reset(self):
+        with self.lock:
+            self.events = []
+
+    def summary(self, key='operation'):
+        """ Calls, total, mean and maximum time per operation (or per owner),
+            sorted by total time"""
+
+        summary = {}
+        for event in self.events:
+            item = summary.setdefault(event[key], {'calls': 0, 'time': 0., 'max': 0.})
+            item['calls'] += 1
+            item['time'] += event['time']
+            item['max'] = max(item['max'], event['time'])
+
+        for item in summary.values():
+            item['mean'] = item['time']/item['calls']
+
+        return dict(sorted(summary.items(), key=lambda item: -item[1]['time']))
+
+    def trace(self):
+        """ Events in the Chrome trace event format (chrome://tracing, Perfetto)"""
+
+        threads = {}
+        events = []
+        for event in self.events:
+            events.append({'name': event['operation'], 'cat': 'GEOM', 'ph': 'X',
+                           'ts': 1.E6*event['start'], 'dur': 1.E6*event['time'], 'pid': os.getpid(),
+                           'tid': threads.setdefault(event['thread'], len(threads)),
+                           'args': {'owner': event['owner'], 'sizes': event['sizes']}})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, file):
+        """ Writes the Chrome trace of the events to file and the summaries
+            per operation and per owner next to it (trace.summary.json for
+            trace.json)"""
+
+        with open(file, 'w') as output_file:
+            json.dump(self.trace(), output_file)
+
+        with open(os.path.splitext(file)[0] + '.summary.json', 'w') as output_file:
+            json.dump({'operations': self.summary('operation'), 'owners': self.summary('owner'),
+                       'calls': len(self.events), 'time': sum(event['time'] for event in self.events)},
+                      output_file, indent=2)
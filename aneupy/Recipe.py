@@ -0,0 +1,169 @@
+# =============================================================================
+#
+# Recipe.py
+#
+# Python module to store the operations that build a domain as a versioned
+# recipe (JSON or NumPy .npz) and to replay them on any backend
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import json
+
+import numpy as np
+
+import Cache
+
+
+# Increase when the format of the recipes changes
+VERSION = 1
+
+FORMAT = 'aneupy-recipe'
+
+# Arrays with more values than this are stored as arrays of .npz recipes
+_ARRAY_SIZE = 16
+
+
+def _pack(obj, arrays=None):
+    """ obj with NumPy arrays converted to lists, or, if arrays is given, to
+        references to entries added to arrays"""
+
+    if isinstance(obj, dict):
+        return {key: _pack(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_pack(value, arrays) for value in obj]
+    if isinstance(obj, np.ndarray):
+        if arrays is not None and obj.size > _ARRAY_SIZE:
+            key = f'array{len(arrays)}'
+            arrays[key] = obj
+            return {'__array__': key}
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _unpack(obj, arrays):
+    if isinstance(obj, dict):
+        if set(obj) == {'__array__'}:
+            return arrays[obj['__array__']]
+        return {key: _unpack(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(value, arrays) for value in obj]
+    return obj
+
+
+def save(recipe, file):
+    """ Writes a recipe to a .json file or to a compressed .npz file, where
+        large arrays (e.g. the origins of add_sections) are stored in binary"""
+
+    if os.path.splitext(file)[1].lower() == '.npz':
+        arrays = {}
+        text = json.dumps(_pack(recipe, arrays), sort_keys=True)
+        with open(file, 'wb') as output_file:
+            np.savez_compressed(output_file, recipe=np.array(text), **arrays)
+    else:
+        with open(file, 'w') as output_file:
+            json.dump(_pack(recipe), output_file, indent=1, sort_keys=True)
+
+
+def load(file):
+    """ Reads a recipe written by save"""
+
+    if os.path.splitext(file)[1].lower() == '.npz':
+        with np.load(file, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files if key != 'recipe'}
+            recipe = _unpack(json.loads(str(data['recipe'])), arrays)
+    else:
+        with open(file, 'r') as input_file:
+            recipe = json.load(input_file)
+
+    if recipe.get('format') != FORMAT:
+        raise ValueError(f"{file} is not an AneuPy recipe")
+    if recipe.get('version', 0) > VERSION:
+        raise ValueError(f"Recipe version {recipe['version']} of {file} is newer than the supported {VERSION}")
+
+    return recipe
+
+
+def key(recipe):
+    """ Content hash of the operations of a recipe, independent of the
+        backend and of the file format"""
+
+    return Cache.key('recipe', _pack(recipe['operations']))
+
+
+def store(cache, recipe):
+    """ Stores a recipe in a Cache.GeometryCache under its key, so that the
+        model can be regenerated from the key alone. Returns the key."""
+
+    recipe_key = key(recipe)
+    cache.store(recipe_key, 'recipe.npz', lambda path: save(recipe, path), kind='recipes')
+
+    return recipe_key
+
+
+def fetch(cache, recipe_key):
+    """ Recipe stored in a cache with store, or None"""
+
+    return cache.fetch(recipe_key, 'recipe.npz', kind='recipes', read=load)
+
+
+def replay(recipe, d, output_dir=None, exports=True):
+    """ Replays the operations of a recipe on Domain d.
+
+        Exported files are written to their recorded paths or, given
+        output_dir, to files of the same name in it; exports=False skips
+        them. Returns d.
+    """
+
+    if isinstance(recipe, str):
+        recipe = load(recipe)
+
+    def path(file):
+        return file if output_dir is None else os.path.join(output_dir, os.path.basename(file))
+
+    for operation in recipe['operations']:
+        op = operation['op']
+
+        if op == 'add_section':
+            d.add_section(operation['name'], **operation['kwargs'])
+            edit(d.sections[operation['name']], operation['history'])
+        elif op == 'add_sections':
+            d.add_sections(operation['prefix'], operation['origins'], operation['radii'], frames=operation['frames'],
+                           shell=False, folder=operation['folder'])
+        elif op == 'edit_section':
+            edit(d.sections[operation['name']], operation['history'])
+        elif op == 'add_shell':
+            d.add_shell(operation['name'], operation['sections'], **operation['kwargs'])
+        elif op == 'add_solid_from_shell':
+            d.add_solid_from_shell(operation['name'], operation['shell'], **operation['kwargs'])
+        elif op == 'add_solid_from_cut':
+            d.add_solid_from_cut(operation['name'], operation['solids'], **operation['kwargs'])
+        elif op == 'add_solid_from_offset':
+            d.add_solid_from_offset(operation['name'], operation['shell'], operation['thickness'],
+                                    inner=operation.get('inner'), **operation['kwargs'])
+        elif op == 'export':
+            if exports:
+                d._export(operation['format'], operation['solid'], path(operation['file']), **operation['kwargs'])
+        elif op == 'write_meshes':
+            if exports:
+                d.write_meshes({path(file): names for file, names in operation['files'].items()},
+                               operation['chunk_size'], **operation['kwargs'])
+        else:
+            raise ValueError(f"Unknown operation {op} in the recipe")
+
+    return d
+
+
+def edit(section, history):
+    """ Applies the recorded operations of a section (add_circle,
+        add_circle2, rotateX, rotateY, rotateZ)"""
+
+    for entry in history:
+        getattr(section, entry[0])(*entry[1:])
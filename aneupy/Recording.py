@@ -0,0 +1,189 @@
+# =============================================================================
+#
+# Recording.py
+#
+# Python module with a recording stand-in of the SALOME GEOM kernel, used to
+# benchmark the Python side of AneuPy without SALOME
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import sys
+import time
+import types
+
+import numpy as np
+
+
+class Shape(object):
+    """ Placeholder of a GEOM object: the operation and arguments that made it"""
+
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+
+    def GetEntry(self):
+        return f'0:1:{id(self)}'
+
+
+class Recorder(object):
+    """ Counts and times the calls to the stand-in kernel.
+
+        costs optionally maps operation names to a simulated duration in
+        seconds, to model the kernel time of expensive operations.
+
+    """
+
+    def __init__(self, costs=None):
+        self.costs = dict(costs or {})
+        self.reset()
+
+    def reset(self):
+        self.calls = {}
+        self.time = {}
+
+    def record(self, name, start):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.time[name] = self.time.get(name, 0.) + time.perf_counter() - start
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def total_time(self):
+        return sum(self.time.values())
+
+    def snapshot(self):
+        """ Copy of the counters, to compute the calls of a stage"""
+
+        return dict(self.calls), dict(self.time)
+
+    def since(self, snapshot):
+        """ Calls and time since a snapshot"""
+
+        calls, times = snapshot
+        return ({name: count - calls.get(name, 0) for name, count in self.calls.items() if count > calls.get(name, 0)},
+                sum(self.time.values()) - sum(times.values()))
+
+
+def _coordinates(shape):
+    if isinstance(shape, Shape) and shape.op in ('MakeVertex', 'MakeVectorDXDYDZ') and len(shape.args) >= 3:
+        return tuple(float(x) for x in shape.args[:3])
+    return (0., 0., 0.)
+
+
+def _export(file, text):
+    with open(file, 'w') as output_file:
+        output_file.write(text)
+
+
+def _export_stl(file):
+    # Valid binary STL without triangles
+    with open(file, 'wb') as output_file:
+        output_file.write(b'STL Exported by the AneuPy recording kernel'.ljust(80, b'\0'))
+        output_file.write(np.uint32(0).tobytes())
+
+
+# Return values of the queries; other operations return a new Shape
+_RESULTS = {
+    'PointCoordinates': lambda *args: _coordinates(args[0]),
+    'VectorCoordinates': lambda *args: _coordinates(args[0]),
+    'BasicProperties': lambda *args: (0., 0., 0.),
+    'Inertia': lambda *args: (0.,)*12,
+    'BoundingBox': lambda *args: (0., 1., 0., 1., 0., 1.),
+    'GetPosition': lambda *args: (0., 0., 0., 0., 0., 1., 1., 0., 0.),
+    'ExportSTL': lambda *args: _export_stl(args[1]),
+    'ExportBREP': lambda *args: _export(args[1], 'BREP'),
+    'ImportBREP': lambda *args: Shape('ImportBREP', args),
+    'addToStudy': lambda *args: f'0:1:{id(args[0])}',
+    'addToStudyAuto': lambda *args: None,
+    'PutToFolder': lambda *args: None,
+}
+
+
+class Builder(object):
+    """ Stand-in of geomBuilder: every method is recorded and creates a Shape.
+        Published objects are added to the study."""
+
+    def __init__(self, recorder, study=None):
+        self._recorder = recorder
+        self._study = study
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        recorder, study = self._recorder, self._study
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            if name in recorder.costs:
+                time.sleep(recorder.costs[name])
+            if name in _RESULTS:
+                result = _RESULTS[name](*args)
+            elif name.startswith('Export'):
+                result = _export(args[1], name)
+            else:
+                result = Shape(name, args)
+            if name == 'addToStudy' and study is not None:
+                study.objects.append(args[1])
+            recorder.record(name, start)
+            return result
+
+        return call
+
+
+class Study(object):
+    """ Stand-in of the SALOME study: the names of the published objects,
+        written one per line by SaveAs"""
+
+    def __init__(self, recorder):
+        self._recorder = recorder
+        self.objects = []
+
+    def SaveAs(self, file, *args):
+        start = time.perf_counter()
+        _export(file, '\n'.join(['HDF'] + self.objects))
+        self._recorder.record('SaveAs', start)
+        return True
+
+    def Clear(self):
+        self.objects = []
+
+    def Init(self):
+        pass
+
+
+def install(recorder=None):
+    """ Installs the stand-in modules salome, salome.geom.geomBuilder, GEOM and
+        SALOMEDS and binds them in Geometry if it is already imported.
+        Returns the recorder.
+    """
+
+    recorder = recorder or Recorder()
+
+    salome = types.ModuleType('salome')
+    salome.myStudy = Study(recorder)
+    salome.salome_init = lambda *args, **kwargs: None
+    salome.sg = types.SimpleNamespace(updateObjBrowser=lambda *args: None)
+
+    geom = types.ModuleType('salome.geom')
+    geomBuilder = types.ModuleType('salome.geom.geomBuilder')
+    geomBuilder.New = lambda *args, **kwargs: Builder(recorder, salome.myStudy)
+    geom.geomBuilder = geomBuilder
+    salome.geom = geom
+
+    GEOM = types.ModuleType('GEOM')
+    GEOM.FOM_Default = 0
+    SALOMEDS = types.ModuleType('SALOMEDS')
+
+    sys.modules.update({'salome': salome, 'salome.geom': geom, 'salome.geom.geomBuilder': geomBuilder,
+                        'GEOM': GEOM, 'SALOMEDS': SALOMEDS})
+
+    if 'Geometry' in sys.modules:
+        Geometry = sys.modules['Geometry']
+        Geometry.salome, Geometry.GEOM, Geometry.geomBuilder, Geometry.SALOMEDS = salome, GEOM, geomBuilder, SALOMEDS
+
+    return recorder
@@ -0,0 +1,170 @@
+# =============================================================================
+#
+# Table.py
+#
+# Python module to store the properties of the entities of a domain as
+# columnar binary tables and to load the tables of a cohort at once
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+
+# Columns of the tables, in the order of the properties of Domain.save
+FIELDS = ('Length', 'Area', 'Volume',
+          'I11', 'I12', 'I13', 'I21', 'I22', 'I23', 'I31', 'I32', 'I33',
+          'Ix', 'Iy', 'Iz', 'CDG_X', 'CDG_Y', 'CDG_Z')
+
+ENTITY_TYPES = ('sections', 'shells', 'solids')
+
+EXTENSION = '.cad.npz'
+
+
+def table(info):
+    """ Columnar table of the properties of Domain.save.
+
+        info maps each entity type to the properties of its entities. The
+        table has the values (entities, FIELDS) as float64, the entity type
+        of every row as an index into ENTITY_TYPES and the entity names.
+        Missing properties are NaN.
+    """
+
+    types, names, rows = [], [], []
+    for entity_type, entities in info.items():
+        for name, properties in entities.items():
+            cdg = properties.get('CDG') or [np.nan]*3
+            row = [properties.get(field, np.nan) for field in FIELDS[:-3]] + list(cdg)
+            types.append(ENTITY_TYPES.index(entity_type))
+            names.append(name)
+            rows.append(row)
+
+    return {'values': np.array(rows, dtype=float).reshape(len(rows), len(FIELDS)),
+            'types': np.array(types, dtype=np.int8), 'names': np.array(names, dtype=str),
+            'fields': np.array(FIELDS)}
+
+
+def info(data):
+    """ Properties of Domain.save from a table, the inverse of table.
+        Missing (NaN) properties are left out."""
+
+    result = {}
+    for entity_type, name, row in zip(data['types'].tolist(), data['names'].tolist(), np.asarray(data['values']).tolist()):
+        properties = {field: value for field, value in zip(FIELDS[:-3], row) if value == value}
+        if all(value == value for value in row[-3:]):
+            properties['CDG'] = row[-3:]
+        result.setdefault(ENTITY_TYPES[entity_type], {})[name] = properties
+
+    return result
+
+
+def write(info, file):
+    """ Writes the table of the properties of Domain.save to an uncompressed
+        .npz file, whose values can be memory-mapped (see load)"""
+
+    with open(file, 'wb') as output_file:
+        np.savez(output_file, **table(info))
+
+
+def _memmap(file, member):
+    """ Member of an uncompressed .npz file mapped from disk, or None if the
+        member is compressed"""
+
+    with zipfile.ZipFile(file) as archive:
+        item = archive.getinfo(member + '.npy')
+    if item.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(file, 'rb') as input_file:
+        # Local file header: the data follows the name and extra fields
+        input_file.seek(item.header_offset)
+        header = input_file.read(30)
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        input_file.seek(item.header_offset + 30 + name_length + extra_length)
+
+        version = np.lib.format.read_magic(input_file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(input_file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(input_file)
+        offset = input_file.tell()
+
+    if not shape or not np.prod(shape):
+        return np.empty(shape, dtype=dtype)
+
+    return np.memmap(file, dtype=dtype, mode='r', offset=offset, shape=shape, order='F' if fortran_order else 'C')
+
+
+def load(file, mmap=True):
+    """ Table written by write. With mmap, the values are mapped from disk
+        instead of read."""
+
+    values = _memmap(file, 'values') if mmap else None
+    with np.load(file, allow_pickle=False) as data:
+        result = {key: data[key] for key in data.files if key != 'values' or values is None}
+    if values is not None:
+        result['values'] = values
+
+    return result
+
+
+def concatenate(files, out=None, cases=None):
+    """ Tables of many cases concatenated into one set of arrays.
+
+        Rows keep the order of files; case is the index of the case of every
+        row in cases (the names of the cases, by default the names of the
+        files). The values of every file are memory-mapped and copied once;
+        given out, they are written to that .npy file and mapped from it, so
+        the cohort does not need to fit in memory.
+    """
+
+    tables = [load(file) for file in files]
+    cases = [os.path.basename(file)[:-len(EXTENSION)] if file.endswith(EXTENSION) else file
+             for file in files] if cases is None else list(cases)
+
+    for file, item in zip(files, tables):
+        if tuple(item['fields']) != FIELDS:
+            raise ValueError(f"The columns of {file} do not match Table.FIELDS")
+
+    rows = sum(len(item['values']) for item in tables)
+    if out is None:
+        values = np.empty((rows, len(FIELDS)))
+    else:
+        values = np.lib.format.open_memmap(out, mode='w+', dtype=float, shape=(rows, len(FIELDS)))
+
+    start = 0
+    for item in tables:
+        values[start:start + len(item['values'])] = item['values']
+        start += len(item['values'])
+
+    if out is not None:
+        values.flush()
+        del values
+        values = np.load(out, mmap_mode='r')
+
+    return {'values': values,
+            'case': np.repeat(np.arange(len(tables), dtype=np.int32), [len(item['values']) for item in tables]),
+            'types': np.concatenate([item['types'] for item in tables]) if tables else np.empty(0, np.int8),
+            'names': np.concatenate([item['names'] for item in tables]) if tables else np.empty(0, str),
+            'cases': np.array(cases, dtype=str), 'fields': np.array(FIELDS)}
+
+
+def column(data, field, entity_type=None, name=None):
+    """ Values of a field, restricted to the rows of an entity type and/or
+        entity name (e.g. the Volume of 'aneurysm_fluid' in every case)"""
+
+    rows = np.ones(len(data['values']), dtype=bool)
+    if entity_type is not None:
+        rows &= data['types'] == ENTITY_TYPES.index(entity_type)
+    if name is not None:
+        rows &= data['names'] == name
+
+    return np.asarray(data['values'][rows, FIELDS.index(field)])
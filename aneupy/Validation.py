@@ -0,0 +1,195 @@
+# =============================================================================
+#
+# Validation.py
+#
+# Python module to check exported STL files against the CAD information
+# written by Domain.save, without SALOME
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+#!/usr/bin/env python3
+
+import os
+import re
+import json
+import glob
+import multiprocessing
+
+import numpy as np
+
+import Mesh
+import Table
+
+
+# Keys of the CAD information compared by default
+KEYS = ('Area', 'Volume', 'CDG', 'I11', 'I22', 'I33', 'I12', 'I13', 'I23')
+
+_VERTEX = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+
+def read_stl(file):
+    """ Triangles (n, 3, 3) of an STL file.
+
+        Binary files are memory-mapped and the returned array is a view of
+        the file, so nothing is read until it is used. ASCII files are parsed.
+    """
+
+    size = os.path.getsize(file)
+    if size >= 84:
+        with open(file, 'rb') as input_file:
+            input_file.seek(80)
+            count = int(np.frombuffer(input_file.read(4), dtype='<u4')[0])
+        if size == 84 + count*Mesh.STL_DTYPE.itemsize:
+            if count == 0:
+                return np.zeros((0, 3, 3), dtype='<f4')
+            return np.memmap(file, dtype=Mesh.STL_DTYPE, mode='r', offset=84, shape=(count,))['vertices']
+
+    with open(file, 'rb') as input_file:
+        text = input_file.read()
+    if not text.lstrip().startswith(b'solid'):
+        raise ValueError(f"{file} is not an STL file")
+
+    return np.array(_VERTEX.findall(text), dtype=float).reshape(-1, 3, 3)
+
+
+def metrics(triangles, chunk_size=Mesh.CHUNK_SIZE):
+    """ Area, enclosed volume, centroid, inertia tensor and bounding box of a
+        closed triangulated surface, in the format of the CAD information.
+
+        Triangles are processed in chunks of chunk_size in double precision,
+        relative to the first vertex to avoid cancellation far from the origin.
+    """
+
+    if len(triangles) == 0:
+        raise ValueError("The surface has no triangles")
+
+    reference = np.array(triangles[0, 0], dtype=float)
+    area, mass, first, second = 0., 0., np.zeros(3), np.zeros((3, 3))
+    low, high = np.full(3, np.inf), np.full(3, -np.inf)
+
+    for start in range(0, len(triangles), chunk_size):
+        chunk = np.asarray(triangles[start:start + chunk_size], dtype=float) - reference
+        moments = Mesh.triangle_moments(chunk[:, 0], chunk[:, 1], chunk[:, 2])
+        area += moments[0]
+        mass += moments[1]
+        first += moments[2]
+        second += moments[3]
+        low = np.minimum(low, chunk.min(axis=(0, 1)))
+        high = np.maximum(high, chunk.max(axis=(0, 1)))
+
+    centroid, inertia = Mesh.central_inertia(mass, first, second)
+
+    info = Mesh._info(0., area, mass, centroid + reference, inertia, np.linalg.eigvalsh(inertia)[::-1])
+    del info['Length']
+    info['Triangles'] = len(triangles)
+    info['BoundingBox'] = [(low + reference).tolist(), (high + reference).tolist()]
+
+    return info
+
+
+def load_cad(file):
+    """ CAD information written by Domain.save, from the .cad JSON file or the
+        columnar table (see Table)"""
+
+    if file.endswith(Table.EXTENSION):
+        return Table.info(Table.load(file, mmap=False))
+
+    with open(file, 'r') as input_file:
+        return json.load(input_file)
+
+
+def cad_files(directory):
+    """ Files with CAD information in a directory: .cad JSON files, or the
+        tables when a case was saved only as a table"""
+
+    return (sorted(glob.glob(os.path.join(directory, '*.cad'))) or
+            sorted(glob.glob(os.path.join(directory, '*' + Table.EXTENSION))))
+
+
+def compare(info, reference, tolerance=1.E-2, keys=KEYS):
+    """ Differences between two sets of properties.
+
+        Errors are relative: to the value for scalars, to the largest diagonal
+        component for inertia products and to the size of the bounding box
+        (or the cube root of the volume) for the centroid. Returns a
+        dictionary with value, reference, error and ok for every key, and an
+        overall 'ok'.
+    """
+
+    scale = {
+        'I': max(abs(reference.get(key, 0.)) for key in ('I11', 'I22', 'I33')) or 1.,
+        'CDG': np.linalg.norm(np.subtract(*info['BoundingBox'][::-1])) if 'BoundingBox' in info
+        else abs(reference.get('Volume', 1.))**(1./3.) or 1.,
+    }
+
+    result = {'ok': True}
+    for key in keys:
+        if key not in reference or key not in info:
+            continue
+
+        value, expected = info[key], reference[key]
+        if key == 'CDG':
+            error = float(np.linalg.norm(np.subtract(value, expected))/scale['CDG'])
+        elif key.startswith('I') and len(key) == 3 and key[1] != key[2]:
+            error = abs(value - expected)/scale['I']
+        else:
+            error = abs(value - expected)/(abs(expected) or 1.)
+
+        result[key] = {'value': value, 'reference': expected, 'error': error, 'ok': error <= tolerance}
+        result['ok'] = result['ok'] and error <= tolerance
+
+    return result
+
+
+def validate(stl_file, cad_file, solid=None, tolerance=1.E-2, keys=KEYS):
+    """ Compares the properties of an STL file with those of a solid in a .cad
+        file or table (see load_cad). The solid defaults to the name of the
+        STL file.
+    """
+
+    solid = solid or os.path.splitext(os.path.basename(stl_file))[0]
+    cad = load_cad(cad_file) if isinstance(cad_file, str) else cad_file
+
+    if solid not in cad.get('solids', {}):
+        return {'file': stl_file, 'solid': solid, 'ok': False, 'error': f"Solid {solid} not found in the CAD information"}
+
+    result = compare(metrics(read_stl(stl_file)), cad['solids'][solid], tolerance, keys)
+    result.update({'file': stl_file, 'solid': solid})
+
+    return result
+
+
+def _validate_case(args):
+    case_dir, tolerance, keys = args
+
+    files = cad_files(case_dir)
+    if not files:
+        return {'case': case_dir, 'ok': False, 'error': f"No .cad or {Table.EXTENSION} file", 'files': []}
+
+    cad = load_cad(files[0])
+    files = [validate(file, cad, tolerance=tolerance, keys=keys)
+             for file in sorted(glob.glob(os.path.join(case_dir, '*.stl')))]
+
+    return {'case': case_dir, 'ok': all(result['ok'] for result in files), 'files': files}
+
+
+def validate_cohort(directory, tolerance=1.E-2, keys=KEYS, processes=None):
+    """ Validates the STL files of every case directory of a cohort against
+        the .cad file of the case, or its table when the cohort was saved with
+        cad_format 'npz', with a pool of worker processes.
+
+        Returns the list of case results.
+    """
+
+    cases = sorted(set(os.path.dirname(file) for pattern in ('*.cad', '*' + Table.EXTENSION)
+                       for file in glob.glob(os.path.join(directory, '*', pattern))))
+    jobs = [(case, tolerance, keys) for case in cases]
+
+    if processes == 1:
+        return [_validate_case(job) for job in jobs]
+
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_validate_case, jobs, chunksize=max(1, len(jobs)//(4*(processes or os.cpu_count() or 1))))
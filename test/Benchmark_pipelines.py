@@ -0,0 +1,267 @@
+# =============================================================================
+#
+# Benchmark_pipelines.py
+#
+# Benchmark of the manual, automatic and patient-specific pipelines at
+# several section counts, with SALOME or with a recording stand-in kernel
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+
+# Access environment variables
+geometry_module_dir = os.environ.get('GEOMETRY_MODULE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aneupy'))
+geometry_data_dir = os.environ.get('GEOMETRY_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+parser = argparse.ArgumentParser(description="Benchmark the geometry generation pipelines")
+parser.add_argument('--pipelines', type=str, nargs='+', default=['manual', 'automatic', 'patient'],
+                    choices=['manual', 'automatic', 'patient'], help='Pipelines to run')
+parser.add_argument('--sections', type=int, nargs='+', default=[11, 41, 161], help='Section counts per shell')
+parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is kept')
+parser.add_argument('--backend', type=str, default='occ', choices=['occ', 'numpy'], help='Geometry backend')
+parser.add_argument('--publish', type=str, default='immediate', help='Study publication mode of the OCC backend')
+parser.add_argument('--validation', type=str, default='full', choices=['full', 'containment', 'none'],
+                    help='Validation level of the cuts')
+parser.add_argument('--nested', action='store_true', help='Build the walls of nested shells without Boolean operations')
+parser.add_argument('--salome', action='store_true', help='Use the SALOME kernel instead of the recording stand-in')
+parser.add_argument('--output', type=str, default='benchmark.json', help='JSON file to write the results')
+parser.add_argument('--compare', type=str, required=False, help='JSON file of a previous run to compare with')
+
+args = parser.parse_args()
+
+sys.path.append(geometry_module_dir)
+import Recording
+
+recorder = None if args.salome else Recording.install()
+
+import Geometry
+import Idealized
+
+STAGES = ('sections', 'shells', 'solids', 'export', 'save')
+
+
+class Stages(object):
+    """ Times the stages of a run and the kernel calls made in each one"""
+
+    def __init__(self):
+        self.stages = {}
+        self.cuts = {}
+
+    def run(self, stage, function, *args):
+        snapshot = recorder.snapshot() if recorder else None
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+
+        info = {'time': elapsed}
+        if recorder:
+            calls, kernel_time = recorder.since(snapshot)
+            info.update({'calls': calls, 'total_calls': sum(calls.values()), 'kernel_time': kernel_time,
+                         'overhead': elapsed - kernel_time})
+        self.stages[stage] = info
+
+
+def export(d, output_dir, solids, formats):
+    for f_type in formats:
+        for solid in solids:
+            getattr(d, f'export_{f_type}')(solid=solid, file=os.path.join(output_dir, f'{solid}.{f_type}'))
+
+
+def formats():
+    return ['stl'] if args.backend == 'numpy' else ['iges', 'stl', 'step']
+
+
+def manual(n, output_dir):
+    """ Idealized_manual.py with n sections per shell"""
+
+    z = [0., 10., 20., 30., 50., 70., 80., 90., 100.]
+    layers = {'a': ('aneurysm_outer', [5., 5., 5., 7., 12.5, 7., 5., 5., 5.]),
+              'b': ('aneurysm_inner', [4.5, 4.5, 4.5, 6.7, 10.3, 6.7, 4.5, 4.5, 4.5])}
+    stations = np.linspace(0., 100., n)
+
+    d = Geometry.Domain(backend=args.backend, **backend_options())
+    stages = Stages()
+
+    def sections():
+        for prefix, (_, radii) in layers.items():
+            for i, (zi, ri) in enumerate(zip(stations, np.interp(stations, z, radii))):
+                d.add_section(name=f'{prefix}{i}', origin=[0., 0., float(zi)])
+                d.sections[f'{prefix}{i}'].add_circle(radius=float(ri))
+
+    def shells():
+        for prefix, (name, _) in layers.items():
+            d.add_shell(name=name, sections=[f'{prefix}{i}' for i in range(n)],
+                        minBSplineDegree=10, maxBSplineDegree=20, approximation=True)
+
+    def solids():
+        d.add_solid_from_shell(name='aneurysm_outer', shell='aneurysm_outer')
+        d.add_solid_from_shell(name='aneurysm_fluid', shell='aneurysm_inner')
+        d.add_solid_from_cut(name='aneurysm_solid', solids=['aneurysm_outer', 'aneurysm_fluid'], **cut_options())
+
+    stages.run('sections', sections)
+    stages.run('shells', shells)
+    stages.run('solids', solids)
+    stages.cuts = d.cut_stats()
+    stages.run('export', export, d, output_dir, ['aneurysm_solid', 'aneurysm_fluid'], formats())
+    stages.run('save', d.save, os.path.join(output_dir, 'idealized_manual_study.hdf'))
+
+    return stages
+
+
+def automatic(n, output_dir):
+    """ Idealized_automatic.py (Idealized.build) with n sections per layer"""
+
+    params = Idealized.parameters()
+    names, origins = Idealized.stations(params['length'], params['x_shift'], params['y_shift'], n)
+
+    d = Geometry.Domain(backend=args.backend, **backend_options())
+    stages = Stages()
+
+    def sections():
+        for layer in Idealized.LAYERS:
+            for suffix, origin, radius in zip(names, origins, Idealized.layer_radii(params, layer, n)):
+                d.add_section(name=f'{layer}{suffix}', origin=origin)
+                d.sections[f'{layer}{suffix}'].add_circle(radius=radius)
+
+    def shells():
+        for layer in Idealized.LAYERS:
+            d.add_shell(name=Idealized.SHELLS[layer], sections=[f'{layer}{suffix}' for suffix in names],
+                        minBSplineDegree=10, maxBSplineDegree=20, approximation=True)
+
+    def solids():
+        d.add_solid_from_shell(name='intima_outer', shell='intima_outer')
+        d.add_solid_from_shell(name='aneurysm_fluid', shell='aneurysm_inner')
+        d.add_solid_from_cut(name='aneurysm_intima_ILT', solids=['intima_outer', 'aneurysm_fluid'], **cut_options())
+        d.add_solid_from_shell(name='media_outer', shell='media_outer')
+        d.add_solid_from_cut(name='media_solid', solids=['media_outer', 'intima_outer'], **cut_options())
+        d.add_solid_from_shell(name='adventitia_outer', shell='adventitia_outer')
+        d.add_solid_from_cut(name='adventitia_solid', solids=['adventitia_outer', 'media_outer'], **cut_options())
+
+    stages.run('sections', sections)
+    stages.run('shells', shells)
+    stages.run('solids', solids)
+    stages.cuts = d.cut_stats()
+    stages.run('export', export, d, output_dir, Idealized.SOLIDS, formats())
+    stages.run('save', d.save, os.path.join(output_dir, 'idealized_automatic_study.hdf'))
+
+    return stages
+
+
+def patient(n, output_dir):
+    """ Patient_specific.py with tangent normals and n sections per shell"""
+
+    centerline = np.loadtxt(os.path.join(geometry_data_dir, 'centerline1.txt'), delimiter=',')
+    s = np.concatenate([[0.], np.cumsum(np.linalg.norm(np.diff(centerline, axis=0), axis=1))])
+    t = np.linspace(0., s[-1], n)
+    points = np.column_stack([np.interp(t, s, centerline[:, k]) for k in range(3)])
+    tangents = np.gradient(points, axis=0)
+    tangents /= np.linalg.norm(tangents, axis=1)[:, None]
+
+    def radii(file):
+        data = np.loadtxt(os.path.join(geometry_data_dir, file), delimiter=',')
+        return np.sqrt(np.maximum(np.interp(t, data[:, 0]/data[:, 0].max()*s[-1], data[:, 1]), 0.)/np.pi)
+
+    layers = {'aneurysm_outer': radii('Wall_Area.txt'), 'ILT': radii('Lumen_Area.txt')}
+
+    d = Geometry.Domain(backend=args.backend, **backend_options())
+    stages = Stages()
+
+    def sections():
+        for prefix, radius in layers.items():
+            for i in range(n):
+                d.add_section(name=f'{prefix}{i}', origin=points[i].tolist())
+                d.sections[f'{prefix}{i}'].add_circle2(circle_center=points[i].tolist(), normal=tangents[i].tolist(),
+                                                       radius=float(radius[i]))
+
+    def shells():
+        for prefix in layers:
+            d.add_shell(name=f'{prefix}_shell', sections=[f'{prefix}{i}' for i in range(n)],
+                        minBSplineDegree=10, maxBSplineDegree=20, approximation=True)
+
+    def solids():
+        d.add_solid_from_shell(name='aneurysm_outer', shell='aneurysm_outer_shell')
+        d.add_solid_from_shell(name='Lumen', shell='ILT_shell')
+        d.add_solid_from_cut(name='ILT', solids=['aneurysm_outer', 'Lumen'], **cut_options())
+
+    stages.run('sections', sections)
+    stages.run('shells', shells)
+    stages.run('solids', solids)
+    stages.cuts = d.cut_stats()
+    stages.run('export', export, d, output_dir, ['ILT', 'Lumen'], formats())
+    stages.run('save', d.save, os.path.join(output_dir, 'Patient_specific_study.hdf'))
+
+    return stages
+
+
+def cut_options():
+    return {'validation': args.validation, 'nested': args.nested}
+
+
+def backend_options():
+    return {'publish': args.publish} if args.backend == 'occ' else {}
+
+
+PIPELINES = {'manual': manual, 'automatic': automatic, 'patient': patient}
+
+results = []
+output_dir = tempfile.mkdtemp(prefix='aneupy_benchmark_')
+try:
+    for pipeline in args.pipelines:
+        for n in args.sections:
+            runs = []
+            for _ in range(args.repeat):
+                runs.append(PIPELINES[pipeline](n, output_dir))
+            run = min(runs, key=lambda run: sum(stage['time'] for stage in run.stages.values()))
+            best = run.stages
+            total = sum(stage['time'] for stage in best.values())
+            results.append({'pipeline': pipeline, 'sections': n, 'time': total, 'stages': best,
+                            'cuts': {'validation': run.cuts['validation'], 'method': run.cuts['method']}})
+
+            line = ', '.join(f"{stage} {1000*best[stage]['time']:.1f}" for stage in STAGES)
+            print(f"{pipeline:>9} {n:>5} sections: {1000*total:9.1f} ms ({line})")
+finally:
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+benchmark = {
+    'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    'python': platform.python_version(),
+    'machine': platform.machine(),
+    'kernel': 'salome' if args.salome else 'recording',
+    'backend': args.backend,
+    'publish': args.publish,
+    'validation': args.validation,
+    'nested': args.nested,
+    'repeat': args.repeat,
+    'results': results,
+}
+
+with open(args.output, 'w') as output_file:
+    json.dump(benchmark, output_file, indent=2, sort_keys=True)
+print(f"Results written to {args.output}")
+
+if args.compare:
+    with open(args.compare, 'r') as input_file:
+        previous = {(result['pipeline'], result['sections']): result for result in json.load(input_file)['results']}
+
+    for result in results:
+        old = previous.get((result['pipeline'], result['sections']))
+        if old is None:
+            continue
+        ratios = ', '.join(f"{stage} {result['stages'][stage]['time']/old['stages'][stage]['time']:.2f}x"
+                           for stage in STAGES if old['stages'].get(stage, {}).get('time'))
+        print(f"{result['pipeline']:>9} {result['sections']:>5} sections: {result['time']/old['time']:.2f}x ({ratios})")
@@ -0,0 +1,103 @@
+# =============================================================================
+#
+# Benchmark_sections.py
+#
+# Micro-benchmark of the creation time of sections in SALOME
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import types
+import argparse
+import subprocess
+
+import numpy as np
+
+# Access environment variables
+geometry_module_dir = os.environ.get('GEOMETRY_MODULE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aneupy'))
+
+parser = argparse.ArgumentParser(description="Time the creation of sections against the Section of a baseline revision")
+parser.add_argument('--sections', type=int, default=100, help='Number of sections created in each run')
+parser.add_argument('--publish', type=str, default='immediate', choices=['immediate', 'deferred', 'none'],
+                    help='Study publication mode')
+parser.add_argument('--baseline', type=str, required=False,
+                    help='Git revision of the baseline Geometry.py (the first commit by default)')
+parser.add_argument('--repeat', type=int, default=5, help='Runs of each benchmark; the fastest one is reported')
+parser.add_argument('--salome', action='store_true', help='Use the SALOME kernel instead of the recording stand-in')
+args = parser.parse_args()
+
+# Add the directory to the Python path
+sys.path.append(geometry_module_dir)
+import Recording
+
+recorder = None if args.salome else Recording.install()
+
+import Geometry
+aneupy = Geometry
+
+
+def load_baseline(revision=None):
+    """Geometry module of a git revision of the repository, loaded under another name"""
+    def git(*command):
+        return subprocess.check_output(['git'] + list(command), cwd=geometry_module_dir, text=True)
+
+    revision = revision or git('rev-list', '--max-parents=0', 'HEAD').split()[0]
+    root = git('rev-parse', '--show-toplevel').strip()
+    path = os.path.relpath(os.path.join(geometry_module_dir, 'Geometry.py'), root).replace(os.sep, '/')
+
+    baseline = types.ModuleType('Geometry_baseline')
+    exec(compile(git('show', f'{revision}:{path}'), f'{revision}:{path}', 'exec'), baseline.__dict__)
+    return revision, baseline
+
+
+def run(create, n, calls=None):
+    """Time and kernel calls per section of create(i) for i in range(calls), by default n calls of one section.
+    The time is the fastest of args.repeat runs"""
+    elapsed = []
+    for _ in range(args.repeat):
+        if recorder is not None:
+            recorder.reset()
+        start = time.time()
+        for i in range(n if calls is None else calls):
+            create(i)
+        elapsed.append((time.time() - start)/n)
+    return min(elapsed), recorder.total_calls()/n if recorder is not None else None
+
+
+def create_baseline(i):
+    # Section of the baseline: one geometry builder per entity, LCS queried from GEOM
+    section = baseline.Section(f'baseline_{i}', origin=[0., 0., float(i)])
+    section.add_circle(radius=5.)
+
+
+def create_shared(i):
+    section = aneupy.Section(f'benchmark_{i}', origin=[0., 0., float(i)], session=session)
+    section.add_circle(radius=5.)
+
+
+revision, baseline = load_baseline(args.baseline)
+session = aneupy.Session(publish=args.publish)
+
+results = {'Baseline Section (' + revision[:7] + ')': run(create_baseline, args.sections),
+           'Section, shared session': run(create_shared, args.sections)}
+
+# The whole family at once
+d = aneupy.Domain(publish=args.publish)
+origins = np.array([[0., 0., float(i)] for i in range(args.sections)])
+results['Domain.add_sections'] = run(lambda i: d.add_sections('family', origins, 5., shell=False), args.sections, 1)
+
+print(f"Sections created: {args.sections} ({'SALOME' if args.salome else 'recording kernel'}, publish={args.publish})")
+before = results['Baseline Section (' + revision[:7] + ')'][0]
+for label, (elapsed, calls) in results.items():
+    calls = '' if calls is None else f", {calls:.1f} kernel calls/section"
+    print(f"{label + ':':35s} {1000*elapsed:.3f} ms/section{calls}, speed-up {before/elapsed:.2f}x")
+if recorder is not None:
+    print("The recording kernel does not model the cost of the GEOM calls: compare kernel calls, or run with --salome")
@@ -0,0 +1,67 @@
+# =============================================================================
+#
+# Idealized_cohort.py
+#
+# Python module to generate cohorts of idealized AAA geometries in parallel
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+
+#!/usr/bin/env python3
+
+import os
+import sys
+import argparse
+
+# Access environment variables
+geometry_module_dir = os.environ.get('GEOMETRY_MODULE_DIR', '../default/path/to/module')
+geometry_output_dir = os.environ.get('GEOMETRY_OUTPUT_DIR', '/default/path/to/output')
+
+print(f"Module Directory: {geometry_module_dir}")
+print(f"Output Directory: {geometry_output_dir}")
+
+# Add the directory to the Python path
+sys.path.append(geometry_module_dir)
+import Cohort
+
+parser = argparse.ArgumentParser(description="Create a cohort of aneurysm models")
+parser.add_argument('--cases', type=str, required=True, help='CSV/JSON file with a list of cases or a JSON parameter grid')
+parser.add_argument('--processes', type=int, required=False, help='Number of worker processes (default: number of CPUs)')
+parser.add_argument('--backend', type=str, default='occ', choices=['occ', 'numpy'], help='Geometry backend')
+parser.add_argument('--formats', type=str, nargs='+', required=False,
+                    help='Export formats (default: those of iges, stl and step the backend supports)')
+parser.add_argument('--retries', type=int, default=1, help='Number of retries of a failed case')
+parser.add_argument('--no_save', action='store_true', help='Do not save the study and the CAD information')
+parser.add_argument('--cache', type=str, required=False, help='Directory of a geometry cache shared by the workers')
+parser.add_argument('--no_study', action='store_true', help='Do not save the SALOME study, only the CAD information')
+parser.add_argument('--cad_format', type=str, default='json', choices=['json', 'npz', 'both'],
+                    help='Format of the CAD information: indented JSON and/or a columnar NumPy table')
+parser.add_argument('--release_intermediates', action='store_true',
+                    help='Release the geometry of sections and shells once their solids are built')
+parser.add_argument('--pipeline', action='store_true',
+                    help='Run the cases in one process, building each case while the previous ones are exported and saved')
+parser.add_argument('--queue_size', type=int, default=2, help='Number of cases waiting between pipeline stages')
+parser.add_argument('--redo', action='store_true', help='Rebuild cases already done in the output directory')
+
+args = parser.parse_args()
+
+cases = Cohort.load_cases(args.cases)
+print(f"Generating {len(cases)} cases")
+
+options = dict(backend=args.backend, formats=args.formats, save=not args.no_save, cache=args.cache,
+               cad_format=args.cad_format, release_intermediates=args.release_intermediates, study=not args.no_study)
+
+if args.pipeline:
+    results = Cohort.run_pipeline(cases, geometry_output_dir, skip_done=not args.redo, queue_size=args.queue_size,
+                                  **options)
+else:
+    results = Cohort.run_cohort(cases, geometry_output_dir, processes=args.processes, skip_done=not args.redo,
+                                retries=args.retries, **options)
+
+failed = [result['case'] for result in results if result['status'] != 'done']
+if failed:
+    print(f"Failed cases: {', '.join(failed)}")
+print(f"Cohort completed: {len(results) - len(failed)} cases generated in {geometry_output_dir}")
@@ -13,13 +13,8 @@
 #!/usr/bin/env python3
 
 import os
-import numpy as np
-import scipy.interpolate
 import sys
 from salome.geom import geomBuilder
-import math
-from scipy.interpolate import interp1d
-import copy
 import argparse
 
 # Access environment variables
@@ -37,6 +32,9 @@ parser.add_argument('--centerline_file', type=str, help='Path to the centerline
 parser.add_argument('--wall_area_file', type=str, help='Path to the wall area file')
 parser.add_argument('--lumen_area_file', type=str, help='Path to the lumen area file')
 parser.add_argument('--use_tangent_normal', action='store_true', help='Use tangent normal (specify this flag to use tangent normal, otherwise upward normal in Z-direction is used)')
+parser.add_argument('--interpolation', type=str, default='linear', choices=['linear', 'pchip'], help='Interpolation of the radius profiles (linear or monotone cubic)')
+parser.add_argument('--smoothing', type=float, default=0., help='Standard deviation, in samples, of the Gaussian smoothing of the radius profiles')
+parser.add_argument('--min_radius', type=float, default=0., help='Minimum radius of the sections')
 
 # Parse the arguments
 args = parser.parse_args()
@@ -46,11 +44,15 @@ centerline_file = args.centerline_file
 wall_area_file = args.wall_area_file
 lumen_area_file = args.lumen_area_file
 use_tangent_normal = args.use_tangent_normal
+interpolation = args.interpolation
+smoothing = args.smoothing
+min_radius = args.min_radius
 
 print(f"Using Centerline File: {centerline_file}")
 print(f"Using Wall Area File: {wall_area_file}")
 print(f"Using Lumen Area File: {lumen_area_file}")
 print(f"Using Tangent Normal: {use_tangent_normal}")
+print(f"Using Radius Interpolation: {interpolation} (smoothing {smoothing}, minimum radius {min_radius})")
 
 # Add the directory to the Python path
 sys.path.append(geometry_module_dir)
@@ -58,135 +60,53 @@ sys.path.append(geometry_data_dir)
 
 # Import the Geometry module
 import Geometry
+import Centerline
 aneupy = Geometry
 geompy = geomBuilder.New()
 
 import salome
 salome.salome_init()
 
-def process_centerline_xyz_data(filepath, num_points=1):
-    # Load the data from the file
-    def load_data(filepath):
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"The file {filepath} does not exist. Please check the path.")
-        data = np.loadtxt(filepath, delimiter=',')
-        return data
-    # Perform spline interpolation and generate additional points
-    def interpolate_points(data, num_points):
-        X, Y, Z = data[:,0], data[:,1], data[:,2]
-        t = np.linspace(0, 1, len(X))
-        t_new = np.linspace(0, 1, num_points * (len(X) - 1) + 1)
-        spl_x = scipy.interpolate.CubicSpline(t, X)
-        spl_y = scipy.interpolate.CubicSpline(t, Y)
-        spl_z = scipy.interpolate.CubicSpline(t, Z)
-        X_new = spl_x(t_new)
-        Y_new = spl_y(t_new)
-        Z_new = spl_z(t_new)
-        return np.column_stack((X_new, Y_new, Z_new))
-    
-    # Load data
-    data = load_data(filepath)
-    interpolated_data = interpolate_points(data, num_points)
-
-    # Save the interpolated data
-    np.savetxt(f'{geometry_data_dir}/interpolated_centerline.txt', interpolated_data, delimiter=',', fmt='%f')
-
-    # Load and create vertex objects
-    points = []
-    with open(f'{geometry_data_dir}/interpolated_centerline.txt', 'r') as file:
-        for line in file:
-            x, y, z = map(float, line.strip().split(','))
-            vertex = geompy.MakeVertex(x, y, z)
-            points.append(vertex)
-
-    # Optionally print the points
-    #for point in points:
-        #print(point)
-    # Create an interpolated spline as AAA centerline
+def create_centerline_spline(centerline):
+    # Create an interpolated spline as AAA centerline through the samples of the centerline
+    points = [geompy.MakeVertex(*point) for point in centerline.points.tolist()]
     spline = geompy.MakeInterpol(points)
     geompy.addToStudy(spline, "InterpolatedSpline")
-    
-    # Compute tangent vectors if needed
-    tangents = []
-    coords = [geompy.PointCoordinates(pt) for pt in points]
-    for i in range(len(coords)):
-        if i == 0:
-            tangent = [coords[1][j] - coords[0][j] for j in range(3)]
-        elif i == len(coords) - 1:
-            tangent = [coords[-1][j] - coords[-2][j] for j in range(3)]
-        else:
-            tangent = [(coords[i + 1][j] - coords[i - 1][j]) / 2.0 for j in range(3)]
-        magnitude = math.sqrt(sum(ti**2 for ti in tangent))
-        normalized_tangent = [t / magnitude for t in tangent]
-        tangents.append(normalized_tangent)
 
     # Calculate the length of the spline
     length = geompy.BasicProperties(spline)[0]  # BasicProperties returns a tuple (Length, Area, Volume)
     print(f"The length of the spline is: {length} units")
 
-    return spline, points, tangents, length  # Return the spline, points, and tangents for further use
+    return spline, length
 
 
-def create_geometry_from_area(d,file_path, shell_name, points, L_model,prefix):
-    # Load and preprocess data
-    def load_and_preprocess_data(file_path, L_model):
-        data = np.loadtxt(file_path, delimiter=',')
-        Area_data = data[:, 1]  # Assuming second column is area in mm^2
-        R_data = np.sqrt(Area_data / np.pi)
+def create_geometry_from_area(d,file_path, shell_name, centerline, prefix):
+    # Load the area profile (once per file) and evaluate the radii of all the
+    # sections at once, by their normalized arc length along the centerline
+    profile = Centerline.load_profile(file_path)
+    radii = profile.radii_along(centerline, method=interpolation, smoothing=smoothing, min_radius=min_radius)
 
-        Z_data = data[:, 0]
-        Z_normalized = Z_data / Z_data.max() * L_model
+    # Add the whole family of sections in one call, with their circles in the
+    # planes normal to the tangents or in horizontal planes. The frames along
+    # the tangents minimize the rotation, so neighbouring sections do not twist
+    frames = centerline.frames() if use_tangent_normal else None
+    section_names = d.add_sections(prefix, origins=centerline.points, radii=radii, frames=frames, shell=False)
+    print(f"Created {len(section_names)} sections {section_names[0]} to {section_names[-1]}")
 
-        interp_func = interp1d(Z_normalized, R_data, kind='linear', fill_value="extrapolate")
-
-        def positive_radius(z):
-            return max(0, interp_func(z))
-        
-        return positive_radius
-
-    radius_function = load_and_preprocess_data(file_path, L_model)
-
-    # Add sections and circles
-    section_names = []
-    total_sections = len(points)
-    prefix = f"{prefix}"
-
-    for i, point in enumerate(points):
-        section_name = f'{prefix}{i}'
-        coords = geompy.PointCoordinates(point)
-        d.add_section(name=section_name, origin=coords)
-        print(f"Created Section {section_name} at {coords}")
-
-    # Ensure points are assigned to each relevant section
-    for i in range(total_sections):
-        name = f'{prefix}{i}'
-        coords = geompy.PointCoordinates(points[i])
-        z_position = coords[2]
-        interpolated_radius = radius_function(z_position)  # Ensure radius_function is defined and accessible
-        if use_tangent_normal:
-            normal = tangents[i]  # Use the tangent normal
-        else:
-            normal = [0, 0, 1]  # Use the standard upward normal
-
-        circle_center = points[i]
-
-        if name in d.sections:
-            d.sections[name].add_circle2(circle_center=circle_center, normal=normal, radius=float(interpolated_radius))
-            print(f"Adding Circle '{section_name}' at Z={z_position} with radius={interpolated_radius}")
-
-    section_names = [f'{prefix}{i}' for i in range(total_sections)]
-    d.add_shell(name=f'{prefix}_shell',sections=section_names,minBSplineDegree=10,maxBSplineDegree=20,approximation=True)
+    d.add_shell(name=shell_name,sections=section_names,minBSplineDegree=10,maxBSplineDegree=20,approximation=True)
 
 d = aneupy.Domain()
 
+# The centerline is parsed and fitted once and shared by both layers
+centerline = Centerline.load(centerline_file, 1)
+spline, length = create_centerline_spline(centerline)
+
 # Process the first set of geometry data
-spline, points, tangents, length = process_centerline_xyz_data(centerline_file, 1)
-geometry_data1 = create_geometry_from_area(d, wall_area_file, 'aneurysm_outer_shell', points, length, prefix='aneurysm_outer')
+geometry_data1 = create_geometry_from_area(d, wall_area_file, 'aneurysm_outer_shell', centerline, prefix='aneurysm_outer')
 d.add_solid_from_shell(name='aneurysm_outer', shell='aneurysm_outer_shell')
 
 # Process the second set of geometry data
-spline2, points2, tangents2, length2 = process_centerline_xyz_data(centerline_file, 1)
-geometry_data2 = create_geometry_from_area(d, lumen_area_file, 'ILT_shell', points2, length2, prefix='ILT')
+geometry_data2 = create_geometry_from_area(d, lumen_area_file, 'ILT_shell', centerline, prefix='ILT')
 d.add_solid_from_shell(name='Lumen', shell='ILT_shell')
 
 # Cut solids (Boolean operation to substract solids)
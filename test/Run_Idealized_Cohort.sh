@@ -0,0 +1,25 @@
+#!/bin/bash
+
+# Set the SALOME installation directory
+export SALOME_ROOT_DIR=$HOME/Desktop/SALOME-9.11.0
+
+# Add SALOME binaries to the PATH
+export PATH=$SALOME_ROOT_DIR/BINARIES-CO7/KERNEL/bin:$PATH
+
+# Set the PYTHONPATH to include SALOME Python modules
+export PYTHONPATH=$SALOME_ROOT_DIR/BINARIES-CO7/KERNEL/lib/python3.6/site-packages:$PYTHONPATH
+
+# Set other necessary environment variables
+export LD_LIBRARY_PATH=$SALOME_ROOT_DIR/BINARIES-CO7/KERNEL/lib:$LD_LIBRARY_PATH
+
+# Define and export directories
+export GEOMETRY_MODULE_DIR="/home/Mario/Desktop/aneupy-master/aneupy"
+export GEOMETRY_OUTPUT_DIR="/home/Mario/Desktop/aneupy-master/test/Geometry_Output/Idealized_Cohort"
+
+# Run idealized cohort script
+$SALOME_ROOT_DIR/salome shell -- python3 /home/Mario/Desktop/aneupy-master/test/Idealized_cohort.py "$@"
+
+## The cases can be given as a CSV file (one case per row), a JSON list of cases or a JSON parameter grid:
+
+# ./Run_Idealized_Cohort.sh --cases ./Params_Idealized_Cohort.json --processes 8
+# ./Run_Idealized_Cohort.sh --cases ./cases.csv --backend numpy --formats stl
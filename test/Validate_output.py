@@ -0,0 +1,59 @@
+# =============================================================================
+#
+# Validate_output.py
+#
+# Python script to check exported STL files against the CAD information of
+# the study, without SALOME
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# Access environment variables
+geometry_module_dir = os.environ.get('GEOMETRY_MODULE_DIR', '../aneupy')
+
+# Add the directory to the Python path
+sys.path.append(geometry_module_dir)
+import Validation
+
+parser = argparse.ArgumentParser(description="Validate exported STL files against .cad files")
+parser.add_argument('--cad', type=str, required=False, help='.cad file or .cad.npz table written by Domain.save')
+parser.add_argument('--stl', type=str, nargs='+', default=[], help='STL files (named after their solids)')
+parser.add_argument('--cohort', type=str, required=False, help='Cohort directory with one case per subdirectory')
+parser.add_argument('--tolerance', type=float, default=1.E-2, help='Relative tolerance')
+parser.add_argument('--processes', type=int, required=False, help='Number of worker processes (default: number of CPUs)')
+parser.add_argument('--output', type=str, required=False, help='JSON file to write the results')
+
+args = parser.parse_args()
+
+start = time.time()
+if args.cohort:
+    results = Validation.validate_cohort(args.cohort, tolerance=args.tolerance, processes=args.processes)
+    files = [result for case in results for result in case['files']]
+else:
+    if not args.cad:
+        parser.error('--cad is required without --cohort')
+    results = files = [Validation.validate(file, args.cad, tolerance=args.tolerance) for file in args.stl]
+
+for result in files:
+    if not result['ok']:
+        errors = {key: value['error'] for key, value in result.items() if isinstance(value, dict) and not value['ok']}
+        print(f"FAILED {result['file']}: {result.get('error', errors)}")
+
+if args.output:
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+failed = sum(not result['ok'] for result in files)
+print(f"{len(files) - failed} of {len(files)} files within tolerance {args.tolerance} ({time.time() - start:.2f} s)")
+sys.exit(1 if failed else 0)
@@ -0,0 +1,111 @@
+# =============================================================================
+#
+# Validate_preview.py
+#
+# Python script to measure the error of the semi-analytic preview against
+# built models over a sweep of idealized parameters. The preview is the limit
+# of the loft of the numpy backend (the default here); with --backend occ the
+# sweep measures its difference to the B-spline loft of SALOME instead
+#
+# Jacobo Diaz - jdiaz@udc.es
+# Mario de Lucio - mdeluci@purdue.edu
+# 2024
+#
+# =============================================================================
+
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+# Access environment variables
+geometry_module_dir = os.environ.get('GEOMETRY_MODULE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aneupy'))
+
+# Add the directory to the Python path
+sys.path.append(geometry_module_dir)
+import Geometry
+import Idealized
+import Cohort
+import Preview
+import Mesh
+
+parser = argparse.ArgumentParser(description="Measure the error of Preview against built idealized models")
+parser.add_argument('--cases', type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Params_Idealized_Cohort.json'),
+                    help='CSV or JSON file with the cases (see Cohort.load_cases)')
+parser.add_argument('--random', type=int, default=20, help='Additional random cases around the default parameters')
+parser.add_argument('--seed', type=int, default=0, help='Seed of the random cases')
+parser.add_argument('--backend', type=str, default='numpy', choices=['numpy', 'occ'], help='Backend of the built models')
+parser.add_argument('--resolution', type=int, default=512, help='Points per circle of the numpy backend')
+parser.add_argument('--subdivisions', type=int, default=32, help='Subdivisions per span of the numpy backend')
+parser.add_argument('--tolerance', type=float, required=False,
+                    help='Largest relative error accepted (default: 1e-4 with numpy, 1e-2 with occ)')
+parser.add_argument('--output', type=str, required=False, help='JSON file to write the errors of every case')
+
+args = parser.parse_args()
+
+# The OCC loft differs from the numpy one: 0.6% in volume on the only model compared
+if args.tolerance is None:
+    args.tolerance = 1.E-4 if args.backend == 'numpy' else 1.E-2
+
+
+def random_cases(n, seed):
+    """Cases with the sac, shifts and thrombus drawn around Idealized.DEFAULTS"""
+    rng = np.random.default_rng(seed)
+    cases = []
+    for _ in range(n):
+        radius = rng.uniform(4., 6.)
+        cases.append({'length': rng.uniform(80., 140.), 'radius_nondilated': radius,
+                      'radius_dilated': radius + rng.uniform(2., 12.), 'wall_thickness_intima': rng.uniform(0.3, 1.5),
+                      'wall_thickness_media': rng.uniform(0.3, 1.5), 'wall_thickness_adventitia': rng.uniform(0.3, 1.5),
+                      'wall_thickness_ILT': rng.uniform(0., 3.), 'x_shift': rng.uniform(0., 6.),
+                      'y_shift': rng.uniform(-3., 3.)})
+    return cases
+
+
+def tube(d, shell, points=12):
+    centers, normals, radii = Mesh.circles(d.shells[shell].sections)
+    return Preview.tube(centers, Mesh.frames_from_normals(normals), radii, points=points)
+
+
+cases = [{key: value for key, value in case.items() if key != 'case'} for case in Cohort.load_cases(args.cases)]
+cases += random_cases(args.random, args.seed)
+
+options = {'resolution': args.resolution, 'subdivisions': args.subdivisions} if args.backend == 'numpy' else {'publish': 'none'}
+
+start = time.time()
+results = []
+for params in cases:
+    d = Geometry.Domain(backend=args.backend, **options)
+    Idealized.build(d, **params)
+
+    errors = {}
+    for shell, solid in (('aneurysm_inner', 'aneurysm_fluid'), ('adventitia_outer', 'adventitia_outer')):
+        preview = tube(d, shell)
+        built = d.properties('solids', solid)
+        for key in ('Volume', 'Area'):
+            errors[f'{solid}.{key}'] = abs(preview[key] - built[key])/abs(built[key])
+            # Quadrature error: against a preview with many more points around the loft
+            errors[f'{solid}.{key}.quadrature'] = abs(preview[key] - tube(d, shell, 96)[key])/abs(built[key])
+
+    d.release()
+    results.append({'parameters': params, 'errors': errors})
+
+settings = f', resolution {args.resolution}, subdivisions {args.subdivisions}' if args.backend == 'numpy' else ''
+print(f"Cases: {len(results)}, preview against the {args.backend} backend{settings} ({time.time() - start:.1f} s)")
+worst = 0.
+for key in results[0]['errors']:
+    values = np.array([result['errors'][key] for result in results])
+    print(f"{key:40s} max {values.max():.2e}  mean {values.mean():.2e}")
+    worst = max(worst, values.max())
+
+if args.output:
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+print(f"Largest relative error {worst:.2e} ({'within' if worst <= args.tolerance else 'above'} tolerance {args.tolerance})")
+sys.exit(0 if worst <= args.tolerance else 1)